@@ -0,0 +1,410 @@
+"""Fleet KPIs over many responses from compact per-response columnar tables.
+
+Each response JSON is reduced once to two float64 tables, stored as ``routes.npy`` and
+``steps.npy`` (rows x columns, memory-mapped when read) in a ``<response>.analytics/``
+sidecar, with a manifest recording the size and mtime of the response and of the request
+it was joined with; a table whose sources changed is rebuilt on next use.
+
+``routes`` (one row per route):
+  vehicle (code into the manifest's ``vehicles``), start, end (epoch s of the
+  first/last step), distance, duration, service, waiting_time, cost, jobs, late_jobs,
+  lateness (s past the job's time window), then W columns each of peak load and of
+  capacity per load dimension (NaN where unknown; capacity comes from the request)
+``steps`` (one row per job/pickup/delivery step):
+  route (row in ``routes``), arrival, waiting_time, service, lateness (NaN without a
+  time window)
+
+``aggregate`` groups the rows of many tables by vehicle, day, source or any combination
+and sums the metrics; with NumPy that is one ``unique`` plus a ``bincount`` per metric
+over the concatenated mapped columns, without it a plain loop.
+"""
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from typing import Any, Callable, Sequence
+
+from .npyio import NpyAppender, open_npy
+from .schema import load_response
+
+try:  # optional
+    import numpy as np
+except ImportError:
+    np = None
+
+FORMAT = 1
+MANIFEST = "manifest.json"
+
+ROUTE_COLUMNS = ("vehicle", "start", "end", "distance", "duration", "service", "waiting_time", "cost",
+                 "jobs", "late_jobs", "lateness")
+STEP_COLUMNS = ("route", "arrival", "waiting_time", "service", "lateness")
+_TASK_TYPES = ("job", "pickup", "delivery")
+
+# Metrics per level; "utilization" (peak load / capacity, worst dimension) is derived
+ROUTE_METRICS = ("routes", "jobs", "late_jobs", "lateness", "distance", "duration", "service", "waiting_time", "cost", "utilization")
+STEP_METRICS = ("steps", "late_steps", "lateness", "waiting_time", "service")
+GROUP_KEYS = ("vehicle", "day", "source")
+
+
+def sidecar_dir(response_path: str) -> str:
+    return response_path + ".analytics"
+
+
+def _stat(path: str | None) -> list | None:
+    if path is None:
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _windows(request: dict | None) -> dict[str, list]:
+    """Task id -> time windows, for jobs and both ends of shipments."""
+    out: dict[str, list] = {}
+    if not request:
+        return out
+    for job in request.get("jobs") or []:
+        if job.get("time_windows"):
+            out[str(job.get("id"))] = job["time_windows"]
+    for shipment in request.get("shipments") or []:
+        for end in ("pickup", "delivery"):
+            part = shipment.get(end) or {}
+            if part.get("time_windows") and part.get("id") is not None:
+                out[str(part["id"])] = part["time_windows"]
+    return out
+
+
+def _lateness(start: float, windows: list) -> float:
+    """Seconds by which ``start`` misses the closest window it is not inside (0 if inside one)."""
+    late = math.inf
+    for w in windows:
+        if len(w) < 2:
+            continue
+        if w[0] <= start <= w[1]:
+            return 0.0
+        if start > w[1]:
+            late = min(late, start - w[1])
+    return late if late != math.inf else 0.0
+
+
+def _num(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+
+def reduce_response(response: Any, request: dict | None = None) -> dict:
+    """Column lists of the routes and steps tables (plus the vehicle dictionary and width).
+
+    ``response`` is the response dict or its typed decode (``schema.Response``).
+    """
+    routes = ((response or {}).get("result") or {}).get("routes") or []
+    windows = _windows(request)
+    capacities = {str(v.get("id")): v.get("capacity") or [] for v in (request or {}).get("vehicles") or []}
+    width = max([len(c) for c in capacities.values()] +
+                [len(s.get("load") or []) for r in routes for s in r.get("steps") or []] + [1])
+    vehicles: dict[str, int] = {}
+    route_rows, step_rows = [], []
+    for ri, route in enumerate(routes):
+        vehicle = str(route.get("vehicle"))
+        steps = route.get("steps") or []
+        arrivals = [a for a in (s.get("arrival") for s in steps) if isinstance(a, (int, float))]
+        peak = [math.nan] * width
+        jobs = late_jobs = 0
+        lateness = 0.0
+        for s in steps:
+            for d, v in enumerate(s.get("load") or []):
+                if isinstance(v, (int, float)) and not (v <= peak[d]):
+                    peak[d] = float(v)
+            if s.get("type") not in _TASK_TYPES:
+                continue
+            jobs += 1
+            arrival = _num(s.get("arrival"))
+            waiting = _num(s.get("waiting_time"))
+            late = math.nan
+            tw = windows.get(str(s.get("id")))
+            if tw and not math.isnan(arrival):
+                late = _lateness(arrival + (0.0 if math.isnan(waiting) else waiting), tw)
+                if late > 0:
+                    late_jobs += 1
+                    lateness += late
+            step_rows.append((ri, arrival, waiting, _num(s.get("service")), late))
+        cap = [_num(c) for c in capacities.get(vehicle, [])][:width]
+        route_rows.append((
+            vehicles.setdefault(vehicle, len(vehicles)),
+            float(min(arrivals)) if arrivals else math.nan,
+            float(max(arrivals)) if arrivals else math.nan,
+            *(_num(route.get(name)) for name in ("distance", "duration", "service", "waiting_time", "cost")),
+            jobs, late_jobs, lateness,
+            *peak, *cap, *[math.nan] * (width - len(cap)),
+        ))
+    return {"routes": route_rows, "steps": step_rows, "vehicles": list(vehicles), "width": width}
+
+
+class Table:
+    """One response's routes and steps tables (mapped 2-D arrays, or row lists without NumPy)."""
+    __slots__ = ("path", "vehicles", "width", "routes", "steps", "rows", "step_rows")
+
+    def __init__(self, path: str, manifest: dict, routes: Any, steps: Any) -> None:
+        self.path = path
+        self.vehicles = manifest["vehicles"]
+        self.width = manifest["width"]
+        self.rows = manifest["rows"]
+        self.step_rows = manifest["step_rows"]
+        if np is not None:
+            # Plain ndarray views of the maps: slicing them skips np.memmap's per-view bookkeeping
+            self.routes = routes.view(np.ndarray).reshape(self.rows, len(ROUTE_COLUMNS) + 2 * self.width)
+            self.steps = steps.view(np.ndarray).reshape(self.step_rows, len(STEP_COLUMNS))
+        else:
+            self.routes = routes.tolist() if self.rows else []
+            self.steps = steps.tolist() if self.step_rows else []
+
+    @property
+    def nbytes(self) -> int:
+        if np is not None:
+            # Mapped pages live in the OS page cache, not the heap: count only the bookkeeping
+            return 512 + sum(len(v) for v in self.vehicles)
+        return 64 * (self.rows * (len(ROUTE_COLUMNS) + 2 * self.width) + self.step_rows * len(STEP_COLUMNS))
+
+    def route_column(self, name: str) -> Any:
+        j = ROUTE_COLUMNS.index(name)
+        return self.routes[:, j] if np is not None else [r[j] for r in self.routes]
+
+    def step_column(self, name: str) -> Any:
+        j = STEP_COLUMNS.index(name)
+        return self.steps[:, j] if np is not None else [r[j] for r in self.steps]
+
+    def loads(self) -> tuple[Any, Any]:
+        """(peak load, capacity), rows x width."""
+        k = len(ROUTE_COLUMNS)
+        if np is not None:
+            return self.routes[:, k:k + self.width], self.routes[:, k + self.width:]
+        return [r[k:k + self.width] for r in self.routes], [r[k + self.width:] for r in self.routes]
+
+
+def _write(folder: str, reduced: dict, manifest: dict) -> None:
+    tmp = f"{folder}.{os.getpid()}.{threading.get_ident()}.part"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    widths = {"routes": len(ROUTE_COLUMNS) + 2 * reduced["width"], "steps": len(STEP_COLUMNS)}
+    for table, width in widths.items():
+        w = NpyAppender(os.path.join(tmp, f"{table}.npy"), "<f8", width)
+        w.extend(reduced[table])
+        w.close()
+    # The manifest goes last: its presence marks a complete table
+    with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(tmp, folder)
+
+
+def _open(folder: str, manifest: dict) -> Table:
+    return Table(folder, manifest, open_npy(os.path.join(folder, "routes.npy")), open_npy(os.path.join(folder, "steps.npy")))
+
+
+_locks: dict[str, threading.Lock] = {}
+_guard = threading.Lock()
+
+
+def _lock(key: str) -> threading.Lock:
+    with _guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def open_table(response_path: str, request_path: str | None, load: Callable[[str], dict],
+               load_typed: Callable[[str], Any] = load_response) -> Table:
+    """The table for a response (and optional request), rebuilt if either source changed.
+
+    The request comes from ``load``; the response is decoded with ``load_typed``, which
+    reads only the route/step fields and keeps the one-off parse out of the data cache.
+    """
+    folder = sidecar_dir(response_path)
+    with _lock(folder):
+        sources = {"response": _stat(response_path), "request": _stat(request_path)}
+        try:
+            with open(os.path.join(folder, MANIFEST), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format") == FORMAT and manifest.get("sources") == sources:
+                return _open(folder, manifest)
+        except (FileNotFoundError, ValueError):
+            pass
+        t0 = time.perf_counter()
+        reduced = reduce_response(load_typed(response_path), load(request_path) if request_path else None)
+        manifest = {"format": FORMAT, "sources": sources, "vehicles": reduced["vehicles"], "width": reduced["width"],
+                    "rows": len(reduced["routes"]), "step_rows": len(reduced["steps"]),
+                    "build_seconds": round(time.perf_counter() - t0, 3)}
+        _write(folder, reduced, manifest)
+        return _open(folder, manifest)
+
+
+# ---- aggregation ---------------------------------------------------------------------
+
+def _day(ts: float, offset: float) -> str | None:
+    if ts != ts:  # NaN
+        return None
+    return time.strftime("%Y-%m-%d", time.gmtime(ts + offset))
+
+
+def aggregate(tables: Sequence[tuple[str, Table]], group_by: Sequence[str], level: str = "routes",
+              metrics: Sequence[str] | None = None, since: float | None = None, until: float | None = None,
+              utc_offset: float = 0.0) -> list[dict]:
+    """Grouped KPIs over ``(source label, table)`` pairs, sorted by group key.
+
+    ``level`` is ``routes`` (day = day of the route's first arrival) or ``steps``
+    (day of each arrival). ``since``/``until`` filter on that same timestamp (epoch s).
+    """
+    metrics = list(metrics or (ROUTE_METRICS if level == "routes" else STEP_METRICS))
+    offset = utc_offset * 3600
+    if np is not None:
+        return _aggregate_np(tables, group_by, level, metrics, since, until, offset)
+    return _aggregate_py(tables, group_by, level, metrics, since, until, offset)
+
+
+def _route_utilization(table: Table) -> list[float]:
+    out = []
+    for peak, cap in zip(*table.loads()):
+        ratios = [p / c for p, c in zip(peak, cap) if c == c and c > 0 and p == p]
+        out.append(max(ratios) if ratios else math.nan)
+    return out
+
+
+def _aggregate_py(tables, group_by, level, metrics, since, until, offset) -> list[dict]:
+    groups: dict[tuple, dict] = {}
+    for label, table in tables:
+        if level == "routes":
+            ts = table.route_column("start")
+            vehicle = table.route_column("vehicle")
+            cols = {m: table.route_column(m) for m in ROUTE_COLUMNS if m in metrics}
+            util = _route_utilization(table) if "utilization" in metrics else None
+        else:
+            route_vehicle = table.route_column("vehicle")
+            ts = table.step_column("arrival")
+            vehicle = [route_vehicle[int(r)] for r in table.step_column("route")]
+            cols = {m: table.step_column(m) for m in STEP_COLUMNS if m in metrics}
+            late = table.step_column("lateness")
+            util = None
+        for i, t in enumerate(ts):
+            if (since is not None and not t >= since) or (until is not None and not t < until):
+                continue
+            key = tuple(table.vehicles[int(vehicle[i])] if k == "vehicle" else _day(t, offset) if k == "day" else label for k in group_by)
+            g = groups.get(key)
+            if g is None:
+                g = groups[key] = {"_n": 0, "_late": 0, "_util": [], **{m: 0.0 for m in cols}}
+            g["_n"] += 1
+            for m, col in cols.items():
+                v = col[i]
+                if v == v:
+                    g[m] += v
+            if level == "steps" and late[i] == late[i] and late[i] > 0:
+                g["_late"] += 1
+            if util is not None and util[i] == util[i]:
+                g["_util"].append(util[i])
+    out = []
+    for key in sorted(groups, key=lambda k: tuple("" if v is None else str(v) for v in k)):
+        g = groups[key]
+        row = dict(zip(group_by, key))
+        for m in metrics:
+            if m in ("routes", "steps"):
+                row[m] = g["_n"]
+            elif m == "late_steps":
+                row[m] = g["_late"]
+            elif m in ("jobs", "late_jobs"):
+                row[m] = int(g[m])
+            elif m == "utilization":
+                u = g["_util"]
+                row[m] = {"mean": sum(u) / len(u), "max": max(u)} if u else {"mean": None, "max": None}
+            else:
+                row[m] = g[m]
+        out.append(row)
+    return out
+
+
+def _aggregate_np(tables, group_by, level, metrics, since, until, offset) -> list[dict]:
+    ts_parts, vehicle_parts, source_parts, col_parts, util_parts = [], [], [], {}, []
+    vehicle_names: dict[str, int] = {}
+    sources = []
+    for si, (label, table) in enumerate(tables):
+        sources.append(label)
+        # Per-table vehicle codes -> one global dictionary
+        remap = np.array([vehicle_names.setdefault(v, len(vehicle_names)) for v in table.vehicles] or [0], dtype=np.int64)
+        route_vehicle = remap[table.route_column("vehicle").astype(np.int64)]
+        if level == "routes":
+            ts = table.route_column("start")
+            vehicle = route_vehicle
+            for m in ROUTE_COLUMNS:
+                if m in metrics:
+                    col_parts.setdefault(m, []).append(table.route_column(m))
+            if "utilization" in metrics:
+                peak, cap = table.loads()
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    ratio = np.where(cap > 0, peak / cap, np.nan)
+                util_parts.append(np.fmax.reduce(ratio, axis=1) if table.rows else np.zeros(0))
+        else:
+            ts = table.step_column("arrival")
+            vehicle = route_vehicle[table.step_column("route").astype(np.int64)]
+            for m in STEP_COLUMNS:
+                if m in metrics or (m == "lateness" and "late_steps" in metrics):
+                    col_parts.setdefault(m, []).append(table.step_column(m))
+        ts_parts.append(ts)
+        vehicle_parts.append(vehicle)
+        source_parts.append(np.full(len(ts), si, dtype=np.int64))
+    if not ts_parts:
+        return []
+    ts = np.concatenate(ts_parts)
+    keep = np.ones(len(ts), dtype=bool)
+    if since is not None:
+        keep &= ts >= since
+    if until is not None:
+        keep &= ts < until
+    ts = ts[keep]
+    key_cols, labels = [], []
+    for k in group_by:
+        if k == "vehicle":
+            key_cols.append(np.concatenate(vehicle_parts)[keep])
+            labels.append(list(vehicle_names))
+        elif k == "source":
+            key_cols.append(np.concatenate(source_parts)[keep])
+            labels.append(sources)
+        else:
+            days = np.floor((ts + offset) / 86400)
+            valid = ~np.isnan(days)
+            uniq_days = np.unique(days[valid])
+            codes = np.full(len(ts), len(uniq_days), dtype=np.int64)
+            codes[valid] = np.searchsorted(uniq_days, days[valid])
+            key_cols.append(codes)
+            labels.append([time.strftime("%Y-%m-%d", time.gmtime(d * 86400)) for d in uniq_days] + [None])
+    if key_cols:
+        groups, inverse = np.unique(np.stack(key_cols, axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    else:
+        groups, inverse = np.zeros((1 if len(ts) else 0, 0), dtype=np.int64), np.zeros(len(ts), dtype=np.int64)
+    n = len(groups)
+    counts = np.bincount(inverse, minlength=n)
+    values = {}
+    for m, parts in col_parts.items():
+        col = np.concatenate(parts)[keep]
+        values[m] = np.bincount(inverse, weights=np.nan_to_num(col, nan=0.0), minlength=n)
+        if m == "lateness" and level == "steps":
+            values["late_steps"] = np.bincount(inverse, weights=(col > 0).astype(float), minlength=n)
+    if "utilization" in metrics:
+        util = np.concatenate(util_parts)[keep] if util_parts else np.zeros(0)
+        has = ~np.isnan(util)
+        u_count = np.bincount(inverse[has], minlength=n)
+        u_sum = np.bincount(inverse[has], weights=util[has], minlength=n)
+        u_max = np.full(n, -np.inf)
+        np.maximum.at(u_max, inverse[has], util[has])
+    rows = []
+    for gi in range(n):
+        row = {k: labels[j][int(groups[gi, j])] for j, k in enumerate(group_by)}
+        for m in metrics:
+            if m in ("routes", "steps"):
+                row[m] = int(counts[gi])
+            elif m in ("jobs", "late_jobs", "late_steps"):
+                row[m] = int(values[m][gi])
+            elif m == "utilization":
+                row[m] = ({"mean": float(u_sum[gi] / u_count[gi]), "max": float(u_max[gi])} if u_count[gi]
+                          else {"mean": None, "max": None})
+            else:
+                row[m] = float(values[m][gi])
+        rows.append(row)
+    rows.sort(key=lambda r: tuple("" if r[k] is None else str(r[k]) for k in group_by))
+    return rows
@@ -0,0 +1,175 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+def estimate_size(obj: Any) -> int:
+    """Approximate resident size of a JSON-like object tree in bytes.
+
+    Walks dicts, lists, tuples and objects with __slots__/__dict__ once, summing
+    sys.getsizeof; shared objects are counted once.
+    """
+    seen: set[int] = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif isinstance(o, (str, bytes, bytearray, int, float, bool)) or o is None:
+            continue
+        else:
+            nbytes = getattr(o, "nbytes", None)  # numpy arrays, memoryviews
+            if isinstance(nbytes, int):
+                total += nbytes
+                continue
+            if hasattr(o, "__dict__"):
+                stack.append(vars(o))
+            for slot in getattr(type(o), "__slots__", ()):
+                if hasattr(o, slot):
+                    stack.append(getattr(o, slot))
+    return total
+
+
+class _Pending:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.value = None
+        self.error: BaseException | None = None
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by an estimated byte budget.
+
+    Entries carry a ``stamp`` (e.g. the source file's mtime); a lookup with a
+    different stamp is a miss and replaces the entry. Optional TTL expiry. Concurrent
+    misses on the same key are coalesced: one caller runs the loader, the others wait
+    for its result.
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl: float | None = None, sizeof: Callable[[Any], int] = estimate_size) -> None:
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Any, Any, int, float]] = OrderedDict()  # key -> (stamp, value, size, stored_at)
+        self._pending: dict[Hashable, _Pending] = {}
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.coalesced = self.oversize = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key: Hashable, stamp: Any) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                return None
+            if self.ttl is not None and time.monotonic() - entry[3] > self.ttl:
+                self._drop(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key: Hashable, stamp: Any) -> Any | None:
+        """Like get, without counting a lookup or refreshing the entry's recency."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                return None
+            if self.ttl is not None and time.monotonic() - entry[3] > self.ttl:
+                return None
+            return entry[1]
+
+    def put(self, key: Hashable, stamp: Any, value: Any, size: int | None = None) -> None:
+        if size is None:
+            size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                self.oversize += 1
+                return
+            self._entries[key] = (stamp, value, size, time.monotonic())
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, stamp: Any, loader: Callable[[], Any]) -> Any:
+        value = self.get(key, stamp)
+        if value is not None:
+            return value
+        with self._lock:
+            pending = self._pending.get((key, stamp))
+            owner = pending is None
+            if owner:
+                pending = self._pending[(key, stamp)] = _Pending()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+        try:
+            pending.value = loader()
+            self.put(key, stamp, pending.value)
+            return pending.value
+        except BaseException as exc:
+            pending.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop((key, stamp), None)
+            pending.event.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "oversize": self.oversize,
+            }
+
+
+def cache_from_env(name: str, default_mb: int, sizeof: Callable[[Any], int] = estimate_size) -> LRUCache:
+    """LRUCache sized by <NAME>_CACHE_MAX_MB, with CACHE_TTL_SECONDS as optional TTL."""
+    max_mb = float(os.getenv(f"{name.upper()}_CACHE_MAX_MB", default_mb))
+    ttl = os.getenv("CACHE_TTL_SECONDS")
+    return LRUCache(name, int(max_mb * 1024 * 1024), ttl=float(ttl) if ttl else None, sizeof=sizeof)
@@ -0,0 +1,388 @@
+import collections
+import ctypes
+import ctypes.util
+import logging
+import os
+import re
+import select
+import struct
+import threading
+import time
+from typing import Any, Callable
+
+_FILENAME_BASE = "nextbillion_response"
+_FILENAME_REGEX = re.compile(rf"^{re.escape(_FILENAME_BASE)}(?:_(\d+))?\.json$")
+
+_ROOT = ""  # directory key of DATA_DIR itself; set directories use their name
+
+# inotify(7) constants
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal ctypes binding to Linux inotify; raises OSError where unavailable."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify not supported on this platform")
+        self._libc = libc
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def read(self, timeout: float) -> list[tuple[int, int, str]]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos + _EVENT_HEADER.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, pos)
+            pos += _EVENT_HEADER.size
+            name = buf[pos:pos + length].rstrip(b"\0").decode("utf-8", "replace")
+            pos += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class DataCatalog:
+    """In-memory listing of DATA_DIR and its numbered set folders.
+
+    File names per directory are held as frozensets, so resolving a set's request,
+    response or CSVs is a handful of set-membership checks instead of filesystem
+    probes. The catalog is kept current by an inotify watcher thread (Linux), or by
+    polling directory mtimes where inotify is unavailable or ``CATALOG_WATCH=poll``
+    (e.g. network storage). Polling notices added/removed files only; in-place
+    rewrites are still picked up by the mtime-keyed caches downstream.
+    While a watcher runs the listing is authoritative and a lookup is a dict/set
+    probe; the app's own writes call ``refresh_set`` so they are visible at once.
+    Without a watcher a lookup miss re-lists the directory, at most once per
+    ``miss_interval`` seconds per directory.
+    """
+
+    def __init__(self, data_dir: str, mode: str | None = None, poll_interval: float | None = None, max_events: int = 1000,
+                 miss_interval: float = 1.0) -> None:
+        self.data_dir = data_dir
+        self.mode = (mode or os.getenv("CATALOG_WATCH", "auto")).lower()
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv("CATALOG_POLL_SECONDS", "2"))
+        self._lock = threading.RLock()
+        self._dirs: dict[str, frozenset[str]] = {}
+        self._dir_mtimes: dict[str, float] = {}
+        self.miss_interval = miss_interval
+        self._miss_scans: dict[str, float] = {}
+        self._scanned = False
+        self._events: collections.deque = collections.deque(maxlen=max_events)
+        self._seq = 0
+        self._listeners: list[Callable[[dict], Any]] = []
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.watching: str | None = None
+
+    # ---- scanning -------------------------------------------------------
+
+    def _dir_path(self, key: str) -> str:
+        return os.path.join(self.data_dir, key) if key else self.data_dir
+
+    def _list_dir(self, key: str) -> frozenset[str] | None:
+        path = self._dir_path(key)
+        try:
+            self._dir_mtimes[key] = os.stat(path).st_mtime
+            with os.scandir(path) as it:
+                if key == _ROOT:
+                    # Set folders are marked with a trailing "/" to tell them apart from files
+                    return frozenset(e.name + "/" if e.name.isdigit() and e.is_dir() else e.name for e in it)
+                return frozenset(e.name for e in it if e.is_file())
+        except (FileNotFoundError, NotADirectoryError):
+            self._dir_mtimes.pop(key, None)
+            return None
+
+    def _rescan_dir(self, key: str, emit: bool = True) -> frozenset[str]:
+        """Re-list one directory; returns the names that were added."""
+        names = self._list_dir(key)
+        with self._lock:
+            before = self._dirs.get(key, frozenset())
+            after = names or frozenset()
+            if names is None:
+                self._dirs.pop(key, None)
+            else:
+                self._dirs[key] = names
+        if emit:
+            for name in sorted(after - before):
+                self._emit("added", key, name)
+            for name in sorted(before - after):
+                self._emit("removed", key, name)
+        if key == _ROOT:
+            sets = {n[:-1] for n in after if n.endswith("/")}
+            gone = {n[:-1] for n in before if n.endswith("/")} - sets
+            for sid in gone:
+                with self._lock:
+                    removed = self._dirs.pop(sid, frozenset())
+                if emit:
+                    for name in sorted(removed):
+                        self._emit("removed", sid, name)
+            for sid in sets:
+                if sid not in self._dirs:
+                    if self.watching == "inotify":
+                        # Watch before listing so files created in between are not missed
+                        self._watch(sid)
+                    self._rescan_dir(sid, emit=emit)
+        return after - before
+
+    def refresh(self) -> None:
+        """Full rescan of DATA_DIR and every set folder."""
+        with self._lock:
+            emit = self._scanned
+            known = [k for k in self._dirs if k != _ROOT]
+            # New set folders are listed by the root rescan itself
+            self._rescan_dir(_ROOT, emit=emit)
+            for key in known:
+                if key in self._dirs:
+                    self._rescan_dir(key, emit=emit)
+            self._scanned = True
+
+    def refresh_set(self, set_id: int) -> None:
+        """Re-list one set folder (and the root, in case the folder is new)."""
+        self._ensure_scanned()
+        if f"{set_id}/" not in self._dirs.get(_ROOT, ()):
+            self._rescan_dir(_ROOT)
+        self._rescan_dir(str(set_id))
+
+    def _ensure_scanned(self) -> None:
+        if not self._scanned:
+            self.refresh()
+
+    # ---- change events --------------------------------------------------
+
+    def _emit(self, kind: str, key: str, name: str) -> None:
+        with self._lock:
+            self._seq += 1
+            event = {
+                "seq": self._seq,
+                "ts": time.time(),
+                "type": kind,
+                "set": int(key) if key else None,
+                "name": name.rstrip("/"),
+                "is_set": key == _ROOT and name.endswith("/"),
+            }
+            self._events.append(event)
+            listeners = list(self._listeners)
+        for fn in listeners:
+            try:
+                fn(event)
+            except Exception:
+                logging.exception("catalog listener failed")
+
+    def subscribe(self, fn: Callable[[dict], Any]) -> None:
+        """Register fn(event) to be called (from the watcher thread) on every change."""
+        with self._lock:
+            self._listeners.append(fn)
+
+    def events(self, since: int = 0) -> dict:
+        with self._lock:
+            return {"seq": self._seq, "events": [e for e in self._events if e["seq"] > since]}
+
+    # ---- lookups --------------------------------------------------------
+
+    def _names(self, key: str) -> frozenset[str]:
+        self._ensure_scanned()
+        return self._dirs.get(key, frozenset())
+
+    def _first(self, key: str, candidates: list[str]) -> str | None:
+        names = self._names(key)
+        return next((c for c in candidates if c in names), None)
+
+    def _rescan_on_miss(self, key: str) -> bool:
+        """Re-list a directory after a lookup miss, unless a watcher keeps it current or it was just re-listed."""
+        if self.watching is not None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._miss_scans.get(key, float("-inf")) < self.miss_interval:
+                return False
+            self._miss_scans[key] = now
+        self._rescan_dir(key)
+        return True
+
+    def _find(self, set_id: int, in_set: list[str], at_root: list[str]) -> str | None:
+        """Resolve a set file: set folder first, then legacy placement at the DATA_DIR root."""
+        sid = str(set_id)
+        for attempt in range(2):
+            name = self._first(sid, in_set)
+            if name:
+                return os.path.join(self.data_dir, sid, name)
+            name = self._first(_ROOT, at_root)
+            if name:
+                return os.path.join(self.data_dir, name)
+            if attempt == 1:
+                break
+            rescanned = self._rescan_on_miss(_ROOT)
+            if f"{sid}/" in self._names(_ROOT):
+                rescanned = self._rescan_on_miss(sid) or rescanned
+            if not rescanned:
+                break
+        return None
+
+    def has_set(self, set_id: int) -> bool:
+        if f"{set_id}/" in self._names(_ROOT):
+            return True
+        return self._rescan_on_miss(_ROOT) and f"{set_id}/" in self._names(_ROOT)
+
+    def response_path(self, set_id: int) -> str | None:
+        return self._find(
+            set_id,
+            [f"Next_Billion_response_{set_id}.json", f"nextbillion_response_{set_id}.json", "Next_Billion_response.json", "nextbillion_response.json"],
+            [f"Next_Billion_response_{set_id}.json", f"nextbillion_response_{set_id}.json"],
+        )
+
+    def request_path(self, set_id: int) -> str | None:
+        return self._find(
+            set_id,
+            [f"Next_Billion_request_{set_id}.json", f"nextbillion_request_{set_id}.json", "Next_Billion_request.json", "nextbillion_request.json"],
+            [f"Next_Billion_request_{set_id}.json", f"nextbillion_request_{set_id}.json"],
+        )
+
+    def root_file(self, name: str) -> str | None:
+        if name not in self._names(_ROOT):
+            if not self._rescan_on_miss(_ROOT) or name not in self._names(_ROOT):
+                return None
+        return os.path.join(self.data_dir, name)
+
+    def data_files(self) -> list[dict]:
+        files = []
+        for name in self._names(_ROOT):
+            m = _FILENAME_REGEX.match(name)
+            if m:
+                ver = int(m.group(1)) if m.group(1) else 0
+                files.append({"name": name, "version": ver, "path": os.path.join(self.data_dir, name)})
+        files.sort(key=lambda x: x["version"])  # ascending by version
+        return files
+
+    def set_info(self, set_id: int) -> dict | None:
+        sid = str(set_id)
+        if f"{sid}/" not in self._names(_ROOT):
+            return None
+        request = self.request_path(set_id)
+        response = self.response_path(set_id)
+        return {
+            "id": set_id,
+            "dir": sid,
+            "jobs": self._first(sid, [f"input_jobs_{set_id}.csv", "input_jobs.csv"]),
+            "vehicles": self._first(sid, [f"input_vehicles_{set_id}.csv", "input_vehicles.csv"]),
+            "request": os.path.basename(request) if request else None,
+            "response": os.path.basename(response) if response else None,
+            "viewer_url": f"/viewer?set={set_id}",
+        }
+
+    def sets(self) -> list[dict]:
+        ids = sorted(int(n[:-1]) for n in self._names(_ROOT) if n.endswith("/"))
+        return [info for info in (self.set_info(i) for i in ids) if info is not None]
+
+    # ---- watching -------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the background watcher (inotify, else polling) unless CATALOG_WATCH=off."""
+        if self._thread is not None or self.mode == "off":
+            return
+        self._ensure_scanned()
+        self._stop.clear()
+        target = self._poll_loop
+        if self.mode in ("auto", "inotify"):
+            try:
+                self._inotify = _Inotify()
+                self._wds: dict[int, str] = {}
+                self.watching = "inotify"
+                for key in list(self._dirs):
+                    self._watch(key)
+                target = self._inotify_loop
+            except OSError as exc:
+                if self.mode == "inotify":
+                    raise
+                logging.info("catalog: inotify unavailable (%s); polling every %ss", exc, self.poll_interval)
+        if target is self._poll_loop:
+            self.watching = "poll"
+        self._thread = threading.Thread(target=target, name="data-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        if self.watching == "inotify":
+            self._inotify.close()
+        self.watching = None
+
+    def _watch(self, key: str) -> None:
+        try:
+            wd = self._inotify.add_watch(self._dir_path(key), _WATCH_MASK)
+            self._wds[wd] = key
+        except OSError as exc:
+            logging.warning("catalog: cannot watch %s: %s", self._dir_path(key), exc)
+
+    def _inotify_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                events = self._inotify.read(timeout=0.5)
+            except OSError:
+                logging.exception("catalog: inotify read failed")
+                break
+            dirty: set[str] = set()
+            modified: list[tuple[str, str]] = []
+            for wd, mask, name in events:
+                if mask & _IN_Q_OVERFLOW:
+                    self.refresh()
+                    dirty.clear()
+                    break
+                key = self._wds.get(wd)
+                if key is None:
+                    continue
+                if mask & _IN_IGNORED:
+                    self._wds.pop(wd, None)
+                    continue
+                if mask & (_IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE_SELF):
+                    dirty.add(_ROOT if mask & _IN_DELETE_SELF else key)
+                elif mask & (_IN_CLOSE_WRITE | _IN_ATTRIB) and name:
+                    modified.append((key, name))
+            # A file created in this batch is reported as "added" only
+            seen = {(key, name) for key in dirty for name in self._rescan_dir(key)}
+            for key, name in modified:
+                if (key, name) not in seen:
+                    seen.add((key, name))
+                    self._emit("modified", key, name)
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            for key in list(self._dirs):
+                try:
+                    mtime = os.stat(self._dir_path(key)).st_mtime
+                except FileNotFoundError:
+                    mtime = None
+                if mtime != self._dir_mtimes.get(key):
+                    self._rescan_dir(key)
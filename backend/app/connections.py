@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Iterable
+
+from fastapi import WebSocket
+
+from . import jsonlib
+from .metrics import stage
+from .shared import SharedBackend
+
+
+class _Client:
+    """One device connection: its socket, routing tags and outbound queue."""
+    __slots__ = ("device_id", "websocket", "vehicle", "set_id", "queue", "writer", "dropped")
+
+    def __init__(self, device_id: str, websocket: WebSocket, vehicle: str | None, set_id: int | None, queue_size: int) -> None:
+        self.device_id = device_id
+        self.websocket = websocket
+        self.vehicle = vehicle
+        self.set_id = set_id
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.writer: asyncio.Task | None = None
+        self.dropped = 0
+
+
+class ConnectionManager:
+    """Registry of device WebSockets with per-connection outbound queues.
+
+    Sending never awaits the socket: messages are encoded once and put on each target's
+    bounded queue, and a writer task per connection drains it. When a slow consumer's
+    queue is full, ``slow_policy`` decides: ``"drop"`` discards its oldest queued
+    message, ``"disconnect"`` closes the connection (code 1013) so it can reconnect.
+    """
+
+    def __init__(self, queue_size: int | None = None, slow_policy: str | None = None) -> None:
+        self._connections: dict[str, _Client] = {}
+        self._lock = asyncio.Lock()
+        self.queue_size = queue_size or int(os.getenv("WS_QUEUE_SIZE", "100"))
+        self.slow_policy = slow_policy or os.getenv("WS_SLOW_POLICY", "drop")
+        if self.slow_policy not in ("drop", "disconnect"):
+            raise ValueError(f"Unknown WS_SLOW_POLICY: {self.slow_policy}")
+        self.dropped = 0
+        self.slow_disconnects = 0
+
+    async def connect(self, device_id: str, websocket: WebSocket, vehicle: str | None = None, set_id: int | None = None) -> None:
+        await websocket.accept()
+        client = _Client(device_id, websocket, vehicle, set_id, self.queue_size)
+        client.writer = asyncio.create_task(self._writer(client))
+        async with self._lock:
+            previous = self._connections.get(device_id)
+            self._connections[device_id] = client
+        if previous is not None:
+            # A reconnecting device replaces its stale socket
+            previous.writer.cancel()
+            await self._close(previous.websocket, code=1000)
+        logging.info("WS connected: %s", device_id)
+
+    async def disconnect(self, device_id: str, websocket: WebSocket | None = None) -> None:
+        async with self._lock:
+            client = self._connections.get(device_id)
+            # Only drop the registered connection if it is the one that went away
+            if client is None or (websocket is not None and client.websocket is not websocket):
+                return
+            del self._connections[device_id]
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        logging.info("WS disconnected: %s", device_id)
+
+    async def _writer(self, client: _Client) -> None:
+        try:
+            while True:
+                text = await client.queue.get()
+                with stage("ws_send"):
+                    await client.websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logging.info("WS send to %s failed: %s", client.device_id, exc)
+            await self.disconnect(client.device_id, client.websocket)
+
+    def _enqueue(self, client: _Client, text: str) -> bool:
+        try:
+            client.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.slow_policy == "drop":
+            client.queue.get_nowait()
+            client.queue.put_nowait(text)
+            client.dropped += 1
+            self.dropped += 1
+            return True
+        self.slow_disconnects += 1
+        logging.warning("WS slow consumer disconnected: %s", client.device_id)
+        self._connections.pop(client.device_id, None)
+        client.writer.cancel()
+        asyncio.create_task(self._close(client.websocket))
+        return False
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int = 1013) -> None:
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def has(self, device_id: str) -> bool:
+        return device_id in self._connections
+
+    async def send_to(self, device_id: str, payload: dict) -> None:
+        client = self._connections.get(device_id)
+        if client is None:
+            raise KeyError(device_id)
+        self._enqueue(client, jsonlib.dumps(payload).decode("utf-8"))
+        logging.info("WS message queued for %s: %s", device_id, payload)
+
+    def targets(self, device_ids: Iterable[str] | None = None, vehicle: str | None = None, set_id: int | None = None,
+                viewers: bool = False) -> list[_Client]:
+        """Matching connections; ``viewers`` keeps only those without a vehicle tag."""
+        if device_ids is not None:
+            clients = [c for c in (self._connections.get(d) for d in device_ids) if c is not None]
+        else:
+            clients = list(self._connections.values())
+        if vehicle is not None:
+            clients = [c for c in clients if c.vehicle == vehicle]
+        if set_id is not None:
+            clients = [c for c in clients if c.set_id == set_id]
+        if viewers:
+            clients = [c for c in clients if c.vehicle is None]
+        return clients
+
+    async def broadcast(self, payload: Any, device_ids: Iterable[str] | None = None, vehicle: str | None = None, set_id: int | None = None,
+                        viewers: bool = False) -> dict:
+        """Queue payload (encoded once) for every matching connection."""
+        text = jsonlib.dumps(payload).decode("utf-8")
+        device_ids = list(device_ids) if device_ids is not None else None
+        clients = self.targets(device_ids, vehicle, set_id, viewers)
+        queued = sum(1 for c in clients if self._enqueue(c, text))
+        missing = []
+        if device_ids is not None:
+            missing = [d for d in device_ids if d not in self._connections]
+        return {"queued": queued, "missing": missing}
+
+    async def send_many(self, messages: Iterable[tuple[str, dict]]) -> dict:
+        """Queue a distinct payload per device; returns counts and unknown devices."""
+        queued = 0
+        missing = []
+        for device_id, payload in messages:
+            client = self._connections.get(device_id)
+            if client is None:
+                missing.append(device_id)
+            elif self._enqueue(client, jsonlib.dumps(payload).decode("utf-8")):
+                queued += 1
+        return {"queued": queued, "missing": missing}
+
+    def stats(self) -> dict:
+        """Connection and queue counters; call on the event loop, which owns the registry."""
+        depths = [c.queue.qsize() for c in self._connections.values()]
+        return {
+            "connections": len(depths),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_size": self.queue_size,
+            "slow_policy": self.slow_policy,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+
+class DeviceRouter:
+    """Delivers to devices connected to any worker sharing ``backend``.
+
+    Each worker registers its devices in the ``devices`` hash (device -> worker) and
+    refreshes its entry in ``workers`` every ``heartbeat`` seconds. A message for a device
+    held by another worker is published on that worker's ``worker:<id>`` channel;
+    broadcasts go to the ``broadcast`` channel and every worker queues them for its own
+    matching connections. Entries of workers silent for ``stale_after`` seconds are
+    ignored, so a crashed worker's devices read as disconnected.
+    """
+
+    def __init__(self, manager: ConnectionManager, backend: SharedBackend, worker_id: str,
+                 heartbeat: float = 5.0, stale_after: float = 20.0) -> None:
+        self.manager = manager
+        self.backend = backend
+        self.worker_id = worker_id
+        self.heartbeat = heartbeat
+        self.stale_after = stale_after
+        self.forwarded = 0
+        self.received = 0
+        self._heartbeat_task: asyncio.Task | None = None
+
+    # ---- lifecycle --------------------------------------------------------
+
+    async def start(self) -> None:
+        await self.backend.subscribe(f"worker:{self.worker_id}", self._on_direct)
+        await self.backend.subscribe("broadcast", self._on_broadcast)
+        await asyncio.to_thread(self._beat)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+        try:
+            await asyncio.to_thread(self._unregister_all)
+        except Exception as exc:
+            logging.warning("Device registry cleanup failed: %s", exc)
+
+    def _beat(self) -> None:
+        self.backend.hset("workers", self.worker_id, repr(time.time()))
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                await asyncio.to_thread(self._beat)
+            except Exception as exc:
+                logging.warning("Worker heartbeat failed: %s", exc)
+
+    def _unregister_all(self) -> None:
+        mine = [d for d, owner in self.backend.hgetall("devices").items() if owner == self.worker_id]
+        self.backend.hdel("devices", *mine)
+        self.backend.hdel("workers", self.worker_id)
+
+    # ---- connections ------------------------------------------------------
+
+    async def connect(self, device_id: str, websocket: WebSocket, vehicle: str | None = None, set_id: int | None = None) -> None:
+        await self.manager.connect(device_id, websocket, vehicle=vehicle, set_id=set_id)
+        await asyncio.to_thread(self.backend.hset, "devices", device_id, self.worker_id)
+
+    async def disconnect(self, device_id: str, websocket: WebSocket | None = None) -> None:
+        await self.manager.disconnect(device_id, websocket)
+        if not self.manager.has(device_id):
+            await asyncio.to_thread(self._unregister, device_id)
+
+    def _unregister(self, device_id: str) -> None:
+        # The device may already have reconnected to another worker
+        if self.backend.hget("devices", device_id) == self.worker_id:
+            self.backend.hdel("devices", device_id)
+
+    def _alive_workers(self, workers: Iterable[str] | None = None) -> set[str]:
+        """Workers (all, or those given) whose heartbeat is recent."""
+        cutoff = time.time() - self.stale_after
+        if workers is None:
+            beats = self.backend.hgetall("workers").items()
+        else:
+            workers = list(set(workers))
+            beats = zip(workers, self.backend.hmget("workers", workers))
+        return {w for w, ts in beats if ts is not None and float(ts) >= cutoff}
+
+    def owners(self, device_ids: Iterable[str]) -> dict[str, str]:
+        """Worker of each device connected to a live worker (unknown devices are left out)."""
+        device_ids = list(device_ids)
+        # Only the requested devices and their workers are read, not the whole fleet
+        registry = {d: w for d, w in zip(device_ids, self.backend.hmget("devices", device_ids)) if w is not None}
+        alive = self._alive_workers(registry.values()) if registry else set()
+        return {d: w for d, w in registry.items() if w in alive}
+
+    # ---- sending ----------------------------------------------------------
+
+    async def send_to(self, device_id: str, payload: dict) -> None:
+        """Queue payload for the device wherever it is connected; KeyError if it is nowhere."""
+        if self.manager.has(device_id):
+            await self.manager.send_to(device_id, payload)
+            return
+        owner = (await asyncio.to_thread(self.owners, [device_id])).get(device_id)
+        if owner is None or owner == self.worker_id:
+            raise KeyError(device_id)
+        await self._publish(f"worker:{owner}", {"op": "send", "messages": [[device_id, payload]]})
+
+    async def send_many(self, messages: Iterable[tuple[str, dict]]) -> dict:
+        local, remote = [], []
+        for device_id, payload in messages:
+            (local if self.manager.has(device_id) else remote).append((device_id, payload))
+        result = await self.manager.send_many(local)
+        if remote:
+            owners = await asyncio.to_thread(self.owners, [d for d, _ in remote])
+            by_worker: dict[str, list] = {}
+            for device_id, payload in remote:
+                owner = owners.get(device_id)
+                if owner is None or owner == self.worker_id:
+                    result["missing"].append(device_id)
+                else:
+                    by_worker.setdefault(owner, []).append([device_id, payload])
+            for owner, batch in by_worker.items():
+                await self._publish(f"worker:{owner}", {"op": "send", "messages": batch})
+                result["queued"] += len(batch)
+        return result
+
+    async def broadcast(self, payload: Any, device_ids: Iterable[str] | None = None, vehicle: str | None = None, set_id: int | None = None,
+                        viewers: bool = False) -> dict:
+        """Queue payload on every worker's matching connections.
+
+        ``queued`` counts local connections plus, for explicit ``device_ids``, the remote
+        devices it was forwarded to; tag-filtered remote matches are not counted.
+        """
+        device_ids = list(device_ids) if device_ids is not None else None
+        result = await self.manager.broadcast(payload, device_ids, vehicle, set_id, viewers)
+        if not self.backend.shares_cache:
+            return result
+        if device_ids is not None and result["missing"]:
+            owners = await asyncio.to_thread(self.owners, result["missing"])
+            remote = [d for d in result["missing"] if owners.get(d, self.worker_id) != self.worker_id]
+            result["missing"] = [d for d in result["missing"] if d not in owners]
+            if remote:
+                await self._publish("broadcast", {"op": "broadcast", "origin": self.worker_id, "payload": payload,
+                                                  "device_ids": remote, "vehicle": vehicle, "set": set_id, "viewers": viewers})
+                result["queued"] += len(remote)
+        elif device_ids is None:
+            await self._publish("broadcast", {"op": "broadcast", "origin": self.worker_id, "payload": payload,
+                                              "device_ids": None, "vehicle": vehicle, "set": set_id, "viewers": viewers})
+        return result
+
+    async def _publish(self, channel: str, message: dict) -> None:
+        self.forwarded += 1
+        await self.backend.publish(channel, jsonlib.dumps(message))
+
+    async def _on_direct(self, channel: str, data: bytes) -> None:
+        message = jsonlib.loads(data)
+        self.received += 1
+        result = await self.manager.send_many((d, p) for d, p in message["messages"])
+        if result["missing"]:
+            # Disconnected between the lookup and delivery
+            logging.info("Forwarded messages for unknown devices dropped: %s", result["missing"])
+
+    async def _on_broadcast(self, channel: str, data: bytes) -> None:
+        message = jsonlib.loads(data)
+        if message["origin"] == self.worker_id:
+            return
+        self.received += 1
+        await self.manager.broadcast(message["payload"], message["device_ids"], message["vehicle"], message["set"],
+                                     message.get("viewers", False))
+
+    def stats(self) -> dict:
+        """Local counters (on the event loop); ``shared_stats`` adds the registry's."""
+        stats = self.manager.stats()
+        stats.update(worker_id=self.worker_id, shared_backend=type(self.backend).__name__,
+                     forwarded=self.forwarded, received=self.received)
+        return stats
+
+    def shared_stats(self) -> dict:
+        """Registered devices and live workers across the fleet (blocking: run in a thread)."""
+        if not self.backend.shares_cache:
+            return {}
+        return {"registered_devices": self.backend.hlen("devices"), "workers": len(self._alive_workers())}
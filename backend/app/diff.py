@@ -0,0 +1,135 @@
+"""Route-level and step-level differences between two NextBillion responses.
+
+Routes are matched by vehicle and steps by job/shipment id. Only what changed is
+reported: added or removed routes, jobs added to or removed from a route, jobs moved
+to another vehicle, resequenced or retimed steps, and changed geometry or totals.
+Each changed or added route carries its new route object, so a client can patch its
+copy of the previous version without downloading the whole response.
+"""
+from typing import Any, Dict, List, Optional
+
+
+def _route_key(route: Dict[str, Any], idx: int) -> str:
+    vehicle = route.get("vehicle")
+    return str(vehicle) if vehicle is not None else f"#{idx}"
+
+
+def _tasks(route: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [s for s in route.get("steps", []) if s.get("id") is not None and s.get("type") not in ("start", "end")]
+
+
+def _geometry_sig(route: Dict[str, Any]) -> Any:
+    geom = route.get("geometry")
+    if isinstance(geom, str) and geom:
+        return geom
+    return [s.get("location") for s in route.get("steps", [])]
+
+
+def _num_delta(a: Any, b: Any) -> Optional[Dict[str, Any]]:
+    if a == b:
+        return None
+    delta = b - a if isinstance(a, (int, float)) and isinstance(b, (int, float)) else None
+    return {"from": a, "to": b, "delta": delta}
+
+
+def _unassigned_ids(result: Dict[str, Any]) -> set:
+    return {u.get("id") for u in result.get("unassigned") or [] if isinstance(u, dict)}
+
+
+def _route_diff(key: str, old: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    old_tasks, new_tasks = _tasks(old), _tasks(new)
+    old_ids = [s["id"] for s in old_tasks]
+    new_ids = [s["id"] for s in new_tasks]
+    old_set, new_set = set(old_ids), set(new_ids)
+    kept_old = [j for j in old_ids if j in new_set]
+    kept_new = [j for j in new_ids if j in old_set]
+    old_pos = {s["id"]: (i, s) for i, s in enumerate(old_tasks)}
+    rank_old = {j: i for i, j in enumerate(kept_old)}
+    rank_new = {j: i for i, j in enumerate(kept_new)}
+    steps = []
+    for i, s in enumerate(new_tasks):
+        prev = old_pos.get(s["id"])
+        if prev is None:
+            steps.append({"id": s["id"], "change": ["added"], "to": {"position": i, "arrival": s.get("arrival")}})
+            continue
+        j, o = prev
+        change = []
+        if rank_old[s["id"]] != rank_new[s["id"]]:
+            change.append("moved")
+        if o.get("arrival") != s.get("arrival"):
+            change.append("retimed")
+        if change:
+            steps.append({"id": s["id"], "change": change, "from": {"position": j, "arrival": o.get("arrival")},
+                          "to": {"position": i, "arrival": s.get("arrival")}})
+    for j, s in enumerate(old_tasks):
+        if s["id"] not in new_set:
+            steps.append({"id": s["id"], "change": ["removed"], "from": {"position": j, "arrival": s.get("arrival")}})
+    totals = {k: d for k in ("distance", "duration", "cost") if (d := _num_delta(old.get(k), new.get(k))) is not None}
+    geometry_changed = _geometry_sig(old) != _geometry_sig(new)
+    if not steps and not totals and not geometry_changed:
+        return None
+    return {
+        "vehicle": new.get("vehicle"),
+        "key": key,
+        "status": "changed",
+        "jobs_added": [j for j in new_ids if j not in old_set],
+        "jobs_removed": [j for j in old_ids if j not in new_set],
+        "sequence_changed": kept_old != kept_new,
+        "geometry_changed": geometry_changed,
+        "totals": totals,
+        "steps": steps,
+        "route": new,
+    }
+
+
+def diff_responses(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Delta from response ``old`` to response ``new`` (both full NextBillion payloads)."""
+    old_res, new_res = old.get("result", {}) or {}, new.get("result", {}) or {}
+    old_routes = {_route_key(r, i): (i, r) for i, r in enumerate(old_res.get("routes", []))}
+    new_routes = {_route_key(r, i): (i, r) for i, r in enumerate(new_res.get("routes", []))}
+    old_job = {s["id"]: k for k, (_, r) in old_routes.items() for s in _tasks(r)}
+    new_job = {s["id"]: k for k, (_, r) in new_routes.items() for s in _tasks(r)}
+
+    routes = []
+    unchanged = 0
+    for key, (idx, route) in new_routes.items():
+        if key not in old_routes:
+            ids = [s["id"] for s in _tasks(route)]
+            routes.append({"vehicle": route.get("vehicle"), "key": key, "status": "added", "route_index": {"from": None, "to": idx},
+                           "jobs_added": ids, "jobs_removed": [], "route": route})
+            continue
+        old_idx, old_route = old_routes[key]
+        entry = _route_diff(key, old_route, route)
+        if entry is None:
+            unchanged += 1
+            continue
+        entry["route_index"] = {"from": old_idx, "to": idx}
+        routes.append(entry)
+    for key, (idx, route) in old_routes.items():
+        if key not in new_routes:
+            routes.append({"vehicle": route.get("vehicle"), "key": key, "status": "removed", "route_index": {"from": idx, "to": None},
+                           "jobs_added": [], "jobs_removed": [s["id"] for s in _tasks(route)]})
+
+    reassigned = [{"id": j, "from": old_job[j], "to": v} for j, v in new_job.items() if j in old_job and old_job[j] != v]
+    old_un, new_un = _unassigned_ids(old_res), _unassigned_ids(new_res)
+    by_status = {s: sum(1 for r in routes if r["status"] == s) for s in ("added", "removed", "changed")}
+    return {
+        "summary": {
+            "routes_added": by_status["added"],
+            "routes_removed": by_status["removed"],
+            "routes_changed": by_status["changed"],
+            "routes_unchanged": unchanged,
+            "jobs_added": sum(1 for j in new_job if j not in old_job),
+            "jobs_removed": sum(1 for j in old_job if j not in new_job),
+            "jobs_reassigned": len(reassigned),
+            "totals": {k: _num_delta((old_res.get("summary") or {}).get(k), (new_res.get("summary") or {}).get(k))
+                       for k in ("distance", "duration", "cost")},
+        },
+        "routes": routes,
+        "jobs": {
+            "added": [j for j in new_job if j not in old_job],
+            "removed": [j for j in old_job if j not in new_job],
+            "reassigned": reassigned,
+        },
+        "unassigned": {"added": sorted(new_un - old_un, key=str), "removed": sorted(old_un - new_un, key=str)},
+    }
@@ -0,0 +1,269 @@
+"""Reverse geocoding with a persistent place-name cache.
+
+Lookups are keyed by coordinates rounded to ``precision`` decimals (4 = ~11 m, well
+inside the provider's 50 m search radius), so the same depot or job location is resolved
+upstream once, whoever asks. Results live in SQLite and in a bounded in-process dict
+in front of it. Misses ("no address here") are cached too and retried after
+``miss_ttl`` seconds. Concurrent misses for the same key share one upstream call.
+
+Providers are pluggable (``register_provider``): ``tomtom`` calls the TomTom Search
+API with urllib, and ``fixture`` answers from a local JSON file (or synthesizes names),
+for tests and offline runs. Select with ``GEOCODER=tomtom|fixture``.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable
+
+PROVIDERS: dict[str, Callable[..., "GeocodeProvider"]] = {}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS places (
+    key TEXT PRIMARY KEY,
+    name TEXT,
+    address TEXT,
+    provider TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+class GeocodeError(Exception):
+    """The provider could not be reached or refused the request (not cached)."""
+
+
+def register_provider(name: str) -> Callable:
+    def decorate(cls):
+        PROVIDERS[name] = cls
+        return cls
+    return decorate
+
+
+class GeocodeProvider:
+    name = "base"
+    #: Whether lookups need an API key (from the server config or the caller)
+    needs_key = False
+
+    def reverse(self, lat: float, lon: float, key: str | None = None) -> dict | None:
+        """{"name": str, "address": {...}} for the point, or None when nothing is there."""
+        raise NotImplementedError
+
+
+@register_provider("tomtom")
+class TomTomProvider(GeocodeProvider):
+    name = "tomtom"
+    needs_key = True
+    URL = "https://api.tomtom.com/search/2/reverseGeocode/{lat},{lon}.json"
+
+    def __init__(self, api_key: str | None = None, radius: int = 50, timeout: float = 5.0) -> None:
+        self.api_key = api_key if api_key is not None else os.getenv("TOMTOM_API_KEY")
+        self.radius = radius
+        self.timeout = timeout
+
+    def reverse(self, lat, lon, key=None):
+        key = self.api_key or key
+        if not key:
+            raise GeocodeError("No TomTom API key (set TOMTOM_API_KEY or pass key=)")
+        query = urllib.parse.urlencode({"key": key, "radius": self.radius})
+        url = self.URL.format(lat=lat, lon=lon) + "?" + query
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as r:
+                data = json.loads(r.read())
+        except urllib.error.HTTPError as exc:
+            raise GeocodeError(f"TomTom reverse geocode failed: HTTP {exc.code}") from None
+        except (urllib.error.URLError, OSError, ValueError) as exc:
+            raise GeocodeError(f"TomTom reverse geocode failed: {exc}") from None
+        addresses = data.get("addresses") or []
+        if not addresses:
+            return None
+        address = addresses[0].get("address") or {}
+        name = address.get("freeformAddress")
+        return {"name": name, "address": address} if name else None
+
+
+@register_provider("fixture")
+class FixtureProvider(GeocodeProvider):
+    """Answers from ``{"lat,lon": "name"}`` in ``GEOCODE_FIXTURE`` (rounded like the cache);
+    points not in the file get a synthetic name."""
+
+    name = "fixture"
+
+    def __init__(self, path: str | None = None, precision: int = 4) -> None:
+        path = path if path is not None else os.getenv("GEOCODE_FIXTURE")
+        self.precision = precision
+        self.places: dict[str, str] = {}
+        if path:
+            with open(path, "r", encoding="utf-8") as f:
+                self.places = json.load(f)
+        self.calls = 0
+
+    def reverse(self, lat, lon, key=None):
+        self.calls += 1
+        k = place_key(lat, lon, self.precision)
+        if self.places:
+            name = self.places.get(k)
+            return {"name": name, "address": {"freeformAddress": name}} if name else None
+        name = f"Fixture place {k}"
+        return {"name": name, "address": {"freeformAddress": name}}
+
+
+def place_key(lat: float, lon: float, precision: int) -> str:
+    return f"{lat:.{precision}f},{lon:.{precision}f}"
+
+
+class Geocoder:
+    """Cache-first reverse geocoder over SQLite (safe to use from any thread)."""
+
+    def __init__(self, path: str, provider: GeocodeProvider, precision: int = 4,
+                 miss_ttl: float = 86400.0, memory_entries: int = 100_000) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.provider = provider
+        self.precision = precision
+        self.miss_ttl = miss_ttl
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._memory: OrderedDict[str, tuple[str | None, dict | None, float]] = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream = 0
+        self.errors = 0
+
+    def _remember(self, key: str, entry: tuple) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def cached(self, lat: float, lon: float) -> dict | None:
+        """The cached result (``name`` None for a known miss), or None if not cached or expired."""
+        key = place_key(lat, lon, self.precision)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is None:
+            with self._lock:
+                row = self._db.execute("SELECT name, address, created FROM places WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            entry = (row[0], json.loads(row[1]) if row[1] else None, row[2])
+            self._remember(key, entry)
+        name, address, created = entry
+        if name is None and time.time() - created > self.miss_ttl:
+            return None
+        return {"key": key, "name": name, "address": address}
+
+    def _store(self, key: str, result: dict | None) -> None:
+        name = result["name"] if result else None
+        address = result.get("address") if result else None
+        created = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO places (key, name, address, provider, created) VALUES (?, ?, ?, ?, ?)",
+                             (key, name, json.dumps(address) if address else None, self.provider.name, created))
+        self._remember(key, (name, address, created))
+
+    def reverse(self, lat: float, lon: float, key: str | None = None) -> dict:
+        """{"key", "name", "address", "cached"}; raises GeocodeError when the provider fails."""
+        hit = self.cached(lat, lon)
+        if hit is not None:
+            self.hits += 1
+            return dict(hit, cached=True)
+        self.misses += 1
+        pkey = place_key(lat, lon, self.precision)
+        with self._lock:
+            pending = self._inflight.get(pkey)
+            if pending is None:
+                pending = self._inflight[pkey] = Future()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            # Another thread is already asking upstream for this key: wait for its answer
+            self.coalesced += 1
+            return dict(pending.result(), cached=True)
+        try:
+            # The previous leader may have stored the key between our lookup and registering
+            hit = self.cached(lat, lon)
+            if hit is not None:
+                out = dict(hit, cached=True)
+            else:
+                # Ask for the rounded point: every caller of this cache key gets the same answer
+                plat, plon = (float(x) for x in pkey.split(","))
+                self.upstream += 1
+                try:
+                    result = self.provider.reverse(plat, plon, key)
+                except GeocodeError:
+                    self.errors += 1
+                    raise
+                self._store(pkey, result)
+                out = {"key": pkey, "name": result["name"] if result else None,
+                       "address": result.get("address") if result else None, "cached": False}
+        except BaseException as exc:
+            pending.set_exception(exc)
+            raise
+        else:
+            pending.set_result(out)
+            return out
+        finally:
+            with self._lock:
+                del self._inflight[pkey]
+
+    def prewarm(self, points: Iterable[tuple[float, float]], key: str | None = None, workers: int = 4,
+                progress: Callable[[float, str], None] | None = None) -> dict:
+        """Resolve every uncached point (deduplicated by cache key) with ``workers`` threads.
+
+        An exception from ``progress`` (job cancellation) drops the queued lookups; only
+        the ones already running are waited for.
+        """
+        todo = {}
+        total = 0
+        for lat, lon in points:
+            total += 1
+            if self.cached(lat, lon) is None:
+                todo.setdefault(place_key(lat, lon, self.precision), (lat, lon))
+        done = failed = 0
+        if todo:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geocode") as pool:
+                futures = [pool.submit(self.reverse, lat, lon, key) for lat, lon in todo.values()]
+                try:
+                    for i, fut in enumerate(futures, 1):
+                        try:
+                            fut.result()
+                            done += 1
+                        except GeocodeError:
+                            failed += 1
+                        if progress is not None:
+                            progress(i / len(futures), f"{i}/{len(futures)} places")
+                except BaseException:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+        return {"points": total, "unique_uncached": len(todo), "resolved": done, "failed": failed}
+
+    def stats(self) -> dict:
+        with self._lock:
+            stored = self._db.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+        return {"provider": self.provider.name, "precision": self.precision, "stored": stored,
+                "memory": len(self._memory), "hits": self.hits, "misses": self.misses,
+                "coalesced": self.coalesced, "upstream": self.upstream, "errors": self.errors}
+
+
+def geocoder_from_env(default_path: str) -> Geocoder:
+    name = os.getenv("GEOCODER", "tomtom")
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown GEOCODER: {name}")
+    precision = int(os.getenv("GEOCODE_PRECISION", "4"))
+    provider: Any = PROVIDERS[name](precision=precision) if name == "fixture" else PROVIDERS[name]()
+    return Geocoder(os.getenv("GEOCODE_DB", default_path), provider, precision=precision)
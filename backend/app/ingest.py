@@ -0,0 +1,359 @@
+"""Streaming, validating ingestion of uploaded jobs/vehicles CSVs.
+
+``CsvIngestor`` is fed raw upload chunks. It writes the CSV to disk unchanged and
+parses complete records incrementally (quote aware, so quoted commas and newlines
+survive), validating known columns as it goes. Each column is appended to a
+``.npy`` file in a ``<csv name>.columns/`` sidecar next to the CSV:
+  - numeric columns -> float64 (empty cells are NaN)
+  - ``;``-separated vector columns such as vehicle ``capacity`` "12;6000" -> float64 (rows, width)
+  - everything else -> UTF-8 blob ``<col>.utf8`` plus int64 end ``<col>.offsets.npy``
+Memory stays flat regardless of row count. ``load_columns`` memory-maps a sidecar
+that is still fresh for its CSV.
+"""
+import codecs
+import csv
+import io
+import json
+import math
+import os
+import re
+import shutil
+import uuid
+from typing import Any
+
+from .npyio import NpyAppender, open_npy
+
+MANIFEST = "manifest.json"
+PREVIEW_ROWS = 10
+MAX_ERRORS = 20
+
+# Per kind: required columns, numeric columns with optional (min, max) bounds, vector columns.
+# Column names are matched case-insensitively.
+SCHEMAS: dict[str, dict[str, Any]] = {
+    "jobs": {
+        "required": ("ID", "Location Lat", "Location Lng"),
+        "numeric": {
+            "Location Lat": (-90, 90),
+            "Location Lng": (-180, 180),
+            "Pickup Quantity": (0, None),
+            "Delivery Quantity": (0, None),
+            "Service Time": (0, None),
+        },
+        "vector": {},
+    },
+    "vehicles": {
+        "required": ("id", "capacity"),
+        "numeric": {
+            "start_latitude": (-90, 90),
+            "start_longitude": (-180, 180),
+            "end_latitude": (-90, 90),
+            "end_longitude": (-180, 180),
+            "shift_start": (0, None),
+            "shift_end": (0, None),
+            "max_tasks": (0, None),
+        },
+        "vector": {"capacity": (0, None)},
+    },
+}
+
+
+class IngestError(ValueError):
+    """Upload rejected: missing columns or invalid rows (``errors`` lists the first few)."""
+
+    def __init__(self, message: str, errors: list[str]) -> None:
+        super().__init__(message)
+        self.errors = errors
+
+
+def sidecar_dir(csv_path: str) -> str:
+    return csv_path + ".columns"
+
+
+def _column_file(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name.strip()) or "column"
+
+
+class _StringColumn:
+    def __init__(self, directory: str, stem: str) -> None:
+        self.blob = open(os.path.join(directory, stem + ".utf8"), "wb")
+        self.offsets = NpyAppender(os.path.join(directory, stem + ".offsets.npy"), "<i8")
+        self.end = 0
+
+    def append(self, value: str) -> None:
+        data = value.encode("utf-8")
+        self.blob.write(data)
+        self.end += len(data)
+        self.offsets.append(self.end)
+
+    def close(self) -> None:
+        self.blob.close()
+        self.offsets.close()
+
+
+class CsvIngestor:
+    """Incremental CSV -> disk copy + columnar sidecar for one upload."""
+
+    def __init__(self, kind: str, dest: str, copy_source: bool = True) -> None:
+        if kind not in SCHEMAS:
+            raise ValueError(f"unknown CSV kind: {kind}")
+        self.kind = kind
+        self.schema = SCHEMAS[kind]
+        self.dest = dest
+        token = uuid.uuid4().hex[:8]
+        folder, name = os.path.split(dest)
+        # Written under temporary names and moved into place by close()
+        self._tmp_csv = os.path.join(folder, f".{name}.{token}.part")
+        self._tmp_cols = os.path.join(folder, f".{name}.{token}.columns")
+        os.makedirs(self._tmp_cols)
+        # Without copy_source dest already holds the CSV and only the sidecar is built
+        self._raw = open(self._tmp_csv, "wb") if copy_source else None
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._pending = ""
+        self._in_quotes = False
+        self._scan_from = 0
+        self.header: list[str] | None = None
+        self.rows = 0
+        self.preview: list[list[str]] = []
+        self.errors: list[str] = []
+        self.invalid_rows = 0
+        self._columns: list[tuple[str, str, Any, Any]] = []  # (name, kind, writer, bounds)
+        self._stems: list[str] = []
+        self._vector_pending = 0
+
+    # ---- parsing ---------------------------------------------------------
+
+    def feed(self, chunk: bytes) -> None:
+        if self._raw is not None:
+            self._raw.write(chunk)
+        self._pending += self._decoder.decode(chunk)
+        self._parse_complete_records()
+
+    def _parse_complete_records(self, final: bool = False) -> None:
+        text = self._pending
+        cut = 0
+        i = self._scan_from
+        in_quotes = self._in_quotes
+        # A newline ends a record only outside quotes ("" escapes flip parity twice)
+        while True:
+            n = text.find("\n", i)
+            if n < 0:
+                break
+            if text.count('"', i, n) & 1:
+                in_quotes = not in_quotes
+            i = n + 1
+            if not in_quotes:
+                cut = i
+        if final:
+            cut = len(text)
+        if cut:
+            for record in csv.reader(io.StringIO(text[:cut])):
+                self._record(record)
+        # Remember how far the leftover was already scanned so chunks are scanned once
+        self._pending = text[cut:]
+        self._scan_from = i - cut if not final else 0
+        self._in_quotes = in_quotes and not final
+
+    def _record(self, record: list[str]) -> None:
+        if not record or (len(record) == 1 and not record[0].strip()):
+            return
+        if len(self.preview) < PREVIEW_ROWS:
+            self.preview.append(record)
+        if self.header is None:
+            self._start(record)
+            return
+        self.rows += 1
+        row_errors = []
+        for idx, (name, kind, writer, bounds) in enumerate(self._columns):
+            cell = record[idx].strip() if idx < len(record) else ""
+            if kind == "string":
+                writer.append(cell)
+                continue
+            try:
+                values = [float(v) for v in cell.split(";")] if cell else []
+            except ValueError:
+                row_errors.append(f"row {self.rows}: {name}={cell!r} is not a number")
+                values = []
+            for v in values:
+                if math.isnan(v) or (bounds[0] is not None and v < bounds[0]) or (bounds[1] is not None and v > bounds[1]):
+                    row_errors.append(f"row {self.rows}: {name}={cell!r} out of range")
+                    break
+            if kind == "numeric":
+                if len(values) > 1:
+                    row_errors.append(f"row {self.rows}: {name}={cell!r} must be a single number")
+                writer.append(values[0] if len(values) == 1 else math.nan)
+            else:
+                self._append_vector(idx, values, row_errors)
+        if row_errors:
+            self.invalid_rows += 1
+            for e in row_errors:
+                if len(self.errors) < MAX_ERRORS:
+                    self.errors.append(e)
+
+    def _append_vector(self, idx: int, values: list[float], row_errors: list[str]) -> None:
+        name, kind, writer, bounds = self._columns[idx]
+        if writer is None:
+            # Width is fixed by the first non-empty value; earlier empty rows become NaN
+            if not values:
+                self._vector_pending += 1
+                return
+            writer = NpyAppender(os.path.join(self._tmp_cols, self._stems[idx] + ".npy"), "<f8", width=len(values))
+            for _ in range(self._vector_pending):
+                writer.append([math.nan] * writer.width)
+            self._vector_pending = 0
+            self._columns[idx] = (name, kind, writer, bounds)
+        elif values and len(values) != writer.width:
+            row_errors.append(f"row {self.rows}: {name} has {len(values)} values, expected {writer.width}")
+        writer.append(values if len(values) == writer.width else [math.nan] * writer.width)
+
+    def _start(self, header: list[str]) -> None:
+        self.header = [h.strip() for h in header]
+        lower = {h.lower(): h for h in self.header}
+        missing = [c for c in self.schema["required"] if c.lower() not in lower]
+        if missing:
+            raise IngestError(f"{self.kind} CSV is missing required columns: {', '.join(missing)}", [])
+        numeric = {k.lower(): v for k, v in self.schema["numeric"].items()}
+        vector = {k.lower(): v for k, v in self.schema["vector"].items()}
+        seen = set()
+        for name in self.header:
+            stem = _column_file(name)
+            while stem in seen:
+                stem += "_"
+            seen.add(stem)
+            self._stems.append(stem)
+            key = name.lower()
+            if key in numeric:
+                self._columns.append((name, "numeric", NpyAppender(os.path.join(self._tmp_cols, stem + ".npy")), numeric[key]))
+            elif key in vector:
+                self._columns.append((name, "vector", None, vector[key]))
+            else:
+                self._columns.append((name, "string", _StringColumn(self._tmp_cols, stem), None))
+
+    # ---- finishing -------------------------------------------------------
+
+    def close(self) -> dict:
+        """Finish parsing; on success move CSV and sidecar into place and return the manifest."""
+        try:
+            if self._raw is not None:
+                self._raw.close()
+            self._pending += self._decoder.decode(b"", final=True)
+            self._parse_complete_records(final=True)
+            if self.header is None:
+                raise IngestError(f"{self.kind} CSV is empty", [])
+            if self.invalid_rows:
+                raise IngestError(f"{self.kind} CSV has {self.invalid_rows} invalid rows", self.errors)
+            columns = {}
+            for idx, (name, kind, writer, _) in enumerate(self._columns):
+                if writer is None:  # vector column with no values at all
+                    writer = NpyAppender(os.path.join(self._tmp_cols, self._stems[idx] + ".npy"), "<f8", width=1)
+                    for _ in range(self.rows):
+                        writer.append([math.nan])
+                writer.close()
+                if kind == "string":
+                    stem = self._stems[idx]
+                    columns[name] = {"kind": kind, "blob": stem + ".utf8", "offsets": stem + ".offsets.npy"}
+                else:
+                    columns[name] = {"kind": kind, "file": os.path.basename(writer.path), "width": writer.width}
+            if self._raw is not None:
+                os.replace(self._tmp_csv, self.dest)
+            st = os.stat(self.dest)
+            manifest = {
+                "kind": self.kind,
+                "source": os.path.basename(self.dest),
+                "source_size": st.st_size,
+                "source_mtime": st.st_mtime,
+                "rows": self.rows,
+                "columns": columns,
+            }
+            with open(os.path.join(self._tmp_cols, MANIFEST), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            final = sidecar_dir(self.dest)
+            if os.path.isdir(final):
+                shutil.rmtree(final)
+            os.replace(self._tmp_cols, final)
+            return manifest
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self) -> None:
+        if self._raw is not None and not self._raw.closed:
+            self._raw.close()
+        for _, kind, writer, _ in self._columns:
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception:
+                    pass
+        if os.path.exists(self._tmp_csv):
+            os.remove(self._tmp_csv)
+        shutil.rmtree(self._tmp_cols, ignore_errors=True)
+
+
+def index_file(kind: str, csv_path: str, chunk_size: int = 1 << 20) -> dict:
+    """Build (or rebuild) the sidecar for a CSV already on disk; returns its manifest."""
+    ingestor = CsvIngestor(kind, csv_path, copy_source=False)
+    try:
+        with open(csv_path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                ingestor.feed(chunk)
+    except BaseException:
+        ingestor.abort()
+        raise
+    return ingestor.close()
+
+
+def load_columns(csv_path: str) -> dict[str, Any] | None:
+    """Memory-map the sidecar columns of csv_path, or None if missing or stale.
+
+    Numeric/vector columns map to arrays; string columns to ``(blob, offsets)`` pairs
+    (use ``string_at``).
+    """
+    folder = sidecar_dir(csv_path)
+    try:
+        with open(os.path.join(folder, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        st = os.stat(csv_path)
+    except FileNotFoundError:
+        return None
+    if manifest["source_size"] != st.st_size or manifest["source_mtime"] != st.st_mtime:
+        return None
+    cols: dict[str, Any] = {}
+    for name, meta in manifest["columns"].items():
+        if meta["kind"] == "string":
+            with open(os.path.join(folder, meta["blob"]), "rb") as f:
+                blob = f.read()
+            cols[name] = (blob, open_npy(os.path.join(folder, meta["offsets"])))
+        else:
+            cols[name] = open_npy(os.path.join(folder, meta["file"]))
+    return {"manifest": manifest, "columns": cols}
+
+
+def string_at(column: tuple, i: int) -> str:
+    blob, offsets = column
+    start = int(offsets[i - 1]) if i else 0
+    return blob[start:int(offsets[i])].decode("utf-8")
+
+
+def _numeric_stats(values) -> dict:
+    present = [v for v in values if not math.isnan(v)]
+    if not present:
+        return {"count": 0, "nulls": len(values), "min": None, "max": None, "mean": None}
+    return {"count": len(present), "nulls": len(values) - len(present),
+            "min": min(present), "max": max(present), "mean": sum(present) / len(present)}
+
+
+def column_stats(loaded: dict) -> dict:
+    """Per-column summary of a ``load_columns`` result, computed from the mapped arrays."""
+    out = {}
+    rows = loaded["manifest"]["rows"]
+    for name, col in loaded["columns"].items():
+        meta = loaded["manifest"]["columns"][name]
+        if meta["kind"] == "string":
+            out[name] = {"kind": "string", "distinct": len({string_at(col, i) for i in range(rows)})}
+        elif meta["kind"] == "numeric":
+            out[name] = {"kind": "numeric", **_numeric_stats(col.tolist())}
+        else:
+            data = col.tolist()
+            out[name] = {"kind": "vector", "width": meta["width"],
+                         "components": [_numeric_stats([r[j] for r in data]) for j in range(meta["width"])]}
+    return out
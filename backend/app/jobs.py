@@ -0,0 +1,355 @@
+"""Background job queue for long per-set computations (e.g. solving a set).
+
+Jobs persist in SQLite, so queued work survives a restart, and several worker processes
+may share one database. A running job records its owner (worker id) and a heartbeat the
+owner refreshes every ``heartbeat`` seconds; jobs whose owner stopped beating for
+``stale_after`` seconds (a crashed or stopped worker) are queued again by any live
+worker, and a worker shutting down hands its running jobs back at once. Cancelling
+sets a persisted flag, so a job stops wherever it runs. A fixed number of worker tasks take jobs
+highest priority first; the priority comes from the submit call or from the per-set
+default. Each handler runs in a thread and reports progress through a callback. Every
+state change is passed to ``notify``, which the app routes to WebSockets tagged with
+the job's set.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    set_id INTEGER,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    owner TEXT,
+    heartbeat REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS set_priority (
+    set_id INTEGER PRIMARY KEY,
+    priority INTEGER NOT NULL
+);
+"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler (from its progress callback) once its job is cancelled."""
+
+
+class JobStore:
+    """SQLite persistence for jobs and per-set priorities (safe to use from any thread)."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        # Databases created before jobs had owners
+        cols = {r["name"] for r in self._db.execute("PRAGMA table_info(jobs)")}
+        for col, decl in (("owner", "TEXT"), ("heartbeat", "REAL"), ("cancel_requested", "INTEGER NOT NULL DEFAULT 0")):
+            if col not in cols:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {col} {decl}")
+
+    def _execute(self, sql: str, args: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["set"] = job.pop("set_id")
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def insert(self, job: dict) -> None:
+        self._execute(
+            "INSERT INTO jobs (id, kind, set_id, params, priority, status, progress, created) VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+            (job["id"], job["kind"], job["set"], json.dumps(job["params"]), job["priority"], job["status"], job["created"]),
+        )
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        self._execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def _update_count(self, sql: str, args: tuple) -> int:
+        with self._lock:
+            return self._db.execute(sql, args).rowcount
+
+    def claim(self, job_id: str, started: float, owner: str) -> bool:
+        """Mark a queued job running for ``owner``; False if another worker got it first or it was cancelled."""
+        return self._update_count(
+            "UPDATE jobs SET status = ?, started = ?, progress = 0, owner = ?, heartbeat = ? "
+            "WHERE id = ? AND status = ? AND cancel_requested = 0",
+            (RUNNING, started, owner, started, job_id, QUEUED)) == 1
+
+    def beat(self, owner: str, now: float) -> None:
+        self._execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = ?", (now, owner, RUNNING))
+
+    def requeue(self, cutoff: float | None = None, owner: str | None = None) -> list[str]:
+        """Put running jobs back in the queue: those of ``owner``, or those whose heartbeat is older than ``cutoff``."""
+        where, args = ("owner = ?", (owner,)) if owner is not None else ("(heartbeat IS NULL OR heartbeat < ?)", (cutoff,))
+        with self._lock:
+            ids = [r["id"] for r in self._db.execute(f"SELECT id FROM jobs WHERE status = ? AND {where}", (RUNNING, *args))]
+            for job_id in ids:
+                # A job cancelled while its owner was gone is finished rather than requeued
+                self._db.execute(f"UPDATE jobs SET status = CASE cancel_requested WHEN 0 THEN ? ELSE ? END, "
+                                 f"finished = CASE cancel_requested WHEN 0 THEN NULL ELSE ? END, "
+                                 f"progress = 0, started = NULL, owner = NULL, heartbeat = NULL "
+                                 f"WHERE id = ? AND status = ? AND {where}", (QUEUED, CANCELLED, time.time(), job_id, RUNNING, *args))
+        return ids
+
+    def request_cancel(self, job_id: str, finished: float) -> bool:
+        """Flag a job cancelled; True if it was still queued (then it is cancelled outright)."""
+        self._execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        return self._update_count("UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?",
+                                  (CANCELLED, finished, job_id, QUEUED)) == 1
+
+    def cancel_requested(self, job_id: str) -> bool:
+        rows = self._execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,))
+        return bool(rows and rows[0]["cancel_requested"])
+
+    def get(self, job_id: str) -> dict | None:
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._row(rows[0]) if rows else None
+
+    def query(self, set_id: int | None = None, status: str | None = None, limit: int = 100) -> list[dict]:
+        where, args = [], []
+        if set_id is not None:
+            where.append("set_id = ?")
+            args.append(set_id)
+        if status is not None:
+            where.append("status = ?")
+            args.append(status)
+        sql = "SELECT * FROM jobs" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY created DESC LIMIT ?"
+        return [self._row(r) for r in self._execute(sql, (*args, limit))]
+
+    def queued(self) -> list[dict]:
+        """Queued jobs, oldest first."""
+        rows = self._execute("SELECT * FROM jobs WHERE status = ? ORDER BY created", (QUEUED,))
+        return [self._row(r) for r in rows]
+
+    def counts(self) -> dict:
+        return {r["status"]: r["n"] for r in self._execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+    def set_priority(self, set_id: int, priority: int) -> None:
+        self._execute("INSERT OR REPLACE INTO set_priority (set_id, priority) VALUES (?, ?)", (set_id, priority))
+
+    def priority_for(self, set_id: int | None) -> int:
+        if set_id is None:
+            return 0
+        rows = self._execute("SELECT priority FROM set_priority WHERE set_id = ?", (set_id,))
+        return rows[0]["priority"] if rows else 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobQueue:
+    """Priority queue + bounded worker pool over a JobStore.
+
+    ``register(kind, handler)`` adds a job type; handlers are plain functions
+    ``handler(set_id, params, progress) -> dict`` run in a thread, where
+    ``progress(fraction, message)`` records progress and raises JobCancelled when the
+    job was cancelled. Higher priority runs first; ties run in submission order.
+    """
+
+    def __init__(self, store: JobStore, concurrency: int | None = None,
+                 notify: Callable[[dict], Awaitable[None]] | None = None, worker_id: str | None = None,
+                 heartbeat: float | None = None, stale_after: float | None = None) -> None:
+        self.store = store
+        self.concurrency = concurrency or int(os.getenv("JOB_WORKERS", "2"))
+        self.notify = notify
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat = heartbeat or float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+        self.stale_after = stale_after or float(os.getenv("JOB_STALE_SECONDS", "30"))
+        self._handlers: dict[str, Callable[..., dict]] = {}
+        self._queue: asyncio.PriorityQueue | None = None
+        self._order = itertools.count()
+        self._workers: list[asyncio.Task] = []
+        self._cancelled: set[str] = set()
+        self._running: set[str] = set()
+        self._in_queue: set[str] = set()
+        self._heartbeat_task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def register(self, kind: str, handler: Callable[..., dict]) -> None:
+        self._handlers[kind] = handler
+
+    @property
+    def kinds(self) -> list[str]:
+        return sorted(self._handlers)
+
+    # ---- lifecycle --------------------------------------------------------
+
+    async def start(self) -> None:
+        """Queue persisted jobs (and those of dead workers) and start the workers and heartbeat."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        # Jobs this worker id still owns were interrupted by its previous run
+        await asyncio.to_thread(self.store.requeue, owner=self.worker_id)
+        await self._recover()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        # Running handlers stop at their next progress() call; their jobs go back to the
+        # queue for other workers (or the next start)
+        self._cancelled.update(self._running)
+        tasks = self._workers + ([self._heartbeat_task] if self._heartbeat_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._heartbeat_task = None
+        for job_id in await asyncio.to_thread(self.store.requeue, owner=self.worker_id):
+            logging.info("Job %s handed back on shutdown", job_id)
+
+    async def _recover(self) -> None:
+        """Requeue jobs of workers that stopped beating, and queue every queued job not yet known here."""
+        for job_id in await asyncio.to_thread(self.store.requeue, cutoff=time.time() - self.stale_after):
+            logging.info("Job %s was interrupted (owner stale); requeued", job_id)
+        for job in await asyncio.to_thread(self.store.queued):
+            if job["id"] not in self._in_queue:
+                self._push(job)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                await asyncio.to_thread(self.store.beat, self.worker_id, time.time())
+                await self._recover()
+            except Exception as exc:
+                logging.warning("Job heartbeat failed: %s", exc)
+
+    # ---- API --------------------------------------------------------------
+
+    async def submit(self, kind: str, set_id: int | None = None, params: dict | None = None, priority: int | None = None) -> dict:
+        if kind not in self._handlers:
+            raise KeyError(kind)
+        if priority is None:
+            priority = await asyncio.to_thread(self.store.priority_for, set_id)
+        job = {"id": uuid.uuid4().hex, "kind": kind, "set": set_id, "params": params or {}, "priority": priority,
+               "status": QUEUED, "progress": 0.0, "created": time.time()}
+        await asyncio.to_thread(self.store.insert, job)
+        self._push(job)
+        await self._notify(job)
+        return await asyncio.to_thread(self.store.get, job["id"])
+
+    async def cancel(self, job_id: str) -> dict | None:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        self._cancelled.add(job_id)
+        # Persisted, so the worker running it (possibly another process) sees it in progress()
+        if await asyncio.to_thread(self.store.request_cancel, job_id, time.time()):
+            # Was still queued: any worker skips it when popped
+            job = await asyncio.to_thread(self.store.get, job_id)
+            await self._notify(job)
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.concurrency,
+            "running": len(self._running),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "kinds": self.kinds,
+            "by_status": self.store.counts(),
+        }
+
+    # ---- internals --------------------------------------------------------
+
+    def _push(self, job: dict) -> None:
+        self._in_queue.add(job["id"])
+        self._queue.put_nowait((-job["priority"], next(self._order), job["id"]))
+
+    async def _notify(self, job: dict) -> None:
+        if self.notify is None:
+            return
+        event = {k: job.get(k) for k in ("id", "kind", "set", "status", "progress", "message", "error")}
+        try:
+            await self.notify({"type": "job", "job": event})
+        except Exception as exc:
+            logging.warning("Job notify failed: %s", exc)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            self._in_queue.discard(job_id)
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None or job["status"] != QUEUED:
+                continue
+            # Workers of other processes share the store and may hold the same pending job
+            if not await asyncio.to_thread(self.store.claim, job_id, time.time(), self.worker_id):
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict) -> None:
+        job_id = job["id"]
+        job.update(status=RUNNING, progress=0.0)
+        await self._notify(job)
+        last = [0.0]
+
+        def progress(fraction: float, message: str | None = None) -> None:
+            # Called from the handler thread
+            if job_id in self._cancelled:
+                raise JobCancelled(job_id)
+            now = time.monotonic()
+            if fraction < 1.0 and now - last[0] < 0.25:
+                return
+            last[0] = now
+            # Cancelled from any worker: the flag is in the shared store
+            if self.store.cancel_requested(job_id):
+                self._cancelled.add(job_id)
+                raise JobCancelled(job_id)
+            self.store.update(job_id, progress=fraction, message=message)
+            update = dict(job, progress=fraction, message=message)
+            asyncio.run_coroutine_threadsafe(self._notify(update), self._loop)
+
+        handler = self._handlers.get(job["kind"])
+        self._running.add(job_id)
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind {job['kind']}")
+            result = await asyncio.to_thread(handler, job["set"], job["params"], progress)
+            fields = {"status": DONE, "progress": 1.0, "result": result}
+        except JobCancelled:
+            fields = {"status": CANCELLED}
+        except asyncio.CancelledError:
+            # Shutdown: leave it 'running' so the next start requeues it
+            raise
+        except Exception as exc:
+            logging.exception("Job %s failed", job_id)
+            fields = {"status": FAILED, "error": str(getattr(exc, "detail", None) or exc)}
+        finally:
+            self._running.discard(job_id)
+        self._cancelled.discard(job_id)
+        await asyncio.to_thread(self.store.update, job_id, finished=time.time(), **fields)
+        await self._notify(await asyncio.to_thread(self.store.get, job_id))
@@ -0,0 +1,70 @@
+"""Pluggable JSON encode/decode for API responses and data files.
+
+Uses orjson or msgspec when installed (JSON_BACKEND=orjson|msgspec|stdlib forces one)
+and falls back to the stdlib json module. All backends produce compact UTF-8 bytes.
+"""
+import json
+import os
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:  # optional
+    import orjson
+except ImportError:
+    orjson = None
+try:  # optional
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _pick_backend() -> str:
+    wanted = os.getenv("JSON_BACKEND", "auto").lower()
+    available = {"orjson": orjson is not None, "msgspec": msgspec is not None, "stdlib": True}
+    if wanted != "auto":
+        if not available.get(wanted):
+            raise RuntimeError(f"JSON_BACKEND={wanted} is not installed")
+        return wanted
+    return next(name for name in ("orjson", "msgspec", "stdlib") if available[name])
+
+
+BACKEND = _pick_backend()
+
+DecodeError: tuple = (json.JSONDecodeError,)  # orjson.JSONDecodeError subclasses it
+if msgspec is not None:
+    DecodeError += (msgspec.DecodeError,)
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    # Same options as starlette's JSONResponse
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+if BACKEND == "orjson":
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=_ORJSON_OPTS)
+
+    loads = orjson.loads
+elif BACKEND == "msgspec":
+    _encoder = msgspec.json.Encoder()
+    _decoder = msgspec.json.Decoder()
+    dumps = _encoder.encode
+    loads = _decoder.decode
+else:
+    dumps = _stdlib_dumps
+    loads = json.loads
+
+
+def load_file(path: str) -> Any:
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the selected backend."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
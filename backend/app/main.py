@@ -1,89 +1,144 @@
 
-from fastapi import FastAPI, Response, Query, HTTPException, UploadFile, File as FF, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, Response, Query, HTTPException, UploadFile, File as FF, WebSocket, WebSocketDisconnect
 import logging
 import re
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-import json, os, re, glob, time, asyncio
+import os, re, time, asyncio, gzip, hashlib, socket
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
-from .utils import nb_to_geojson, summarize
+from .utils import nb_to_geojson, iter_route_features, summarize, ZoomIndex
+from .spatial import GridIndex
+from .catalog import DataCatalog
+from .diff import diff_responses
+from .mvt import BUFFER, EXTENT, TileCache, encode_tile, tile_bbox
+from .cache import cache_from_env
+from .connections import ConnectionManager, DeviceRouter
+from .jobs import JobQueue, JobStore
+from .matrix import COST_SOURCES, Matrix, MatrixService
+from .npyio import write_npy_bytes
+from .shared import backend_from_env
+from .tracking import Tracker, route_tracks
+from .geocode import GeocodeError, geocoder_from_env
+from . import analytics
+from .warmup import warmup_from_env
+from .metrics import REGISTRY, MetricsMiddleware, profiler_from_env, stage
+from .ingest import CsvIngestor, IngestError, index_file, load_columns, column_stats
+from . import jsonlib, schema, solver
+from .jsonlib import FastJSONResponse
+
+try:  # optional: pre-encoded brotli variants when the extra is installed
+    import brotli
+except ImportError:
+    brotli = None
 
 ROOT = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(ROOT, "data")
 FRONTEND_PATH = os.path.join(os.path.dirname(ROOT), "frontend")
 
 _FILENAME_BASE = "nextbillion_response"
-_FILENAME_REGEX = re.compile(rf"^{re.escape(_FILENAME_BASE)}(?:_(\d+))?\.json$")
 
-_DATA_CACHE: dict[str, tuple[float, dict]] = {}
+# Bounded LRU caches (byte budgets via DATA_/ARTIFACT_/INDEX_CACHE_MAX_MB), all invalidated by source mtime
+_DATA_CACHE = cache_from_env("data", 512)
+# Serialized derived artifacts (GeoJSON, summary, ...) keyed by (path, kind)
+_ARTIFACT_CACHE = cache_from_env("artifact", 256, sizeof=lambda art: art.nbytes)
+# Per-file zoom indexes and per-set spatial indexes
+_INDEX_CACHE = cache_from_env("index", 256)
+_COMPRESS_MIN_BYTES = 1024
+# JSON parsing runs in a small dedicated pool so concurrent cold loads cannot exhaust
+# the request threadpool or multiply peak memory
+_PARSE_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("JSON_PARSE_WORKERS", "2")), thread_name_prefix="json-parse")
+_UPLOAD_CHUNK_BYTES = 1024 * 1024
 
 
-class ConnectionManager:
-    def __init__(self) -> None:
-        self._connections: dict[str, WebSocket] = {}
-        self._lock = asyncio.Lock()
+manager = ConnectionManager()
+# Registry/pub-sub shared by all workers (SHARED_BACKEND=redis); in-process by default
+shared = backend_from_env()
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+router = DeviceRouter(manager, shared, WORKER_ID)
+_SHARED_ARTIFACT_TTL = float(os.getenv("SHARED_ARTIFACT_TTL", "3600"))
+# In-memory listing of DATA_DIR, kept current by a watcher started with the app
+catalog = DataCatalog(DATA_DIR)
 
-    async def connect(self, device_id: str, websocket: WebSocket) -> None:
-        await websocket.accept()
-        async with self._lock:
-            self._connections[device_id] = websocket
-        logging.info("WS connected: %s", device_id)
+async def _notify_job(event: dict) -> None:
+    # Job events go to the WebSockets subscribed to the job's set (``/ws?set=``)
+    if event["job"]["set"] is not None:
+        await router.broadcast(event, set_id=event["job"]["set"])
 
-    async def disconnect(self, device_id: str) -> None:
-        async with self._lock:
-            self._connections.pop(device_id, None)
-        logging.info("WS disconnected: %s", device_id)
+# Background jobs (solving sets, ...); state persists in SQLite so queued work survives restarts
+job_queue = JobQueue(JobStore(os.getenv("JOBS_DB", os.path.join(ROOT, "state", "jobs.sqlite3"))), notify=_notify_job,
+                     worker_id=WORKER_ID)
 
-    async def send_to(self, device_id: str, payload: dict) -> None:
-        async with self._lock:
-            websocket = self._connections.get(device_id)
-        if websocket is None:
-            raise KeyError(device_id)
-        await websocket.send_json(payload)
-        logging.info("WS message sent to %s: %s", device_id, payload)
+# N x N distance/duration matrices per set, persisted as .npy under data/<set>/matrix/
+matrix_service = MatrixService()
+_MATRIX_MAX_CELLS = int(os.getenv("MATRIX_MAX_CELLS", "250000"))
 
+def _route_tracks(set_id: int) -> dict:
+    path = catalog.response_path(set_id)
+    if path is None:
+        return {}
+    return _INDEX_CACHE.get_or_load(("tracks", path), os.path.getmtime(path), lambda: route_tracks(nb_to_geojson(_load_json(path))))
 
-manager = ConnectionManager()
+async def _notify_tracking(event: dict) -> None:
+    vehicle = event["vehicle"]
+    if event["type"] == "eta":
+        # Fresh ETAs go to the vehicle's own device; viewers poll /api/positions
+        try:
+            await router.send_to(vehicle["device_id"], event)
+        except KeyError:
+            pass
+    elif vehicle["set"] is not None:
+        await router.broadcast(event, set_id=vehicle["set"])
+
+# GPS pings streamed over /ws: ring buffer, route matching and ETAs per vehicle
+tracker = Tracker(_route_tracks, on_event=_notify_tracking)
+_POSITIONS_FLUSH_SECONDS = 1.0
+
+async def _flush_positions() -> None:
+    # Publish this worker's changed vehicles so /api/positions on any worker sees the whole fleet,
+    # and drop vehicles silent for TRACK_TTL_SECONDS (here and in the shared hash)
+    next_expiry = 0.0
+    while True:
+        await asyncio.sleep(_POSITIONS_FLUSH_SECONDS)
+        gone = []
+        if time.monotonic() >= next_expiry:
+            gone = tracker.expire()
+            next_expiry = time.monotonic() + min(60.0, max(_POSITIONS_FLUSH_SECONDS, tracker.ttl / 10))
+        if not shared.shares_cache:
+            continue
+        changed = tracker.take_dirty()
+        try:
+            if changed:
+                await asyncio.to_thread(shared.hset_many, "positions", {k: jsonlib.dumps(v).decode("utf-8") for k, v in changed.items()})
+            if gone:
+                await asyncio.to_thread(shared.hdel, "positions", *gone)
+        except Exception as exc:
+            logging.warning("Position snapshot flush failed: %s", exc)
+
+def _stale_position(p: dict) -> bool:
+    # Snapshots of a worker that died are never deleted by it: readers skip and remove them
+    return bool(tracker.ttl) and p.get("seen", 0) < time.time() - tracker.ttl
 
 def _list_data_files():
-    files = []
-    for path in glob.glob(os.path.join(DATA_DIR, f"{_FILENAME_BASE}*.json")):
-        name = os.path.basename(path)
-        m = _FILENAME_REGEX.match(name)
-        if m:
-            ver = int(m.group(1)) if m.group(1) else 0
-            files.append({"name": name, "version": ver, "path": path})
-    files.sort(key=lambda x: x["version"])  # ascending by version
-    return files
+    return catalog.data_files()
 
 def _resolve_data_path(version: int | None = None, file: str | None = None, set_id: int | None = None) -> str:
-    # If a set is specified, try to resolve a response JSON within that set folder
+    with stage("resolve"):
+        return _find_data_path(version, file, set_id)
+
+def _find_data_path(version: int | None, file: str | None, set_id: int | None) -> str:
+    # If a set is specified, resolve the response JSON within that set folder (or legacy root placement)
     if set_id is not None:
-        set_dir = os.path.join(DATA_DIR, str(set_id))
-        # Try common response filenames in priority order inside the set dir
-        candidates = []
-        candidates += [
-            os.path.join(set_dir, f"Next_Billion_response_{set_id}.json"),
-            os.path.join(set_dir, f"nextbillion_response_{set_id}.json"),
-            os.path.join(set_dir, "Next_Billion_response.json"),
-            os.path.join(set_dir, "nextbillion_response.json"),
-        ]
-        # If nothing in the set dir, also try at the DATA_DIR root (allows legacy placement)
-        candidates += [
-            os.path.join(DATA_DIR, f"Next_Billion_response_{set_id}.json"),
-            os.path.join(DATA_DIR, f"nextbillion_response_{set_id}.json"),
-        ]
-        for c in candidates:
-            if os.path.exists(c):
-                return c
-        raise HTTPException(status_code=404, detail=f"No response JSON found for set {set_id}")
+        path = catalog.response_path(set_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail=f"No response JSON found for set {set_id}")
+        return path
     # Explicit file name (must exist under DATA_DIR)
     if file:
         safe_name = os.path.basename(file)
-        candidate = os.path.join(DATA_DIR, safe_name)
-        if not candidate.startswith(DATA_DIR):
-            raise FileNotFoundError("Invalid file path")
-        if os.path.exists(candidate):
+        candidate = catalog.root_file(safe_name)
+        if candidate is not None:
             return candidate
         raise FileNotFoundError(f"Data file not found: {safe_name}")
     files = _list_data_files()
@@ -102,27 +157,199 @@ def _resolve_data_path(version: int | None = None, file: str | None = None, set_
     # Latest numbered (or base file if present)
     if files:
         return files[-1]["path"]
-    base = os.path.join(DATA_DIR, f"{_FILENAME_BASE}.json")
-    if os.path.exists(base):
+    base = catalog.root_file(f"{_FILENAME_BASE}.json")
+    if base is not None:
         return base
     raise FileNotFoundError("No data files found")
 
 def _load_json(path: str) -> dict:
+    def load() -> dict:
+        # Parse in the bounded pool: at most JSON_PARSE_WORKERS large files are decoded at once
+        with stage("load"):
+            return _PARSE_POOL.submit(jsonlib.load_file, path).result()
     try:
-        mtime = os.path.getmtime(path)
-        cached = _DATA_CACHE.get(path)
-        if cached and cached[0] == mtime:
-            return cached[1]
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        _DATA_CACHE[path] = (mtime, data)
-        return data
+        return _DATA_CACHE.get_or_load(path, os.path.getmtime(path), load)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"Data file not found: {os.path.basename(path)}")
-    except json.JSONDecodeError as e:
+    except jsonlib.DecodeError as e:
         raise HTTPException(status_code=400, detail=f"Invalid JSON in {os.path.basename(path)}: {str(e)}")
 
-app = FastAPI(title="TomTom Route Viewer", version="1.0.0")
+class _Artifact:
+    """Pre-serialized JSON body plus its ETag and pre-compressed variants."""
+    __slots__ = ("body", "etag", "gzip", "br", "nbytes")
+
+    def __init__(self, body: bytes, gzip_body: bytes | None = None, br_body: bytes | None = None, etag: str | None = None) -> None:
+        self.body = body
+        # Weak validator: the same tag covers the identity, gzip and br encodings of the body
+        self.etag = etag or 'W/"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.gzip = None
+        self.br = None
+        if len(body) >= _COMPRESS_MIN_BYTES:
+            self.gzip = gzip_body if gzip_body is not None else _gzip(body)
+            if brotli is not None:
+                self.br = br_body if br_body is not None else _brotli(body)
+        self.nbytes = len(body) + len(self.gzip or b"") + len(self.br or b"")
+
+def _gzip(body: bytes) -> bytes:
+    with stage("compress"):
+        return gzip.compress(body, compresslevel=6, mtime=0)
+
+def _brotli(body: bytes) -> bytes:
+    with stage("compress"):
+        return brotli.compress(body, quality=5)
+
+def _serialize_built(path: str, build) -> bytes:
+    data = _load_json(path)
+    with stage("convert"):
+        obj = build(data)
+    with stage("serialize"):
+        return jsonlib.dumps(obj)
+
+def _build_artifact(path: str, kind: str, mtime_ns: int, build) -> _Artifact:
+    serialize = lambda: _serialize_built(path, build)
+    if not shared.shares_cache:
+        return _Artifact(serialize())
+    # Another worker or node may already have serialized and compressed this version:
+    # fetch it, or build it once for all of them
+    key = f"artifact:{os.path.relpath(path, DATA_DIR)}:{kind}:{mtime_ns}"
+    body = shared.shared_build(key, serialize, ttl=_SHARED_ARTIFACT_TTL)
+    if len(body) < _COMPRESS_MIN_BYTES:
+        return _Artifact(body)
+    gz = shared.shared_build(key + ":gzip", lambda: _gzip(body), ttl=_SHARED_ARTIFACT_TTL)
+    br = shared.shared_build(key + ":br", lambda: _brotli(body), ttl=_SHARED_ARTIFACT_TTL) if brotli is not None else None
+    return _Artifact(body, gz, br)
+
+def _json_artifact(path: str, kind: str, build) -> _Artifact:
+    """Return the cached serialized form of build(data) for the JSON file at path."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Data file not found: {os.path.basename(path)}")
+    warmup.touch(path)
+    return _ARTIFACT_CACHE.get_or_load((path, kind), st.st_mtime, lambda: _build_artifact(path, kind, st.st_mtime_ns, build))
+
+def _build_zoom_index(path: str) -> ZoomIndex:
+    data = _load_json(path)
+    with stage("convert"):
+        geo = nb_to_geojson(data)
+    with stage("index"):
+        return ZoomIndex(geo)
+
+def _zoom_index(path: str) -> ZoomIndex:
+    return _INDEX_CACHE.get_or_load(("zoom", path), os.path.getmtime(path), lambda: _build_zoom_index(path))
+
+def _parse_bbox(bbox: str) -> tuple[float, float, float, float]:
+    # "minLon,minLat,maxLon,maxLat"
+    try:
+        parts = [float(p) for p in bbox.split(",")]
+    except ValueError:
+        parts = []
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise HTTPException(status_code=400, detail="bbox must be minLon,minLat,maxLon,maxLat")
+    return tuple(parts)
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag[2:]:
+            return True
+    return False
+
+def _artifact_response(request: Request, art: _Artifact) -> Response:
+    headers = {"ETag": art.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), art.etag):
+        return Response(status_code=304, headers=headers)
+    accept = request.headers.get("accept-encoding", "")
+    body = art.body
+    if art.br is not None and "br" in accept:
+        body = art.br
+        headers["Content-Encoding"] = "br"
+    elif art.gzip is not None and "gzip" in accept:
+        body = art.gzip
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Warm start (WARMUP_SETS > 0): summary/GeoJSON artifacts of the most recently used files are
+# restored from a snapshot, or built, in the background after startup
+warmup = warmup_from_env(DATA_DIR, os.path.join(ROOT, "state", "warmup.pickle"))
+_WARM_BUILDERS = {"summary": summarize, "geojson": nb_to_geojson}
+
+def _warm_restore(path: str, kind: str, payload: tuple) -> None:
+    body, etag, gz, br = payload
+    art = _Artifact(body, gz, br, etag=etag)
+    _ARTIFACT_CACHE.put((path, kind), os.path.getmtime(path), art, size=art.nbytes)
+
+def _warm_build(path: str, kind: str) -> None:
+    # Not through _json_artifact: warming a file must not count as a use of it
+    st = os.stat(path)
+    _ARTIFACT_CACHE.get_or_load((path, kind), st.st_mtime, lambda: _build_artifact(path, kind, st.st_mtime_ns, _WARM_BUILDERS[kind]))
+
+def _warm_collect(path: str, kind: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    art = _ARTIFACT_CACHE.peek((path, kind), st.st_mtime)
+    if art is None:
+        return None
+    return st.st_size, st.st_mtime_ns, (art.body, art.etag, art.gzip, art.br)
+
+def _warm_candidates() -> list[str]:
+    # No usage history yet: the newest responses (sets and root versions) first
+    paths = [catalog.response_path(s["id"]) for s in catalog.sets() if s["response"]]
+    paths += [f["path"] for f in catalog.data_files()]
+    stamped = []
+    for path in paths:
+        try:
+            stamped.append((os.path.getmtime(path), path))
+        except (FileNotFoundError, TypeError):
+            continue
+    return [path for _, path in sorted(stamped, reverse=True)]
+
+def _warm_start() -> None:
+    warmup.run(_warm_restore, _warm_build, _warm_collect, _warm_candidates)
+
+def _warm_save() -> None:
+    # Files first served during this worker's life are picked up by the next one
+    try:
+        warmup.save(_warm_collect, _warm_candidates)
+    except OSError as exc:
+        logging.warning("warmup: could not write snapshot %s: %s", warmup.path, exc)
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    global _main_loop
+    _main_loop = asyncio.get_running_loop()
+    catalog.start()
+    await shared.start()
+    await router.start()
+    await job_queue.start()
+    flusher = asyncio.create_task(_flush_positions())
+    # The warm-up thread runs while the server accepts connections; requests for files it
+    # has not reached yet load them as usual (concurrent builds of one artifact are coalesced)
+    warming = asyncio.create_task(asyncio.to_thread(_warm_start)) if warmup.enabled else None
+    try:
+        yield
+    finally:
+        flusher.cancel()
+        if warming is not None:
+            warmup.stop()
+            await asyncio.gather(warming, return_exceptions=True)
+            await asyncio.to_thread(_warm_save)
+        await job_queue.stop()
+        await router.stop()
+        await shared.stop()
+        catalog.stop()
+
+app = FastAPI(title="TomTom Route Viewer", version="1.0.0", lifespan=_lifespan, default_response_class=FastJSONResponse)
+
+# Request counts, latency and response sizes per route; PROFILE_SLOW_MS also profiles slow requests
+slow_profiler = profiler_from_env()
+app.add_middleware(MetricsMiddleware, profiler=slow_profiler)
 
 # Serve frontend
 app.mount("/static", StaticFiles(directory=FRONTEND_PATH), name="static")
@@ -132,6 +359,16 @@ class StartNavigationRequest(BaseModel):
     device_id: str
     route_id: str
 
+class StartNavigationBulkRequest(BaseModel):
+    assignments: list[StartNavigationRequest]
+
+class BroadcastRequest(BaseModel):
+    payload: dict
+    # Targets: explicit devices, and/or connections tagged with a vehicle / set (none = everyone)
+    device_ids: list[str] | None = None
+    vehicle: str | None = None
+    set: int | None = None
+
 @app.get("/", response_class=HTMLResponse)
 def upload_page():
     # Serve uploader UI
@@ -154,112 +391,155 @@ def favicon():
 # Removed CDN proxy endpoints since SDK is self-hosted under /static/vendor/tomtom
 
 @app.get("/api/summary")
-def api_summary(version: int | None = Query(default=None), file: str | None = Query(default=None), set: int | None = Query(default=None)):
+def api_summary(request: Request, version: int | None = Query(default=None), file: str | None = Query(default=None), set: int | None = Query(default=None)):
     path = _resolve_data_path(version=version, file=file, set_id=set)
-    data = _load_json(path)
-    return JSONResponse(summarize(data))
+    return _artifact_response(request, _json_artifact(path, "summary", summarize))
+
+def _stream_feature_collection(data: dict):
+    # Emit the FeatureCollection envelope around features produced one route at a time
+    yield b'{"type":"FeatureCollection","features":['
+    first = True
+    for features in iter_route_features(data):
+        for feat in features:
+            if first:
+                first = False
+                yield jsonlib.dumps(feat)
+            else:
+                yield b"," + jsonlib.dumps(feat)
+    yield b"]}"
+
+def _stream_feature_lines(data: dict):
+    for features in iter_route_features(data):
+        yield b"".join(jsonlib.dumps(feat) + b"\n" for feat in features)
 
 @app.get("/api/routes")
-def api_routes(version: int | None = Query(default=None), file: str | None = Query(default=None), set: int | None = Query(default=None)):
+def api_routes(request: Request, version: int | None = Query(default=None), file: str | None = Query(default=None), set: int | None = Query(default=None),
+               stream: bool = Query(default=False), format: str = Query(default="geojson", pattern="^(geojson|ndjson)$"),
+               bbox: str | None = Query(default=None), zoom: int | None = Query(default=None, ge=0, le=24)):
     path = _resolve_data_path(version=version, file=file, set_id=set)
-    data = _load_json(path)
-    geo = nb_to_geojson(data)
-    return JSONResponse(geo)
+    if bbox is not None:
+        box = _parse_bbox(bbox)
+        return FastJSONResponse(_zoom_index(path).query(zoom=zoom, bbox=box))
+    if zoom is not None:
+        # Whole-collection zoom levels are cached like the full GeoJSON
+        return _artifact_response(request, _json_artifact(path, f"geojson:z{zoom}", lambda data: _zoom_index(path).query(zoom=zoom)))
+    # Streaming modes skip the serialized-artifact cache: memory stays bounded by one route
+    if format == "ndjson":
+        return StreamingResponse(_stream_feature_lines(_load_json(path)), media_type="application/x-ndjson")
+    if stream:
+        return StreamingResponse(_stream_feature_collection(_load_json(path)), media_type="application/json")
+    return _artifact_response(request, _json_artifact(path, "geojson", nb_to_geojson))
 
 @app.get("/api/raw")
-def api_raw(version: int | None = Query(default=None), file: str | None = Query(default=None), set: int | None = Query(default=None)):
+def api_raw(request: Request, version: int | None = Query(default=None), file: str | None = Query(default=None), set: int | None = Query(default=None)):
     path = _resolve_data_path(version=version, file=file, set_id=set)
-    data = _load_json(path)
-    return JSONResponse(data)
+    return _artifact_response(request, _json_artifact(path, "raw", lambda data: data))
+
+def _version_path(version: int) -> str:
+    try:
+        return _resolve_data_path(version=version)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+def _routes_diff(from_path: str, to_path: str) -> dict:
+    stamp = (os.path.getmtime(from_path), os.path.getmtime(to_path))
+    return _INDEX_CACHE.get_or_load(("diff", from_path, to_path), stamp, lambda: diff_responses(_load_json(from_path), _load_json(to_path)))
+
+def _diff_artifact(from_version: int, to_version: int) -> _Artifact:
+    a, b = _version_path(from_version), _version_path(to_version)
+    stamp = (os.path.getmtime(a), os.path.getmtime(b))
+    return _ARTIFACT_CACHE.get_or_load(("diff", a, b), stamp,
+                                       lambda: _Artifact(jsonlib.dumps({"from": from_version, "to": to_version, **_routes_diff(a, b)})))
+
+async def _push_diff(diff: dict, versions: dict, set_id: int | None, broadcast) -> dict:
+    """Send the whole delta to viewers and each changed route's delta to its vehicle's devices."""
+    if not diff["routes"] and not diff["unassigned"]["added"] and not diff["unassigned"]["removed"]:
+        return {"viewers": 0, "devices": 0, "summary": diff["summary"]}
+    viewers = await broadcast({"type": "routes_diff", "set": set_id, **versions, **diff}, set_id=set_id, viewers=True)
+    devices = 0
+    for route in diff["routes"]:
+        if route["vehicle"] is not None:
+            sent = await broadcast({"type": "route_delta", "set": set_id, **versions, **route}, vehicle=str(route["vehicle"]), set_id=set_id)
+            devices += sent["queued"]
+    return {"viewers": viewers["queued"], "devices": devices, "summary": diff["summary"]}
+
+@app.get("/api/routes/diff")
+def api_routes_diff(request: Request, from_version: int = Query(..., alias="from"), to_version: int = Query(..., alias="to")):
+    # Per-route/per-step delta between two data file versions, cached per version pair
+    return _artifact_response(request, _diff_artifact(from_version, to_version))
+
+@app.post("/api/routes/diff/push")
+async def api_push_routes_diff(from_version: int = Query(..., alias="from"), to_version: int = Query(..., alias="to")):
+    a, b = await asyncio.to_thread(_version_path, from_version), await asyncio.to_thread(_version_path, to_version)
+    diff = await asyncio.to_thread(_routes_diff, a, b)
+    return FastJSONResponse(await _push_diff(diff, {"from": from_version, "to": to_version}, None, router.broadcast))
+
+_main_loop: asyncio.AbstractEventLoop | None = None
 
-_REQ_REGEX = re.compile(r"^(Next_Billion_request|nextbillion_request)(?:_(\d+))?\.json$")
-_RESP_REGEX = re.compile(r"^(Next_Billion_response|nextbillion_response)(?:_(\d+))?\.json$")
+async def _push_new_version(version: int) -> None:
+    # Every worker sees the catalog event, so each one pushes to its own connections only
+    if not manager.stats()["connections"]:
+        return
+    older = [f["version"] for f in await asyncio.to_thread(catalog.data_files) if f["version"] < version]
+    if not older:
+        return
+    try:
+        a, b = await asyncio.to_thread(_version_path, max(older)), await asyncio.to_thread(_version_path, version)
+        diff = await asyncio.to_thread(_routes_diff, a, b)
+    except HTTPException as exc:
+        logging.warning("No diff pushed for version %s: %s", version, exc.detail)
+        return
+    await _push_diff(diff, {"from": max(older), "to": version}, None, manager.broadcast)
+
+def _on_catalog_event(event: dict) -> None:
+    # Watcher thread: a new numbered data file at the root is a new version
+    if _main_loop is None or event["type"] != "added" or event["set"] is not None:
+        return
+    for f in catalog.data_files():
+        if f["name"] == event["name"] and f["version"] > 0:
+            asyncio.run_coroutine_threadsafe(_push_new_version(f["version"]), _main_loop)
+
+catalog.subscribe(_on_catalog_event)
 
 def _list_mock_sets():
-    sets = []
-    if not os.path.isdir(DATA_DIR):
-        return sets
-    for name in os.listdir(DATA_DIR):
-        if not name.isdigit():
-            continue
-        sid = int(name)
-        set_dir = os.path.join(DATA_DIR, name)
-        jobs = None
-        vehicles = None
-        request = None
-        response = None
-        # Expected names
-        cand_jobs = [f"input_jobs_{sid}.csv", "input_jobs.csv"]
-        cand_vehicles = [f"input_vehicles_{sid}.csv", "input_vehicles.csv"]
-        for fn in cand_jobs:
-            p = os.path.join(set_dir, fn)
-            if os.path.exists(p):
-                jobs = fn; break
-        for fn in cand_vehicles:
-            p = os.path.join(set_dir, fn)
-            if os.path.exists(p):
-                vehicles = fn; break
-        # Detect request/response via regex, prefer suffix matching set id
-        try:
-            for fn in os.listdir(set_dir):
-                if request is None and fn.endswith('.json'):
-                    m = _REQ_REGEX.match(fn)
-                    if m and (m.group(2) is None or int(m.group(2)) == sid):
-                        request = fn
-                if response is None and fn.endswith('.json'):
-                    m = _RESP_REGEX.match(fn)
-                    if m and (m.group(2) is None or int(m.group(2)) == sid):
-                        response = fn
-        except FileNotFoundError:
-            pass
-        # Fallback: look in DATA_DIR root if not found in set folder
-        if request is None:
-            for fn in os.listdir(DATA_DIR):
-                m = _REQ_REGEX.match(fn)
-                if m and (m.group(2) is not None and int(m.group(2)) == sid):
-                    if os.path.exists(os.path.join(DATA_DIR, fn)):
-                        request = fn; break
-        if response is None:
-            for fn in os.listdir(DATA_DIR):
-                m = _RESP_REGEX.match(fn)
-                if m and (m.group(2) is not None and int(m.group(2)) == sid):
-                    if os.path.exists(os.path.join(DATA_DIR, fn)):
-                        response = fn; break
-        sets.append({
-            "id": sid,
-            "dir": name,
-            "jobs": jobs,
-            "vehicles": vehicles,
-            "request": request,
-            "response": response,
-            "viewer_url": f"/viewer?set={sid}",
-        })
-    sets.sort(key=lambda x: x["id"])  # ascending ids
-    return sets
+    return catalog.sets()
 
 def _ensure_set_dir(set_id: int) -> str:
     d = os.path.join(DATA_DIR, str(set_id))
     os.makedirs(d, exist_ok=True)
     return d
 
-def _csv_preview(path: str, max_rows: int = 10) -> dict:
+async def _ingest_upload(upload: UploadFile, kind: str, dest: str) -> dict:
+    """Stream an upload through CsvIngestor, each chunk parsed off the event loop.
+
+    The CSV and its columnar sidecar only replace the current files once every row
+    validated; otherwise a 422 lists the first errors and nothing is saved.
+    """
+    ingestor = await asyncio.to_thread(CsvIngestor, kind, dest)
     try:
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            lines = [line.rstrip("\n\r") for _, line in zip(range(max_rows), f)]
-        # naive CSV split by comma (no quotes handling for simplicity)
-        rows = [ln.split(',') for ln in lines]
-        return {"rows": rows}
-    except FileNotFoundError:
-        return {"rows": []}
+        while True:
+            chunk = await upload.read(_UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            await asyncio.to_thread(ingestor.feed, chunk)
+        manifest = await asyncio.to_thread(ingestor.close)
+    except IngestError as exc:
+        await asyncio.to_thread(ingestor.abort)
+        raise HTTPException(status_code=422, detail={"file": kind, "error": str(exc), "errors": exc.errors})
+    except BaseException:
+        await asyncio.to_thread(ingestor.abort)
+        raise
+    return {"rows": ingestor.preview, "total_rows": manifest["rows"]}
 
 @app.get("/api/mock-sets")
 def api_mock_sets():
-    return JSONResponse({"sets": _list_mock_sets()})
+    return FastJSONResponse({"sets": _list_mock_sets()})
 
 @app.post("/api/mock-sets/{set_id}/upload")
-async def api_upload_set(set_id: int, jobs: UploadFile | None = FF(None), vehicles: UploadFile | None = FF(None)):
+async def api_upload_set(set_id: int, jobs: UploadFile | None = FF(None), vehicles: UploadFile | None = FF(None), solve: bool = Query(default=False)):
     sd = os.path.join(DATA_DIR, str(set_id))
-    if not os.path.isdir(sd):
+    # Everything touching the filesystem runs off the event loop so open WebSockets keep flowing
+    if not await asyncio.to_thread(catalog.has_set, set_id):
         logging.error(f"/api/mock-sets/{set_id}/upload: set folder not found: {sd}")
         raise HTTPException(status_code=404, detail=f"Set folder not found: {set_id}")
     saved = {}
@@ -267,62 +547,171 @@ async def api_upload_set(set_id: int, jobs: UploadFile | None = FF(None), vehicl
     logging.info(f"/api/mock-sets/{set_id}/upload: started")
     if jobs is not None:
         dest = os.path.join(sd, f"input_jobs_{set_id}.csv")
-        content = await jobs.read()
-        with open(dest, "wb") as out:
-            out.write(content)
+        previews["jobs"] = await _ingest_upload(jobs, "jobs", dest)
         saved["jobs"] = os.path.basename(dest)
-        previews["jobs"] = _csv_preview(dest)
         logging.info(f"/api/mock-sets/{set_id}/upload: saved jobs -> {dest}")
     if vehicles is not None:
         dest = os.path.join(sd, f"input_vehicles_{set_id}.csv")
-        content = await vehicles.read()
-        with open(dest, "wb") as out:
-            out.write(content)
+        previews["vehicles"] = await _ingest_upload(vehicles, "vehicles", dest)
         saved["vehicles"] = os.path.basename(dest)
-        previews["vehicles"] = _csv_preview(dest)
         logging.info(f"/api/mock-sets/{set_id}/upload: saved vehicles -> {dest}")
     # Note: request and response files are hard-coded/mocked and not created here
+    await asyncio.to_thread(catalog.refresh_set, set_id)
     resp = {
         "set": set_id,
         "saved": saved,
         "preview": previews,
-        "current": next((s for s in _list_mock_sets() if s["id"] == set_id), None),
+        "current": catalog.set_info(set_id),
     }
+    if solve:
+        # Rebuild the response from the new CSVs in the background
+        resp["job"] = await _submit_job("solve", set_id, {"from_csv": True})
     logging.info(f"/api/mock-sets/{set_id}/upload: done -> {resp.get('current')}")
-    return JSONResponse(resp)
+    return FastJSONResponse(resp)
+
+def _set_csv_path(set_id: int, kind: str) -> str:
+    info = catalog.set_info(set_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Set folder not found: {set_id}")
+    if not info.get(kind):
+        raise HTTPException(status_code=404, detail=f"No {kind} CSV in set {set_id}")
+    return os.path.join(DATA_DIR, str(set_id), info[kind])
+
+def _column_summary(path: str, kind: str) -> dict:
+    def load():
+        loaded = load_columns(path)
+        if loaded is None:
+            # CSV placed on disk directly (not uploaded): build its sidecar now
+            try:
+                index_file(kind, path)
+            except IngestError as exc:
+                raise HTTPException(status_code=422, detail={"file": kind, "error": str(exc), "errors": exc.errors})
+            loaded = load_columns(path)
+        return {"rows": loaded["manifest"]["rows"], "columns": column_stats(loaded)}
+    return _INDEX_CACHE.get_or_load(("columns", path), os.path.getmtime(path), load)
+
+@app.get("/api/mock-sets/{set_id}/columns")
+def api_set_columns(set_id: int, kind: str = Query(default="jobs", pattern="^(jobs|vehicles)$")):
+    path = _set_csv_path(set_id, kind)
+    return FastJSONResponse({"set": set_id, "kind": kind, "file": os.path.basename(path), **_column_summary(path, kind)})
+
+def _write_json_atomic(path: str, data) -> None:
+    tmp = f"{path}.{os.getpid()}.part"
+    with open(tmp, "wb") as f:
+        f.write(jsonlib.dumps(data))
+    os.replace(tmp, path)
+
+def _solve_set(set_id: int, solver_name: str | None, starts: int | None, progress=None, from_csv: bool = False) -> dict:
+    """Solve a set's request and write its response JSON.
+
+    The request is (re)built from the set's jobs/vehicles CSVs when it has none or
+    ``from_csv`` is set.
+    """
+    sd = os.path.join(DATA_DIR, str(set_id))
+    req_path = catalog.request_path(set_id)
+    if req_path is not None and not from_csv:
+        request = _load_json(req_path)
+    else:
+        info = catalog.set_info(set_id) or {}
+        if not info.get("jobs") or not info.get("vehicles"):
+            raise HTTPException(status_code=404, detail=f"Set {set_id} has neither a request JSON nor jobs/vehicles CSVs")
+        request = solver.request_from_csv(os.path.join(sd, info["jobs"]), os.path.join(sd, info["vehicles"]), f"set {set_id}")
+        req_path = req_path or os.path.join(sd, f"Next_Billion_request_{set_id}.json")
+        _write_json_atomic(req_path, request)
+    try:
+        options = {"starts": starts}
+        if progress is not None:
+            progress(0.05, "solving")
+            options["progress"] = lambda fraction, message: progress(0.05 + 0.9 * fraction, message)
+        response = solver.solve(request, solver=solver_name, **options)
+    except (KeyError, IndexError, TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=f"Cannot solve set {set_id}: {exc}")
+    resp_path = catalog.response_path(set_id) or os.path.join(sd, f"Next_Billion_response_{set_id}.json")
+    previous = None
+    if os.path.exists(resp_path):
+        try:
+            previous = (_load_json(resp_path), os.path.getmtime(resp_path))
+        except HTTPException:
+            pass
+    _write_json_atomic(resp_path, response)
+    catalog.refresh_set(set_id)
+    if previous is not None and _main_loop is not None:
+        # Re-plan: viewers and devices of the set get only what changed (versions are file mtimes)
+        versions = {"from": previous[1], "to": os.path.getmtime(resp_path)}
+        asyncio.run_coroutine_threadsafe(_push_diff(diff_responses(previous[0], response), versions, set_id, router.broadcast), _main_loop)
+    return {"set": set_id, "request": os.path.basename(req_path), "response": os.path.basename(resp_path), **summarize(response)}
+
+@app.post("/api/mock-sets/{set_id}/solve")
+async def api_solve_set(set_id: int, solver_name: str | None = Query(default=None, alias="solver"), starts: int | None = Query(default=None, ge=1, le=64)):
+    if not await asyncio.to_thread(catalog.has_set, set_id):
+        raise HTTPException(status_code=404, detail=f"Set folder not found: {set_id}")
+    if solver_name is not None and solver_name not in solver.SOLVERS:
+        raise HTTPException(status_code=400, detail=f"Unknown solver: {solver_name}")
+    return FastJSONResponse(await asyncio.to_thread(_solve_set, set_id, solver_name, starts))
+
+job_queue.register("solve", lambda set_id, params, progress: _solve_set(
+    set_id, params.get("solver"), params.get("starts"), progress, from_csv=bool(params.get("from_csv"))))
+
+class JobRequest(BaseModel):
+    kind: str = "solve"
+    set: int | None = None
+    params: dict = {}
+    priority: int | None = None
+
+class SetPriorityRequest(BaseModel):
+    priority: int
+
+async def _submit_job(kind: str, set_id: int | None, params: dict, priority: int | None = None) -> dict:
+    if kind not in job_queue.kinds:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {kind}")
+    if set_id is not None and not await asyncio.to_thread(catalog.has_set, set_id):
+        raise HTTPException(status_code=404, detail=f"Set folder not found: {set_id}")
+    return await job_queue.submit(kind, set_id, params, priority)
+
+@app.post("/api/jobs", status_code=202)
+async def api_submit_job(req: JobRequest):
+    return FastJSONResponse(await _submit_job(req.kind, req.set, req.params, req.priority), status_code=202)
+
+@app.get("/api/jobs")
+async def api_jobs(set: int | None = Query(default=None), status: str | None = Query(default=None), limit: int = Query(default=100, ge=1, le=1000)):
+    listed = await asyncio.to_thread(job_queue.store.query, set, status, limit)
+    return FastJSONResponse({"jobs": listed, "stats": await asyncio.to_thread(job_queue.stats)})
+
+@app.get("/api/jobs/{job_id}")
+async def api_job(job_id: str):
+    job = await asyncio.to_thread(job_queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return FastJSONResponse(job)
+
+@app.delete("/api/jobs/{job_id}")
+async def api_cancel_job(job_id: str):
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return FastJSONResponse(job)
+
+@app.put("/api/mock-sets/{set_id}/priority")
+async def api_set_priority(set_id: int, req: SetPriorityRequest):
+    if not await asyncio.to_thread(catalog.has_set, set_id):
+        raise HTTPException(status_code=404, detail=f"Set folder not found: {set_id}")
+    await asyncio.to_thread(job_queue.store.set_priority, set_id, req.priority)
+    return FastJSONResponse({"set": set_id, "priority": req.priority})
 
 # Resolve request JSON for a set
 def _resolve_request_path(set_id: int) -> str:
-    sd = os.path.join(DATA_DIR, str(set_id))
-    candidates = [
-        os.path.join(sd, f"Next_Billion_request_{set_id}.json"),
-        os.path.join(sd, f"nextbillion_request_{set_id}.json"),
-        os.path.join(sd, "Next_Billion_request.json"),
-        os.path.join(sd, "nextbillion_request.json"),
-    ]
-    for c in candidates:
-        if os.path.exists(c):
-            return c
-    # Legacy placement at root as fallback
-    legacy = [
-        os.path.join(DATA_DIR, f"Next_Billion_request_{set_id}.json"),
-        os.path.join(DATA_DIR, f"nextbillion_request_{set_id}.json"),
-    ]
-    for c in legacy:
-        if os.path.exists(c):
-            return c
-    raise HTTPException(status_code=404, detail=f"No request JSON found for set {set_id}")
+    path = catalog.request_path(set_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No request JSON found for set {set_id}")
+    return path
 
 @app.get("/api/request-raw")
 def api_request_raw(set: int = Query(...)):
     path = _resolve_request_path(set)
     data = _load_json(path)
-    return JSONResponse(data)
+    return FastJSONResponse(data)
 
-@app.get("/api/request-points")
-def api_request_points(set: int = Query(...)):
-    path = _resolve_request_path(set)
-    req = _load_json(path)
+def _request_point_features(req: dict) -> list[dict]:
     # Extract points for two common schemas:
     # A) Direct lat/lon arrays on vehicles.start/end and jobs.location
     # B) NextBillion-style location_index with a global locations.location list (strings "lat,lon") and depots mapping
@@ -405,8 +794,310 @@ def api_request_points(set: int = Query(...)):
                 "geometry": {"type": "Point", "coordinates": jc},
                 "properties": {"point_type": "job", "id": jid}
             })
+    return features
+
+class _SetPoints:
+    """Request points and route step points of a set, with a grid index over both."""
+    __slots__ = ("request_features", "index")
+
+    def __init__(self, request_features: list[dict], step_features: list[dict]) -> None:
+        self.request_features = request_features
+        self.index = GridIndex(request_features + step_features)
+
+def _set_points(set_id: int) -> _SetPoints:
+    req_path = _resolve_request_path(set_id)
+    try:
+        resp_path = _resolve_data_path(set_id=set_id)
+    except HTTPException:
+        resp_path = None
+    stamp = (req_path, os.path.getmtime(req_path), resp_path, os.path.getmtime(resp_path) if resp_path else None)
+
+    def build() -> _SetPoints:
+        steps = []
+        if resp_path:
+            steps = [f for f in nb_to_geojson(_load_json(resp_path))["features"] if f["geometry"]["type"] == "Point"]
+        return _SetPoints(_request_point_features(_load_json(req_path)), steps)
+    return _INDEX_CACHE.get_or_load(("points", set_id), stamp, build)
+
+@app.get("/api/request-points")
+def api_request_points(set: int = Query(...)):
+    return FastJSONResponse({"type": "FeatureCollection", "features": _set_points(set).request_features})
+
+@app.get("/api/nearest")
+def api_nearest(set: int = Query(...), lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180), k: int = Query(default=5, ge=1, le=1000)):
+    features = []
+    for dist, feat in _set_points(set).index.nearest(lon, lat, k):
+        features.append({**feat, "properties": {**feat["properties"], "distance_m": round(dist, 1)}})
+    return FastJSONResponse({"type": "FeatureCollection", "features": features})
+
+@app.get("/api/within")
+def api_within(set: int = Query(...), bbox: str = Query(...)):
+    features = _set_points(set).index.within(_parse_bbox(bbox))
+    return FastJSONResponse({"type": "FeatureCollection", "features": features})
+
+# Place names for step/request markers, cached in SQLite by rounded coordinates
+geocoder = geocoder_from_env(os.path.join(ROOT, "state", "geocode.sqlite3"))
+
+@app.get("/api/geocode/reverse")
+def api_geocode_reverse(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180),
+                        key: str | None = Query(default=None, description="provider API key, used only when the server has none")):
+    try:
+        result = geocoder.reverse(lat, lon, key)
+    except GeocodeError as exc:
+        raise HTTPException(status_code=502, detail=str(exc))
+    return FastJSONResponse({"lat": lat, "lon": lon, "provider": geocoder.provider.name, **result})
+
+@app.get("/api/geocode/stats")
+def api_geocode_stats():
+    return FastJSONResponse(geocoder.stats())
+
+def _geocode_set(set_id: int, progress=None) -> dict:
+    coords = solver.parse_locations(_load_json(_resolve_request_path(set_id)).get("locations") or {})
+    return {"set": set_id, **geocoder.prewarm(coords, progress=progress)}
+
+job_queue.register("geocode", lambda set_id, params, progress: _geocode_set(set_id, progress))
+
+@app.post("/api/mock-sets/{set_id}/geocode", status_code=202)
+async def api_geocode_set(set_id: int, priority: int | None = None):
+    # Keys passed by browsers are never stored in the job table: pre-warming needs the server's own key
+    if geocoder.provider.needs_key and not getattr(geocoder.provider, "api_key", None):
+        raise HTTPException(status_code=400, detail="Pre-warming needs a provider key on the server (TOMTOM_API_KEY)")
+    await asyncio.to_thread(_resolve_request_path, set_id)
+    return FastJSONResponse(await _submit_job("geocode", set_id, {}, priority), status_code=202)
 
-    return JSONResponse({"type": "FeatureCollection", "features": features})
+# Vector tiles per set, built on first request and kept under data/<set>/tiles/<stamp>/
+# (non-empty tiles up to TILE_CACHE_MAX_ZOOM only)
+tile_cache = TileCache(max_zoom=int(os.getenv("TILE_CACHE_MAX_ZOOM", "16")))
+
+def _in_bbox(feat: dict, bbox: tuple) -> bool:
+    x, y = feat["geometry"]["coordinates"][:2]
+    return bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3]
+
+def _tile_layers(set_id: int, resp_path: str | None, req_path: str | None, z: int, x: int, y: int) -> dict:
+    bbox = tile_bbox(z, x, y, buffer=BUFFER / EXTENT)
+    layers = {}
+    if resp_path:
+        # Lines come pre-simplified for the zoom from the file's ZoomIndex
+        features = _zoom_index(resp_path).query(zoom=z, bbox=bbox)["features"]
+        layers["routes"] = [f for f in features if f["geometry"]["type"] == "LineString"]
+        layers["steps"] = [f for f in features if f["geometry"]["type"] == "Point"]
+    if req_path:
+        layers["jobs"] = [f for f in _set_points(set_id).request_features if _in_bbox(f, bbox)]
+    return layers
+
+@app.get("/tiles/{set_id}/{z}/{x}/{y}.pbf")
+def api_tile(request: Request, set_id: int, z: int, x: int, y: int):
+    if not 0 <= z <= 22 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Tile out of range")
+    resp_path = catalog.response_path(set_id)
+    req_path = catalog.request_path(set_id)
+    if resp_path is None and req_path is None:
+        raise HTTPException(status_code=404, detail=f"No request or response JSON found for set {set_id}")
+    # The stamp changes with either source file, so stale tiles are never served
+    stamp = "-".join(str(os.stat(p).st_mtime_ns) if p else "0" for p in (resp_path, req_path))
+    etag = f'W/"{stamp}-{z}-{x}-{y}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    def build() -> bytes:
+        with stage("tile"):
+            return encode_tile(_tile_layers(set_id, resp_path, req_path, z, x, y), z, x, y)
+    data, _ = tile_cache.get(os.path.join(DATA_DIR, str(set_id)), stamp, z, x, y, build)
+    if not data:
+        return Response(status_code=204, headers=headers)
+    return Response(content=data, media_type="application/vnd.mapbox-vector-tile", headers=headers)
+
+def _set_matrix(set_id: int, source: str) -> Matrix:
+    req_path = _resolve_request_path(set_id)
+
+    def build() -> Matrix:
+        coords = solver.parse_locations(_load_json(req_path).get("locations") or {})
+        return matrix_service.get(os.path.join(DATA_DIR, str(set_id)), coords, source)
+    return _INDEX_CACHE.get_or_load(("matrix", set_id, source), (req_path, os.path.getmtime(req_path)), build)
+
+def _parse_span(span: str | None, n: int, name: str) -> tuple[int, int]:
+    if span is None:
+        return 0, n
+    m = re.fullmatch(r"\s*(\d*)\s*:\s*(\d*)\s*", span)
+    if not m:
+        raise HTTPException(status_code=400, detail=f"{name} must be start:stop")
+    start = int(m.group(1)) if m.group(1) else 0
+    stop = min(n, int(m.group(2))) if m.group(2) else n
+    if start > stop:
+        raise HTTPException(status_code=400, detail=f"{name}: start > stop")
+    return start, stop
+
+@app.get("/api/matrix")
+def api_matrix(
+    set: int = Query(...),
+    kind: str = Query(default="distance", pattern="^(distance|duration)$"),
+    rows: str | None = Query(default=None, description="row span start:stop (default all)"),
+    cols: str | None = Query(default=None, description="column span start:stop (default all)"),
+    source: str = Query(default="haversine"),
+    format: str = Query(default="json", pattern="^(json|npy)$"),
+):
+    if source not in COST_SOURCES:
+        raise HTTPException(status_code=400, detail=f"Unknown cost source: {source}")
+    mat = _set_matrix(set, source)
+    r0, r1 = _parse_span(rows, mat.n, "rows")
+    c0, c1 = _parse_span(cols, mat.n, "cols")
+    if (r1 - r0) * (c1 - c0) > _MATRIX_MAX_CELLS:
+        raise HTTPException(status_code=400, detail=f"Tile has {(r1 - r0) * (c1 - c0)} cells (max {_MATRIX_MAX_CELLS}); narrow rows=/cols=")
+    meta = {"set": set, "key": mat.key, "source": mat.source, "n": mat.n, "kind": kind,
+            "units": "m" if kind == "distance" else "s", "rows": [r0, r1], "cols": [c0, c1]}
+    if format == "npy":
+        body = write_npy_bytes(mat.tile_bytes(kind, r0, r1, c0, c1), "<f4", (r1 - r0, c1 - c0))
+        return Response(content=body, media_type="application/octet-stream",
+                        headers={"X-Matrix-Key": mat.key, "Content-Disposition": f'attachment; filename="{kind}-{set}-{r0}-{c0}.npy"'})
+    return FastJSONResponse({**meta, "values": mat.tile(kind, r0, r1, c0, c1)})
+
+def _load_typed(path: str) -> schema.Response:
+    # Typed decode for one-off reductions: compact structs, and the parse is not cached
+    with stage("load"):
+        try:
+            return _PARSE_POOL.submit(schema.load_response, path).result()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Data file not found: {os.path.basename(path)}")
+        except jsonlib.DecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid response in {os.path.basename(path)}: {str(e)}")
+
+def _analytics_table(resp_path: str, req_path: str | None) -> analytics.Table:
+    stamp = (os.path.getmtime(resp_path), req_path, os.path.getmtime(req_path) if req_path else None)
+    return _INDEX_CACHE.get_or_load(("analytics", resp_path), stamp,
+                                    lambda: analytics.open_table(resp_path, req_path, _load_json, _load_typed))
+
+def _parse_ids(value: str, name: str) -> list[int] | None:
+    # "all" -> None (every one), "none" -> [], else comma-separated ids
+    if value == "all":
+        return None
+    if value == "none":
+        return []
+    try:
+        return [int(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be 'all', 'none' or comma-separated ids")
+
+def _analytics_sources(sets: str, versions: str) -> list[tuple[str, str, str | None]]:
+    """(label, response path, request path) of the selected sets and root versions."""
+    out = []
+    set_ids = _parse_ids(sets, "sets")
+    for set_id in (set_ids if set_ids is not None else [s["id"] for s in _list_mock_sets()]):
+        resp_path = catalog.response_path(set_id)
+        if resp_path is None:
+            if set_ids is not None:
+                raise HTTPException(status_code=404, detail=f"No response JSON found for set {set_id}")
+            continue
+        out.append((f"set:{set_id}", resp_path, catalog.request_path(set_id)))
+    version_ids = _parse_ids(versions, "versions")
+    files = {f["version"]: f["path"] for f in _list_data_files()}
+    for version in (version_ids if version_ids is not None else sorted(files)):
+        if version not in files:
+            raise HTTPException(status_code=404, detail=f"Version not found: {version}")
+        out.append((f"version:{version}", files[version], None))
+    return out
+
+@app.get("/api/analytics")
+def api_analytics(group_by: str = Query(default="vehicle", description="comma-separated: vehicle, day, source (empty = fleet total)"),
+                  level: str = Query(default="routes", pattern="^(routes|steps)$"),
+                  metrics: str | None = Query(default=None, description="comma-separated; default all of the level"),
+                  sets: str = Query(default="all"), versions: str = Query(default="none"),
+                  since: float | None = Query(default=None, description="epoch seconds"), until: float | None = Query(default=None),
+                  utc_offset: float = Query(default=0.0, ge=-14, le=14, description="hours, for day boundaries")):
+    keys = [k for k in group_by.split(",") if k]
+    if any(k not in analytics.GROUP_KEYS for k in keys) or len(set(keys)) != len(keys):
+        raise HTTPException(status_code=400, detail=f"group_by must be a combination of {', '.join(analytics.GROUP_KEYS)}")
+    allowed = analytics.ROUTE_METRICS if level == "routes" else analytics.STEP_METRICS
+    wanted = [m for m in metrics.split(",") if m] if metrics else None
+    if wanted is not None and any(m not in allowed for m in wanted):
+        raise HTTPException(status_code=400, detail=f"{level} metrics: {', '.join(allowed)}")
+    t0 = time.perf_counter()
+    tables = [(label, _analytics_table(resp, req)) for label, resp, req in _analytics_sources(sets, versions)]
+    with stage("analytics"):
+        groups = analytics.aggregate(tables, keys, level=level, metrics=wanted, since=since, until=until, utc_offset=utc_offset)
+    return FastJSONResponse({
+        "level": level,
+        "group_by": keys,
+        "sources": len(tables),
+        "rows": sum(t.rows if level == "routes" else t.step_rows for _, t in tables),
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "groups": groups,
+    })
+
+@app.get("/api/catalog/events")
+def api_catalog_events(since: int = Query(default=0, ge=0)):
+    # Change feed of the data catalog: files/sets added, removed or rewritten after `since`
+    return FastJSONResponse({**catalog.events(since), "watching": catalog.watching})
+
+@app.get("/api/cache/stats")
+def api_cache_stats():
+    return FastJSONResponse({**{c.name: c.stats() for c in (_DATA_CACHE, _ARTIFACT_CACHE, _INDEX_CACHE)}, "warmup": warmup.stats()})
+
+@REGISTRY.collector("cache_lookups_total", "counter", "In-process cache lookups by cache and result.")
+def _cache_lookups():
+    for c in (_DATA_CACHE, _ARTIFACT_CACHE, _INDEX_CACHE):
+        st = c.stats()
+        yield {"cache": c.name, "result": "hit"}, st["hits"]
+        yield {"cache": c.name, "result": "miss"}, st["misses"]
+        yield {"cache": c.name, "result": "coalesced"}, st["coalesced"]
+
+@REGISTRY.collector("cache_hit_ratio", "gauge", "Hits over hits + misses since start.")
+def _cache_hit_ratio():
+    return [({"cache": c.name}, c.stats()["hit_ratio"]) for c in (_DATA_CACHE, _ARTIFACT_CACHE, _INDEX_CACHE)]
+
+@REGISTRY.collector("cache_bytes", "gauge", "Estimated bytes held per cache.")
+def _cache_bytes():
+    return [({"cache": c.name}, c.bytes) for c in (_DATA_CACHE, _ARTIFACT_CACHE, _INDEX_CACHE)]
+
+@REGISTRY.collector("cache_evictions_total", "counter", "Entries evicted to stay within the byte budget.")
+def _cache_evictions():
+    return [({"cache": c.name}, c.evictions) for c in (_DATA_CACHE, _ARTIFACT_CACHE, _INDEX_CACHE)]
+
+# The connection manager and tracker are owned by the event loop: /metrics snapshots them
+# there before rendering the registry in a thread
+_loop_stats: dict = {"ws": manager.stats(), "tracking": tracker.stats()}
+
+@REGISTRY.collector("ws_connections", "gauge", "Open device WebSockets on this worker.")
+def _ws_connections():
+    return [({}, _loop_stats["ws"]["connections"])]
+
+@REGISTRY.collector("ws_send_queue_messages", "gauge", "Messages waiting in per-connection send queues (total and deepest queue).")
+def _ws_queues():
+    st = _loop_stats["ws"]
+    return [({"kind": "total"}, st["queued_messages"]), ({"kind": "max"}, st["max_queue_depth"])]
+
+@REGISTRY.collector("ws_dropped_messages_total", "counter", "Messages dropped or connections closed because a consumer was too slow.")
+def _ws_dropped():
+    st = _loop_stats["ws"]
+    return [({"reason": "dropped"}, st["dropped"]), ({"reason": "slow_disconnect"}, st["slow_disconnects"])]
+
+@REGISTRY.collector("job_queue_depth", "gauge", "Background jobs waiting for and held by workers on this process.")
+def _job_queue_depth():
+    st = job_queue.stats()
+    return [({"state": "queued"}, st["queued"]), ({"state": "running"}, st["running"])]
+
+@REGISTRY.collector("json_parse_queue_depth", "gauge", "JSON files waiting for a parse worker.")
+def _parse_queue_depth():
+    return [({}, _PARSE_POOL._work_queue.qsize())]
+
+@REGISTRY.collector("tracked_vehicles", "gauge", "Vehicles with a GPS position on this worker.")
+def _tracked_vehicles():
+    return [({}, _loop_stats["tracking"]["vehicles"])]
+
+@app.get("/metrics", include_in_schema=False)
+async def api_metrics():
+    global _loop_stats
+    _loop_stats = {"ws": manager.stats(), "tracking": tracker.stats()}
+    # Rendering folds counters and queries the job store: keep it off the loop
+    content = await asyncio.to_thread(REGISTRY.render)
+    return Response(content=content, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/metrics/slow")
+def api_slow_requests():
+    # Stack samples of recent requests over PROFILE_SLOW_MS (empty unless profiling is on)
+    if slow_profiler is None:
+        return FastJSONResponse({"enabled": False, "requests": []})
+    return FastJSONResponse({"enabled": True, "threshold_ms": slow_profiler.threshold * 1000,
+                             "samples": slow_profiler.samples, "requests": slow_profiler.recent()})
 
 @app.get("/api/data-files")
 def api_data_files():
@@ -416,7 +1107,7 @@ def api_data_files():
         default_name = os.path.basename(default_path)
     except FileNotFoundError:
         default_name = None
-    return JSONResponse({
+    return FastJSONResponse({
         "files": [{"name": f["name"], "version": f["version"]} for f in files],
         "default": default_name,
     })
@@ -429,16 +1120,25 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.close(code=4000)
         logging.warning("WS rejected: missing device_id")
         return
-    await manager.connect(device_id, websocket)
+    # Optional routing tags used by broadcasts: ?vehicle=<vehicle id>&set=<set id>
+    set_param = websocket.query_params.get("set")
+    set_id = int(set_param) if set_param and set_param.isdigit() else None
+    vehicle = websocket.query_params.get("vehicle")
+    await router.connect(device_id, websocket, vehicle=vehicle, set_id=set_id)
     try:
         while True:
-            # Consume incoming messages to keep the connection alive; payload ignored.
-            await websocket.receive_text()
+            # GPS pings ({"type": "ping"|"pings", ...}) feed the tracker; other messages are ignored
+            await tracker.handle(device_id, vehicle, set_id, await websocket.receive_text())
     except WebSocketDisconnect:
-        await manager.disconnect(device_id)
+        await router.disconnect(device_id, websocket)
     except Exception as exc:
         logging.exception("WS error for %s: %s", device_id, exc)
-        await manager.disconnect(device_id)
+        await router.disconnect(device_id, websocket)
+    if not vehicle and not manager.has(device_id):
+        # An untagged device's state is keyed by the device alone; tagged vehicles expire by TTL
+        key = tracker.forget_device(device_id)
+        if key is not None and shared.shares_cache:
+            await asyncio.to_thread(shared.hdel, "positions", key)
 
 
 @app.post("/api/start-navigation")
@@ -449,7 +1149,76 @@ async def api_start_navigation(req: StartNavigationRequest):
         "ts": time.time(),
     }
     try:
-        await manager.send_to(req.device_id, payload)
+        await router.send_to(req.device_id, payload)
     except KeyError:
         raise HTTPException(status_code=404, detail="Device not connected")
-    return JSONResponse({"sent": True})
+    return FastJSONResponse({"sent": True})
+
+@app.post("/api/start-navigation/bulk")
+async def api_start_navigation_bulk(req: StartNavigationBulkRequest):
+    # One request for a whole re-optimized plan: a route per device, queued concurrently
+    ts = time.time()
+    result = await router.send_many(
+        (a.device_id, {"type": "start_navigation", "route_id": a.route_id, "ts": ts}) for a in req.assignments
+    )
+    return FastJSONResponse(result)
+
+@app.post("/api/broadcast")
+async def api_broadcast(req: BroadcastRequest):
+    result = await router.broadcast(req.payload, device_ids=req.device_ids, vehicle=req.vehicle, set_id=req.set)
+    return FastJSONResponse(result)
+
+@app.get("/api/ws/stats")
+async def api_ws_stats():
+    # Local counters are read on the loop that mutates them; only the shared registry goes to a thread
+    stats = router.stats()
+    stats.update(await asyncio.to_thread(router.shared_stats))
+    stats["tracking"] = tracker.stats()
+    return FastJSONResponse(stats)
+
+@app.get("/api/positions")
+async def api_positions(set: int | None = None, vehicles: str | None = Query(default=None, description="comma-separated vehicle ids")):
+    wanted = [v for v in vehicles.split(",") if v] if vehicles else None
+    positions = {p["key"]: p for p in tracker.positions(set, wanted)}
+    if shared.shares_cache:
+        # Vehicles streaming to other workers, as of their last flush
+        stale = []
+        for key, raw in (await asyncio.to_thread(shared.hgetall, "positions")).items():
+            if key in positions:
+                continue
+            p = jsonlib.loads(raw)
+            if _stale_position(p):
+                stale.append(key)
+                continue
+            p.pop("steps", None)
+            if (set is None or p["set"] == set) and (wanted is None or p["vehicle"] in wanted):
+                positions[key] = p
+        if stale:
+            await asyncio.to_thread(shared.hdel, "positions", *stale)
+    return FastJSONResponse({"positions": list(positions.values()), "count": len(positions)})
+
+async def _tracked(set: int | None, vehicle: str) -> tuple:
+    st = tracker.vehicles.get(Tracker.key_for("", vehicle, set))
+    if st is not None and st.ring.count:
+        return st, None
+    if shared.shares_cache:
+        raw = await asyncio.to_thread(shared.hget, "positions", Tracker.key_for("", vehicle, set))
+        if raw is not None and not _stale_position(snapshot := jsonlib.loads(raw)):
+            return None, snapshot
+    raise HTTPException(status_code=404, detail=f"Vehicle {vehicle} has not reported a position")
+
+@app.get("/api/eta")
+async def api_eta(vehicle: str = Query(...), set: int | None = None):
+    st, snapshot = await _tracked(set, vehicle)
+    if st is None:
+        return FastJSONResponse(snapshot)
+    return FastJSONResponse({**st.position(), "steps": st.etas()})
+
+@app.get("/api/positions/track")
+async def api_position_track(vehicle: str = Query(...), set: int | None = None, n: int = Query(default=100, ge=1, le=10000)):
+    st, _ = await _tracked(set, vehicle)
+    if st is None:
+        raise HTTPException(status_code=404, detail=f"Track of vehicle {vehicle} is held by another worker")
+    pings = [{"ts": ts, "lat": lat, "lon": lon, "speed": None if speed != speed else speed, "heading": None if heading != heading else heading}
+             for ts, lon, lat, speed, heading in st.ring.recent(n)]
+    return FastJSONResponse({"vehicle": vehicle, "set": set, "pings": pings})
@@ -0,0 +1,197 @@
+"""Distance/duration matrices for a set's locations, stored as memory-mapped .npy files.
+
+A matrix is keyed by a hash of its cost source, that source's parameters and the
+location list, so it is computed once per distinct request. It is stored as
+``<set dir>/matrix/<source>-<key>.{distance,duration}.npy`` (float32, N x N, metres and
+seconds) plus a ``.json`` manifest, and is re-opened with mmap instead of being rebuilt.
+
+Cost sources are pluggable (``register_cost_source``). The built-in ``haversine``
+source computes blocks of rows with NumPy broadcasting when available and falls back
+to a row-by-row loop otherwise.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Sequence
+
+from .npyio import NpyAppender, open_npy
+from .spatial import EARTH_RADIUS_M
+
+try:  # optional
+    import numpy as np
+except ImportError:
+    np = None
+
+COST_SOURCES: dict[str, Callable[..., "CostSource"]] = {}
+
+_BLOCK_CELLS = 1 << 22  # rows per NumPy block = this / N
+
+
+def register_cost_source(name: str) -> Callable:
+    def decorate(cls):
+        COST_SOURCES[name] = cls
+        return cls
+    return decorate
+
+
+class CostSource:
+    """Produces rows of the distance (m) and duration (s) matrices for a location list."""
+
+    name = "base"
+
+    def params(self) -> dict:
+        """Parameters that change the output (part of the cache key)."""
+        return {}
+
+    def rows(self, lats: Sequence[float], lons: Sequence[float], start: int, stop: int) -> tuple[Any, Any]:
+        """(distance, duration) for rows start..stop: arrays or lists of lists, shape (stop-start, N)."""
+        raise NotImplementedError
+
+
+@register_cost_source("haversine")
+class HaversineSource(CostSource):
+    """Great-circle distance x ``detour`` at a constant ``speed_mps`` (same model as the local solver)."""
+
+    name = "haversine"
+
+    def __init__(self, speed_mps: float = 15.0, detour: float = 1.3) -> None:
+        self.speed_mps = speed_mps
+        self.detour = detour
+
+    def params(self) -> dict:
+        return {"speed_mps": self.speed_mps, "detour": self.detour}
+
+    def rows(self, lats, lons, start, stop):
+        if np is not None:
+            lat = np.radians(np.asarray(lats, dtype=np.float64))
+            lon = np.radians(np.asarray(lons, dtype=np.float64))
+            la, lo = lat[start:stop, None], lon[start:stop, None]
+            h = np.sin((lat[None, :] - la) / 2) ** 2 + np.cos(la) * np.cos(lat)[None, :] * np.sin((lon[None, :] - lo) / 2) ** 2
+            dist = 2 * EARTH_RADIUS_M * self.detour * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+            return dist, dist / self.speed_mps
+        rlat = [math.radians(x) for x in lats]
+        rlon = [math.radians(x) for x in lons]
+        cos = [math.cos(x) for x in rlat]
+        scale = 2 * EARTH_RADIUS_M * self.detour
+        dist_rows, dur_rows = [], []
+        for i in range(start, stop):
+            la, lo, ca = rlat[i], rlon[i], cos[i]
+            row = [scale * math.asin(math.sqrt(min(1.0, math.sin((rlat[j] - la) / 2) ** 2 + ca * cos[j] * math.sin((rlon[j] - lo) / 2) ** 2)))
+                   for j in range(len(rlat))]
+            dist_rows.append(row)
+            dur_rows.append([d / self.speed_mps for d in row])
+        return dist_rows, dur_rows
+
+
+def matrix_key(source: CostSource, coords: Sequence[tuple[float, float]]) -> str:
+    h = hashlib.blake2b(digest_size=12)
+    h.update(json.dumps([source.name, source.params()], sort_keys=True).encode())
+    for lat, lon in coords:
+        h.update(f"{lat!r},{lon!r};".encode())
+    return h.hexdigest()
+
+
+class Matrix:
+    """An opened N x N distance/duration pair (NumPy memmaps, or flat memoryviews without NumPy)."""
+    __slots__ = ("key", "source", "n", "distance", "duration", "path")
+
+    def __init__(self, key: str, source: str, n: int, distance: Any, duration: Any, path: str) -> None:
+        self.key = key
+        self.source = source
+        self.n = n
+        self.distance = distance
+        self.duration = duration
+        self.path = path
+
+    @property
+    def nbytes(self) -> int:
+        # Mapped pages live in the OS page cache, not the heap: count only the bookkeeping
+        return 256
+
+    def tile(self, kind: str, r0: int, r1: int, c0: int, c1: int) -> list[list[float]]:
+        arr = self.distance if kind == "distance" else self.duration
+        if np is not None:
+            return arr[r0:r1, c0:c1].tolist()
+        flat = arr.cast("B").cast("f")
+        return [flat[i * self.n + c0:i * self.n + c1].tolist() for i in range(r0, r1)]
+
+    def tile_bytes(self, kind: str, r0: int, r1: int, c0: int, c1: int) -> bytes:
+        """Raw little-endian float32 cells of the tile, row-major."""
+        arr = self.distance if kind == "distance" else self.duration
+        if np is not None:
+            return np.ascontiguousarray(arr[r0:r1, c0:c1]).tobytes()
+        flat = arr.cast("B")
+        return b"".join(flat[(i * self.n + c0) * 4:(i * self.n + c1) * 4] for i in range(r0, r1))
+
+
+class MatrixService:
+    """Builds, stores and opens matrices; one build per key at a time."""
+
+    def __init__(self) -> None:
+        self._locks: dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, set_dir: str, coords: Sequence[tuple[float, float]], source: str = "haversine", **params: Any) -> Matrix:
+        if source not in COST_SOURCES:
+            raise KeyError(source)
+        src = COST_SOURCES[source](**params)
+        key = matrix_key(src, coords)
+        folder = os.path.join(set_dir, "matrix")
+        base = os.path.join(folder, f"{src.name}-{key}")
+        with self._lock(key):
+            if not os.path.exists(base + ".json"):
+                os.makedirs(folder, exist_ok=True)
+                self._build(src, coords, base)
+                self._prune(folder, src.name, key)
+        return Matrix(key, src.name, len(coords), open_npy(base + ".distance.npy"), open_npy(base + ".duration.npy"), base)
+
+    @staticmethod
+    def _build(src: CostSource, coords: Sequence[tuple[float, float]], base: str) -> None:
+        n = len(coords)
+        lats = [c[0] for c in coords]
+        lons = [c[1] for c in coords]
+        t0 = time.perf_counter()
+        tmp = f".{os.getpid()}.{threading.get_ident()}.part"
+        paths = (base + ".distance.npy", base + ".duration.npy")
+        if np is not None:
+            outs = [np.lib.format.open_memmap(p + tmp, mode="w+", dtype="<f4", shape=(n, n)) for p in paths]
+            block = max(1, _BLOCK_CELLS // max(1, n))
+            for start in range(0, n, block):
+                stop = min(n, start + block)
+                for out, rows in zip(outs, src.rows(lats, lons, start, stop)):
+                    out[start:stop] = rows
+            for out in outs:
+                out.flush()
+            del outs
+        else:
+            outs = [NpyAppender(p + tmp, "<f4", width=n) for p in paths]
+            for start in range(0, n, 64):
+                for out, rows in zip(outs, src.rows(lats, lons, start, min(n, start + 64))):
+                    out.extend(rows)
+            for out in outs:
+                out.close()
+        for p in paths:
+            os.replace(p + tmp, p)
+        # The manifest goes last: its presence marks a complete matrix
+        manifest = {"key": os.path.basename(base).split("-", 1)[1], "source": src.name, "params": src.params(), "n": n,
+                    "dtype": "<f4", "units": {"distance": "m", "duration": "s"}, "build_seconds": round(time.perf_counter() - t0, 3)}
+        with open(base + ".json" + tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(base + ".json" + tmp, base + ".json")
+
+    @staticmethod
+    def _prune(folder: str, source: str, keep: str) -> None:
+        """Drop matrices of older location lists for the same source."""
+        for name in os.listdir(folder):
+            if name.startswith(f"{source}-") and not name.startswith(f"{source}-{keep}.") and ".part" not in name:
+                try:
+                    os.remove(os.path.join(folder, name))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,345 @@
+"""In-process metrics in Prometheus text format, plus an opt-in slow-request profiler.
+
+Recording a counter increment or a histogram observation only appends to a deque
+(atomic under the GIL, no lock); the backlog is folded into buckets when metrics are
+scraped or when it grows past ``_FOLD_AT``. Request timing and the per-stage timers
+(``with stage("load"):``) thus stay well under 1% of a hot request. Values that
+already live elsewhere (cache statistics, WebSocket queues, job counts) are not
+mirrored: collectors registered with ``REGISTRY.collector`` read them at scrape time.
+
+``SlowRequestProfiler`` (enabled by ``PROFILE_SLOW_MS``) samples the stacks of busy
+threads every ``PROFILE_INTERVAL_MS`` while requests are in flight, and keeps the
+aggregated stacks of requests slower than the threshold. It costs nothing when off and
+does not sample while the server is idle.
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+_FOLD_AT = 50_000
+
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    """Observations are queued as (label values, value) and folded under the lock later."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+
+    def _record(self, labelvalues: Tuple[str, ...], value: float) -> None:
+        self._pending.append((labelvalues, value))
+        if len(self._pending) > _FOLD_AT:
+            self._fold()
+
+    def _fold(self) -> None:
+        pop = self._pending.popleft
+        with self._lock:
+            while True:
+                try:
+                    labelvalues, value = pop()
+                except IndexError:
+                    return
+                self._add(labelvalues, value)
+
+    def _add(self, labelvalues: Tuple[str, ...], value: float) -> None:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self._record(labelvalues, amount)
+
+    def _add(self, labelvalues, value):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + value
+
+    def render(self) -> List[str]:
+        self._fold()
+        with self._lock:
+            items = sorted(self._values.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+        return out
+
+
+class Histogram(_Metric):
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = TIME_BUCKETS, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (+Inf last)..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        self._record(labelvalues, value)
+
+    def _add(self, labelvalues, value):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        self._fold()
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in items:
+            running = 0
+            for le, n in zip(self.buckets + (float("inf"),), series):
+                running += n
+                le_label = 'le="%s"' % _num(le)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le_label)} {running}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-2]!r}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[Any] = []
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Tuple[Dict[str, str], float]]]]] = []
+        self._hooks: List[Callable[[], None]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = TIME_BUCKETS, labelnames: Sequence[str] = ()) -> Histogram:
+        metric = Histogram(name, help, buckets, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, kind: str, help: str) -> Callable:
+        """Register ``fn() -> [(labels, value), ...]``, read at every scrape (kind: gauge|counter)."""
+        def decorate(fn):
+            self._collectors.append((name, kind, help, fn))
+            return fn
+        return decorate
+
+    def before_render(self, fn: Callable[[], None]) -> Callable[[], None]:
+        self._hooks.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for fn in self._hooks:
+            fn()
+        out: List[str] = []
+        for metric in self._metrics:
+            out += metric.render()
+        for name, kind, help, fn in self._collectors:
+            out += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in fn():
+                if value is None:
+                    continue
+                out.append(f"{name}{_labels(list(labels), list(labels.values()))} {_num(value)}")
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by route template, method and status.", ("method", "route", "status"))
+HTTP_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "Time from request to the last response byte.", TIME_BUCKETS, ("route",))
+HTTP_BYTES = REGISTRY.histogram("http_response_bytes", "Response body size as sent (after content encoding).", SIZE_BUCKETS, ("route",))
+STAGE_SECONDS = REGISTRY.histogram("stage_duration_seconds", "Time spent per processing stage.", TIME_BUCKETS, ("stage",))
+
+# One (method, matched route, status, seconds, bytes) record per request, spread over the
+# three HTTP metrics at scrape time
+_HTTP_LOG: deque = deque()
+
+
+@REGISTRY.before_render
+def _fold_http() -> None:
+    pop = _HTTP_LOG.popleft
+    while True:
+        try:
+            method, route, status, elapsed, size = pop()
+        except IndexError:
+            return
+        # Route templates ("/api/jobs/{job_id}") keep label cardinality bounded
+        route = getattr(route, "path", None) or "unmatched"
+        HTTP_REQUESTS.inc(method, route, str(status))
+        HTTP_SECONDS.observe(elapsed, route)
+        HTTP_BYTES.observe(size, route)
+
+
+class stage:
+    """``with stage("load"):`` records the block's wall time under stage_duration_seconds."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.name)
+
+
+# ---- slow-request profiler -------------------------------------------------------
+
+_IDLE_FRAMES = {"wait", "select", "poll", "epoll", "_worker", "get", "sleep", "accept", "recv", "read", "readinto", "run_forever", "_run_once"}
+
+
+class _InFlight:
+    __slots__ = ("started", "samples")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.samples: _Tally = _Tally()
+
+
+class SlowRequestProfiler:
+    """Stack samples of the server's busy threads, kept for requests over ``threshold`` seconds.
+
+    Samples are taken from every thread that is not parked in a wait, so concurrent
+    requests share samples; with a handful of requests in flight that still points at the
+    code that made the slow one slow.
+    """
+
+    def __init__(self, threshold: float, interval: float = 0.005, keep: int = 20, depth: int = 40, top: int = 25) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.depth = depth
+        self.top = top
+        self._active: Dict[int, _InFlight] = {}
+        self._ids = iter(range(1, sys.maxsize))
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._recent: deque = deque(maxlen=keep)
+        self._thread: Optional[threading.Thread] = None
+        self.samples = 0
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slow-profiler", daemon=True)
+            self._thread.start()
+
+    def begin(self) -> int:
+        token = next(self._ids)
+        with self._lock:
+            self._active[token] = _InFlight()
+        self._wake.set()
+        return token
+
+    def end(self, token: int, elapsed: float, **info: Any) -> None:
+        with self._lock:
+            flight = self._active.pop(token, None)
+        if flight is None or elapsed < self.threshold:
+            return
+        total = sum(flight.samples.values())
+        self._recent.append({
+            **info,
+            "ms": round(elapsed * 1000, 1),
+            "at": time.time(),
+            "samples": total,
+            "stacks": [{"stack": s, "samples": n, "share": round(n / total, 3)} for s, n in flight.samples.most_common(self.top)],
+        })
+
+    def _stack(self, frame) -> Optional[str]:
+        if frame.f_code.co_name in _IDLE_FRAMES:
+            return None
+        parts = []
+        while frame is not None and len(parts) < self.depth:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                busy = bool(self._active)
+            if not busy:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            stacks = [s for tid, f in sys._current_frames().items() if tid != me and (s := self._stack(f)) is not None]
+            self.samples += 1
+            with self._lock:
+                for flight in self._active.values():
+                    flight.samples.update(stacks)
+            time.sleep(self.interval)
+
+    def recent(self) -> List[dict]:
+        return list(reversed(self._recent))
+
+
+def profiler_from_env() -> Optional[SlowRequestProfiler]:
+    """A started SlowRequestProfiler if PROFILE_SLOW_MS is set (PROFILE_INTERVAL_MS, default 5)."""
+    threshold = os.getenv("PROFILE_SLOW_MS")
+    if not threshold:
+        return None
+    profiler = SlowRequestProfiler(float(threshold) / 1000, interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000)
+    profiler.start()
+    return profiler
+
+
+class MetricsMiddleware:
+    """ASGI middleware: per-route request counts, latency and response size (HTTP only)."""
+
+    def __init__(self, app, profiler: Optional[SlowRequestProfiler] = None) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send, _clock=time.perf_counter) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = _clock()
+        token = self.profiler.begin() if self.profiler is not None else None
+        sent = [500, 0]  # status, body bytes
+
+        async def send_counted(message) -> None:
+            if message["type"] == "http.response.body":
+                sent[1] += len(message.get("body", b""))
+            elif message["type"] == "http.response.start":
+                sent[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_counted)
+        finally:
+            elapsed = _clock() - start
+            _HTTP_LOG.append((scope["method"], scope.get("route"), sent[0], elapsed, sent[1]))
+            if len(_HTTP_LOG) > _FOLD_AT:
+                _fold_http()
+            if token is not None:
+                self.profiler.end(token, elapsed, method=scope["method"], path=scope["path"],
+                                  query=scope.get("query_string", b"").decode("latin-1"),
+                                  route=getattr(scope.get("route"), "path", None), status=sent[0])
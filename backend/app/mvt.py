@@ -0,0 +1,284 @@
+"""Mapbox Vector Tile (MVT 2.1) encoding of GeoJSON features, and an on-disk tile cache.
+
+The protobuf is written by hand: a tile is a few nested length-delimited messages, so a
+dependency is not worth it. Features are projected to Web Mercator tile coordinates
+(``extent`` units per tile). Lines are clipped to the tile plus ``buffer`` units and
+consecutive duplicate vertices are dropped after rounding.
+
+``TileCache`` stores encoded tiles under ``<set dir>/tiles/<stamp>/z/x/y.pbf``, where
+the stamp changes whenever a source file changes. A stale stamp's directory is
+removed the first time a tile for a newer stamp is written.
+"""
+import math
+import os
+import shutil
+import struct
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+EXTENT = 4096
+BUFFER = 64
+MAX_LAT = 85.0511287798066
+
+_POINT, _LINESTRING = 1, 2
+
+
+def tile_bbox(z: int, x: int, y: int, buffer: float = 0.0) -> Tuple[float, float, float, float]:
+    """(minLon, minLat, maxLon, maxLat) of a tile, grown by ``buffer`` tile fractions."""
+    n = 2 ** z
+
+    def lon(tx: float) -> float:
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return (lon(x - buffer), lat(min(n, y + 1 + buffer)), lon(x + 1 + buffer), lat(max(0.0, y - buffer)))
+
+
+def _projector(z: int, x: int, y: int, extent: int) -> Callable[[float, float], Tuple[float, float]]:
+    scale = extent * 2 ** z
+
+    def project(lon: float, lat: float) -> Tuple[float, float]:
+        lat = max(-MAX_LAT, min(MAX_LAT, lat))
+        s = math.sin(math.radians(lat))
+        px = (lon + 180.0) / 360.0 * scale - x * extent
+        py = (0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * scale - y * extent
+        return px, py
+    return project
+
+
+def _clip_segment(x0: float, y0: float, x1: float, y1: float, lo: float, hi: float) -> Optional[Tuple[float, float, float, float, bool]]:
+    """Liang-Barsky clip of a segment to the square [lo, hi]^2 (last item: it leaves the square)."""
+    t0, t1 = 0.0, 1.0
+    dx, dy = x1 - x0, y1 - y0
+    for p, q in ((-dx, x0 - lo), (dx, hi - x0), (-dy, y0 - lo), (dy, hi - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        r = q / p
+        if p < 0:
+            if r > t1:
+                return None
+            t0 = max(t0, r)
+        else:
+            if r < t0:
+                return None
+            t1 = min(t1, r)
+    return x0 + t0 * dx, y0 + t0 * dy, x0 + t1 * dx, y0 + t1 * dy, t1 < 1.0
+
+
+def clip_line(points: Sequence[Tuple[float, float]], lo: float, hi: float) -> List[List[Tuple[int, int]]]:
+    """Parts of a projected polyline inside [lo, hi]^2, as rounded integer vertices."""
+    parts: List[List[Tuple[int, int]]] = []
+    current: List[Tuple[int, int]] = []
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        seg = _clip_segment(x0, y0, x1, y1, lo, hi)
+        if seg is None:
+            if len(current) > 1:
+                parts.append(current)
+            current = []
+            continue
+        a = (round(seg[0]), round(seg[1]))
+        b = (round(seg[2]), round(seg[3]))
+        if not current or current[-1] != a:
+            if len(current) > 1:
+                parts.append(current)
+            current = [a]
+        if b != current[-1]:
+            current.append(b)
+        if seg[4]:
+            # Left the box inside this segment
+            if len(current) > 1:
+                parts.append(current)
+            current = []
+    if len(current) > 1:
+        parts.append(current)
+    return parts
+
+
+# ---- protobuf ----------------------------------------------------------------
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _field(num: int, payload: bytes) -> bytes:
+    """Length-delimited field."""
+    return _varint((num << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _packed(num: int, values: Iterable[int]) -> bytes:
+    return _field(num, b"".join(_varint(v) for v in values))
+
+
+def _value(v: Any) -> bytes:
+    if isinstance(v, bool):
+        return _varint((7 << 3) | 0) + _varint(int(v))
+    if isinstance(v, int):
+        if v >= 0:
+            return _varint((5 << 3) | 0) + _varint(v)
+        return _varint((6 << 3) | 0) + _varint(_zigzag(v))
+    if isinstance(v, float):
+        return _varint((3 << 3) | 1) + struct.pack("<d", v)
+    return _field(1, str(v).encode("utf-8"))
+
+
+def _geometry(kind: int, parts: List[List[Tuple[int, int]]]) -> List[int]:
+    cmds: List[int] = []
+    cx = cy = 0
+    if kind == _POINT:
+        cmds.append((1 & 7) | (len(parts) << 3))
+        for (px, py), in parts:
+            cmds += [_zigzag(px - cx), _zigzag(py - cy)]
+            cx, cy = px, py
+        return cmds
+    for part in parts:
+        px, py = part[0]
+        cmds += [(1 & 7) | (1 << 3), _zigzag(px - cx), _zigzag(py - cy)]
+        cx, cy = px, py
+        cmds.append((2 & 7) | ((len(part) - 1) << 3))
+        for px, py in part[1:]:
+            cmds += [_zigzag(px - cx), _zigzag(py - cy)]
+            cx, cy = px, py
+    return cmds
+
+
+class _Layer:
+    def __init__(self, name: str, extent: int) -> None:
+        self.name = name
+        self.extent = extent
+        self.keys: Dict[str, int] = {}
+        self.values: Dict[Tuple[type, Any], int] = {}
+        self.features: List[bytes] = []
+
+    def add(self, kind: int, parts: List[List[Tuple[int, int]]], properties: Dict[str, Any], fid: Optional[int] = None) -> None:
+        tags: List[int] = []
+        for k, v in properties.items():
+            if v is None or isinstance(v, (list, dict)):
+                continue
+            ki = self.keys.setdefault(k, len(self.keys))
+            vi = self.values.setdefault((type(v), v), len(self.values))
+            tags += [ki, vi]
+        body = b""
+        if fid is not None:
+            body += _varint((1 << 3) | 0) + _varint(fid)
+        if tags:
+            body += _packed(2, tags)
+        body += _varint((3 << 3) | 0) + _varint(kind)
+        body += _packed(4, _geometry(kind, parts))
+        self.features.append(body)
+
+    def encode(self) -> bytes:
+        out = [_varint((15 << 3) | 0) + _varint(2), _field(1, self.name.encode("utf-8"))]
+        out += [_field(2, f) for f in self.features]
+        out += [_field(3, k.encode("utf-8")) for k in self.keys]
+        out += [_field(4, _value(v)) for (_, v) in self.values]
+        out.append(_varint((5 << 3) | 0) + _varint(self.extent))
+        return b"".join(out)
+
+
+def encode_tile(layers: Dict[str, Iterable[Dict[str, Any]]], z: int, x: int, y: int,
+                extent: int = EXTENT, buffer: int = BUFFER) -> bytes:
+    """MVT bytes for GeoJSON Point/LineString features per layer name (empty layers are left out)."""
+    project = _projector(z, x, y, extent)
+    lo, hi = -buffer, extent + buffer
+    out = []
+    for name, features in layers.items():
+        layer = _Layer(name, extent)
+        for feat in features:
+            geom = feat.get("geometry") or {}
+            props = feat.get("properties") or {}
+            if geom.get("type") == "Point":
+                px, py = project(*geom["coordinates"][:2])
+                if lo <= px <= hi and lo <= py <= hi:
+                    layer.add(_POINT, [[(round(px), round(py))]], props)
+            elif geom.get("type") == "LineString":
+                parts = clip_line([project(c[0], c[1]) for c in geom["coordinates"]], lo, hi)
+                if parts:
+                    layer.add(_LINESTRING, parts, props)
+        if layer.features:
+            out.append(_field(3, layer.encode()))
+    return b"".join(out)
+
+
+class TileCache:
+    """Encoded tiles on disk per (set directory, source stamp); one build per tile at a time.
+
+    Only non-empty tiles up to ``max_zoom`` are stored, so the files on disk are bounded
+    by the data's footprint at that zoom rather than by what clients ask for. Deeper and
+    empty tiles are built on every request. Stamps are ``-``-joined integers that only
+    grow as the sources change (their mtimes); a write drops the stamps older than its own.
+    """
+
+    def __init__(self, max_zoom: int = 16) -> None:
+        self.max_zoom = max_zoom
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, set_dir: str, stamp: str, z: int, x: int, y: int, build: Callable[[], bytes]) -> Tuple[bytes, bool]:
+        """(tile bytes, built now) for the tile, building and storing it on a miss."""
+        if z > self.max_zoom:
+            return build(), True
+        root = os.path.join(set_dir, "tiles")
+        path = os.path.join(root, stamp, str(z), str(x), f"{y}.pbf")
+        try:
+            with open(path, "rb") as f:
+                return f.read(), False
+        except FileNotFoundError:
+            pass
+        try:
+            with self._lock(path):
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        return f.read(), False
+                data = build()
+                if not data:
+                    return data, True
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+        finally:
+            with self._guard:
+                self._locks.pop(path, None)
+        self._prune(root, stamp)
+        return data, True
+
+    @staticmethod
+    def _prune(root: str, keep: str) -> None:
+        """Drop tiles of older source versions.
+
+        A request that read the sources before they changed may finish after tiles of
+        the new stamp exist: only stamps that no part of is newer than ``keep`` go.
+        """
+        current = _stamp_parts(keep)
+        if current is None:
+            return
+        for name in os.listdir(root):
+            parts = _stamp_parts(name)
+            if (parts is not None and parts != current and len(parts) == len(current)
+                    and all(a <= b for a, b in zip(parts, current))):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def _stamp_parts(stamp: str) -> Optional[Tuple[int, ...]]:
+    try:
+        return tuple(int(p) for p in stamp.split("-"))
+    except ValueError:
+        return None
@@ -0,0 +1,116 @@
+"""Minimal .npy reader/writer that works with or without NumPy.
+
+Files are standard NumPy format 1.0, so ``numpy.load(path, mmap_mode="r")`` opens them
+directly. Without NumPy, ``open_npy`` memory-maps the file and returns a typed
+``memoryview``. ``NpyAppender`` streams rows to disk and patches the shape into the
+header on close, so writers never hold a whole column in memory.
+"""
+import ast
+import mmap
+import os
+import struct
+from array import array
+from typing import Any, Iterable, Sequence
+
+try:  # optional
+    import numpy as np
+except ImportError:
+    np = None
+
+_MAGIC = b"\x93NUMPY\x01\x00"
+_HEADER_LEN = 128  # fixed, so the final shape can be written in place
+_TYPECODES = {"<f8": "d", "<f4": "f", "<i8": "q", "<u1": "B"}
+
+
+def _header(dtype: str, shape: Sequence[int]) -> bytes:
+    shape_repr = f"({shape[0]},)" if len(shape) == 1 else "(" + ", ".join(str(n) for n in shape) + ")"
+    text = "{'descr': '%s', 'fortran_order': False, 'shape': %s, }" % (dtype, shape_repr)
+    pad = _HEADER_LEN - len(_MAGIC) - 2 - len(text) - 1
+    if pad < 0:
+        raise ValueError("npy header too long")
+    return _MAGIC + struct.pack("<H", _HEADER_LEN - len(_MAGIC) - 2) + text.encode("latin1") + b" " * pad + b"\n"
+
+
+class NpyAppender:
+    """Append-only writer for a 1-D (or fixed-width 2-D) .npy array."""
+
+    def __init__(self, path: str, dtype: str = "<f8", width: int | None = None, flush_every: int = 8192) -> None:
+        if dtype not in _TYPECODES:
+            raise ValueError(f"unsupported dtype {dtype}")
+        self.path = path
+        self.dtype = dtype
+        self.width = width
+        self.rows = 0
+        self._buf = array(_TYPECODES[dtype])
+        self._flush_items = flush_every * (width or 1)
+        self._f = open(path, "wb")
+        self._f.write(_header(dtype, (0,) if width is None else (0, width)))
+
+    def append(self, value: Any) -> None:
+        if self.width is None:
+            self._buf.append(value)
+        else:
+            if len(value) != self.width:
+                raise ValueError(f"expected {self.width} values, got {len(value)}")
+            self._buf.extend(value)
+        self.rows += 1
+        if len(self._buf) >= self._flush_items:
+            self._flush()
+
+    def extend(self, values: Iterable[Any]) -> None:
+        for v in values:
+            self.append(v)
+
+    def _flush(self) -> None:
+        if self._buf:
+            self._buf.tofile(self._f)
+            del self._buf[:]
+
+    def close(self) -> None:
+        self._flush()
+        self._f.seek(0)
+        self._f.write(_header(self.dtype, (self.rows,) if self.width is None else (self.rows, self.width)))
+        self._f.close()
+
+    def abort(self) -> None:
+        self._f.close()
+        os.remove(self.path)
+
+
+def write_npy(path: str, values: Sequence[Any], dtype: str = "<f8", width: int | None = None) -> None:
+    w = NpyAppender(path, dtype, width)
+    w.extend(values)
+    w.close()
+
+
+def write_npy_bytes(data: bytes, dtype: str, shape: Sequence[int]) -> bytes:
+    """A complete in-memory .npy file around raw little-endian cell data."""
+    return _header(dtype, shape) + data
+
+
+def read_header(f) -> tuple[str, tuple, int]:
+    if f.read(len(_MAGIC) - 2) != _MAGIC[:-2]:
+        raise ValueError("not a .npy file")
+    major = f.read(2)[0]
+    size_fmt = "<H" if major == 1 else "<I"
+    (hlen,) = struct.unpack(size_fmt, f.read(struct.calcsize(size_fmt)))
+    meta = ast.literal_eval(f.read(hlen).decode("latin1"))
+    return meta["descr"], tuple(meta["shape"]), f.tell()
+
+
+def open_npy(path: str) -> Any:
+    """Memory-map a .npy file read-only (ndarray with NumPy, typed memoryview without)."""
+    if np is not None:
+        return np.load(path, mmap_mode="r")
+    with open(path, "rb") as f:
+        dtype, shape, offset = read_header(f)
+        if dtype not in _TYPECODES:
+            raise ValueError(f"unsupported dtype {dtype}")
+        count = 1
+        for n in shape:
+            count *= n
+        if count == 0:
+            return memoryview(array(_TYPECODES[dtype]))
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)[offset:offset + count * array(_TYPECODES[dtype]).itemsize].cast(_TYPECODES[dtype])
+    return view.cast("B").cast(_TYPECODES[dtype], shape) if len(shape) > 1 else view
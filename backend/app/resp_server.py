@@ -0,0 +1,167 @@
+"""Tiny Redis-compatible server for local multi-worker runs and benchmarks.
+
+It implements only what ``shared.RedisBackend`` uses: PING, SELECT, GET, SET (EX/PX/NX),
+DEL, EXPIRE, HSET, HGET, HMGET, HDEL, HGETALL, HLEN, PUBLISH, SUBSCRIBE, UNSUBSCRIBE and FLUSHALL.
+It is single-threaded and keeps everything in memory. Not for production; point
+``REDIS_URL`` at a real Redis there.
+
+Run from backend/:  python -m app.resp_server [--port 6379]
+"""
+import argparse
+import asyncio
+import time
+from typing import Any
+
+
+def _encode(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    raise TypeError(type(value))
+
+
+class RespServer:
+    def __init__(self) -> None:
+        self.strings: dict[bytes, tuple[bytes, float | None]] = {}
+        self.hashes: dict[bytes, dict[bytes, bytes]] = {}
+        self.channels: dict[bytes, set[asyncio.StreamWriter]] = {}
+        self.server: asyncio.AbstractServer | None = None
+
+    def _get(self, key: bytes) -> bytes | None:
+        item = self.strings.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] < time.monotonic():
+            del self.strings[key]
+            return None
+        return item[0]
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> list[bytes] | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # inline command
+        args = []
+        for _ in range(int(line[1:-2])):
+            n = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(n + 2))[:-2])
+        return args
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscribed: set[bytes] = set()
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                cmd = args[0].upper()
+                if cmd in (b"SUBSCRIBE", b"UNSUBSCRIBE"):
+                    for ch in args[1:]:
+                        if cmd == b"SUBSCRIBE":
+                            self.channels.setdefault(ch, set()).add(writer)
+                            subscribed.add(ch)
+                        else:
+                            self.channels.get(ch, set()).discard(writer)
+                            subscribed.discard(ch)
+                        writer.write(_encode([cmd.lower(), ch, len(subscribed)]))
+                else:
+                    try:
+                        writer.write(_encode(self.execute(cmd, args[1:])))
+                    except Exception as exc:
+                        writer.write(b"-ERR %s\r\n" % str(exc).encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for ch in subscribed:
+                self.channels.get(ch, set()).discard(writer)
+            writer.close()
+
+    def execute(self, cmd: bytes, a: list[bytes]) -> Any:
+        if cmd == b"PING":
+            return "PONG"
+        if cmd in (b"SELECT", b"CLIENT"):
+            return "OK"
+        if cmd == b"GET":
+            return self._get(a[0])
+        if cmd == b"SET":
+            opts = [x.upper() for x in a[2:]]
+            ttl = None
+            if b"EX" in opts:
+                ttl = float(a[2 + opts.index(b"EX") + 1])
+            if b"PX" in opts:
+                ttl = float(a[2 + opts.index(b"PX") + 1]) / 1000
+            if b"NX" in opts and self._get(a[0]) is not None:
+                return None
+            self.strings[a[0]] = (a[1], time.monotonic() + ttl if ttl else None)
+            return "OK"
+        if cmd == b"DEL":
+            return sum(1 for k in a if self.strings.pop(k, None) is not None or self.hashes.pop(k, None) is not None)
+        if cmd == b"EXPIRE":
+            value = self._get(a[0])
+            if value is None:
+                return 0
+            self.strings[a[0]] = (value, time.monotonic() + float(a[1]))
+            return 1
+        if cmd == b"HSET":
+            h = self.hashes.setdefault(a[0], {})
+            added = 0
+            for i in range(1, len(a), 2):
+                added += a[i] not in h
+                h[a[i]] = a[i + 1]
+            return added
+        if cmd == b"HGET":
+            return self.hashes.get(a[0], {}).get(a[1])
+        if cmd == b"HMGET":
+            h = self.hashes.get(a[0], {})
+            return [h.get(k) for k in a[1:]]
+        if cmd == b"HDEL":
+            h = self.hashes.get(a[0], {})
+            return sum(1 for k in a[1:] if h.pop(k, None) is not None)
+        if cmd == b"HGETALL":
+            return [x for kv in self.hashes.get(a[0], {}).items() for x in kv]
+        if cmd == b"HLEN":
+            return len(self.hashes.get(a[0], {}))
+        if cmd == b"PUBLISH":
+            message = _encode([b"message", a[0], a[1]])
+            targets = list(self.channels.get(a[0], ()))
+            for w in targets:
+                w.write(message)
+            return len(targets)
+        if cmd == b"FLUSHALL":
+            self.strings.clear()
+            self.hashes.clear()
+            return "OK"
+        raise ValueError(f"unknown command '{cmd.decode()}'")
+
+    async def start(self, host: str = "127.0.0.1", port: int = 6379) -> int:
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 6379) -> None:
+        await self.start(host, port)
+        async with self.server:
+            await self.server.serve_forever()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6379)
+    args = ap.parse_args()
+    print(f"RESP stand-in on {args.host}:{args.port}")
+    asyncio.run(RespServer().serve_forever(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Typed, compact decoding of NextBillion optimization responses.
+
+``decode_response`` turns raw response bytes into ``Response``/``Route``/``Step``
+objects. With msgspec installed these are msgspec Structs decoded straight from
+bytes (no intermediate dicts); otherwise they are ``__slots__`` classes built from
+the stdlib parse. Unknown fields are ignored, missing ones default to None. Numbers
+may be ints or floats and ids strings or ints, so both backends accept the same
+files. Both also support ``obj.get(name)``, so code written against the response
+dicts (e.g. the analytics reducer) reads the typed objects unchanged.
+"""
+from typing import Any, Dict, List, Optional, Union
+
+from . import jsonlib
+
+try:  # optional
+    import msgspec
+except ImportError:
+    msgspec = None
+
+_STEP_FIELDS = ("type", "id", "arrival", "duration", "service", "waiting_time", "location",
+                "location_index", "load", "distance", "description", "depot")
+_ROUTE_FIELDS = ("vehicle", "cost", "distance", "duration", "service", "waiting_time", "setup",
+                 "priority", "delivery", "pickup", "geometry", "description", "profile")
+
+
+Num = Union[int, float]
+Id = Union[str, int]
+
+
+if msgspec is not None:
+    class _Struct(msgspec.Struct, omit_defaults=True):
+        def get(self, name: str, default: Any = None) -> Any:
+            value = getattr(self, name, None)
+            return default if value is None else value
+
+    class Step(_Struct):
+        type: Optional[str] = None
+        id: Optional[Id] = None
+        arrival: Optional[Num] = None
+        duration: Optional[Num] = None
+        service: Optional[Num] = None
+        waiting_time: Optional[Num] = None
+        location: Optional[List[float]] = None
+        location_index: Optional[Num] = None
+        load: Optional[List[Num]] = None
+        distance: Optional[Num] = None
+        description: Optional[str] = None
+        depot: Optional[Id] = None
+
+    class Route(_Struct):
+        vehicle: Optional[Id] = None
+        cost: Optional[Num] = None
+        distance: Optional[Num] = None
+        duration: Optional[Num] = None
+        service: Optional[Num] = None
+        waiting_time: Optional[Num] = None
+        setup: Optional[Num] = None
+        priority: Optional[Num] = None
+        delivery: Optional[List[Num]] = None
+        pickup: Optional[List[Num]] = None
+        geometry: Optional[str] = None
+        description: Optional[str] = None
+        profile: Optional[str] = None
+        steps: List[Step] = []
+
+    class Result(_Struct):
+        code: Optional[Num] = None
+        summary: Optional[Dict[str, Any]] = None
+        routes: List[Route] = []
+        unassigned: Optional[List[Any]] = None
+
+    class Response(_Struct):
+        description: Optional[str] = None
+        result: Result = msgspec.field(default_factory=Result)
+        status: Optional[str] = None
+        message: Optional[str] = None
+
+    _decoder = msgspec.json.Decoder(Response)
+
+    def decode_response(raw: bytes) -> "Response":
+        return _decoder.decode(raw)
+
+else:
+    class _Slotted:
+        __slots__ = ()
+        _fields: tuple = ()
+
+        def __init__(self, **kw: Any) -> None:
+            for name in self.__slots__:
+                setattr(self, name, kw.get(name))
+
+        @classmethod
+        def from_dict(cls, d: Dict[str, Any]):
+            return cls(**{k: d.get(k) for k in cls._fields})
+
+        def get(self, name: str, default: Any = None) -> Any:
+            value = getattr(self, name, None)
+            return default if value is None else value
+
+    class Step(_Slotted):
+        __slots__ = _STEP_FIELDS
+        _fields = _STEP_FIELDS
+
+    class Route(_Slotted):
+        __slots__ = _ROUTE_FIELDS + ("steps",)
+        _fields = _ROUTE_FIELDS
+
+        @classmethod
+        def from_dict(cls, d: Dict[str, Any]) -> "Route":
+            route = super().from_dict(d)
+            route.steps = [Step.from_dict(s) for s in d.get("steps") or []]
+            return route
+
+    class Result(_Slotted):
+        __slots__ = ("code", "summary", "routes", "unassigned")
+        _fields = ("code", "summary", "unassigned")
+
+        @classmethod
+        def from_dict(cls, d: Dict[str, Any]) -> "Result":
+            result = super().from_dict(d)
+            result.routes = [Route.from_dict(r) for r in d.get("routes") or []]
+            return result
+
+    class Response(_Slotted):
+        __slots__ = ("description", "result", "status", "message")
+        _fields = ("description", "status", "message")
+
+        @classmethod
+        def from_dict(cls, d: Dict[str, Any]) -> "Response":
+            resp = super().from_dict(d)
+            resp.result = Result.from_dict(d.get("result") or {})
+            return resp
+
+    def decode_response(raw: bytes) -> "Response":
+        return Response.from_dict(jsonlib.loads(raw))
+
+
+def load_response(path: str) -> "Response":
+    """Typed decode of a NextBillion response file."""
+    with open(path, "rb") as f:
+        return decode_response(f.read())
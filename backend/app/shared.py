@@ -0,0 +1,361 @@
+"""State shared between app workers: device registry, pub/sub and a byte cache.
+
+``LocalBackend`` (the default) keeps everything in this process. That is exact
+for a single worker and lets the rest of the app use the same code path either way.
+``RedisBackend`` speaks RESP to Redis (or anything compatible, such as
+``python -m app.resp_server``) so several uvicorn workers or pods see the same
+registry, can send to each other's sockets and share serialized artifacts.
+
+Select with ``SHARED_BACKEND=local|redis`` and ``REDIS_URL=redis://host:port/db``.
+"""
+import asyncio
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlparse
+
+Handler = Callable[[str, bytes], Awaitable[None]]
+
+
+class SharedBackend:
+    """Interface of the shared-state backends (all keys and channels are plain strings)."""
+
+    #: Whether ``cache_*`` reaches other processes (a per-process cache already exists)
+    shares_cache = False
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    # registry (sync: cheap, called from both the loop and threads)
+    def hset(self, name: str, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def hset_many(self, name: str, mapping: dict[str, str]) -> None:
+        raise NotImplementedError
+
+    def hget(self, name: str, key: str) -> str | None:
+        raise NotImplementedError
+
+    def hmget(self, name: str, keys: list[str]) -> list[str | None]:
+        raise NotImplementedError
+
+    def hdel(self, name: str, *keys: str) -> None:
+        raise NotImplementedError
+
+    def hgetall(self, name: str) -> dict[str, str]:
+        raise NotImplementedError
+
+    def hlen(self, name: str) -> int:
+        raise NotImplementedError
+
+    # pub/sub
+    async def publish(self, channel: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        raise NotImplementedError
+
+    # byte cache
+    def cache_get(self, key: str) -> bytes | None:
+        return None
+
+    def cache_set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        pass
+
+    def cache_lock(self, key: str, ttl: float) -> bool:
+        """Try to take a short-lived lock (True if acquired)."""
+        return True
+
+    def cache_unlock(self, key: str) -> None:
+        pass
+
+    def shared_build(self, key: str, build: Callable[[], bytes], ttl: float | None = None, wait: float = 30.0) -> bytes:
+        """Cached bytes for key, built by exactly one process at a time across workers."""
+        value = self.cache_get(key)
+        if value is not None:
+            return value
+        deadline = time.monotonic() + wait
+        while not self.cache_lock(key, wait):
+            time.sleep(0.02)
+            value = self.cache_get(key)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                break  # the builder died; build it ourselves
+        try:
+            value = build()
+            self.cache_set(key, value, ttl)
+            return value
+        finally:
+            self.cache_unlock(key)
+
+
+class LocalBackend(SharedBackend):
+    """Single-process backend: dicts and in-loop callbacks."""
+
+    def __init__(self) -> None:
+        self._hashes: dict[str, dict[str, str]] = {}
+        self._subs: dict[str, list[Handler]] = {}
+        self._lock = threading.Lock()
+
+    def hset(self, name, key, value):
+        with self._lock:
+            self._hashes.setdefault(name, {})[key] = value
+
+    def hset_many(self, name, mapping):
+        with self._lock:
+            self._hashes.setdefault(name, {}).update(mapping)
+
+    def hget(self, name, key):
+        return self._hashes.get(name, {}).get(key)
+
+    def hmget(self, name, keys):
+        h = self._hashes.get(name, {})
+        return [h.get(k) for k in keys]
+
+    def hdel(self, name, *keys):
+        with self._lock:
+            h = self._hashes.get(name, {})
+            for k in keys:
+                h.pop(k, None)
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def hlen(self, name):
+        return len(self._hashes.get(name, {}))
+
+    async def publish(self, channel, data):
+        for handler in list(self._subs.get(channel, ())):
+            await handler(channel, data)
+
+    async def subscribe(self, channel, handler):
+        self._subs.setdefault(channel, []).append(handler)
+
+
+# ---- RESP ------------------------------------------------------------------
+
+
+class RespError(Exception):
+    pass
+
+
+def encode_command(*args: Any) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for a in args:
+        b = a if isinstance(a, bytes) else str(a).encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+    return b"".join(out)
+
+
+def read_reply(readline: Callable[[], bytes], read: Callable[[int], bytes]) -> Any:
+    """Parse one RESP2 reply using blocking readline/read callables."""
+    line = readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RespError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        n = int(rest)
+        return None if n < 0 else read(n + 2)[:-2]
+    if kind == b"*":
+        n = int(rest)
+        return None if n < 0 else [read_reply(readline, read) for _ in range(n)]
+    raise RespError(f"bad reply: {line!r}")
+
+
+async def read_reply_async(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RespError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        n = int(rest)
+        return None if n < 0 else (await reader.readexactly(n + 2))[:-2]
+    if kind == b"*":
+        n = int(rest)
+        return None if n < 0 else [await read_reply_async(reader) for _ in range(n)]
+    raise RespError(f"bad reply: {line!r}")
+
+
+class _RespConnection:
+    def __init__(self, host: str, port: int, db: int, timeout: float) -> None:
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rb")
+        if db:
+            self.command("SELECT", db)
+
+    def command(self, *args: Any) -> Any:
+        self.sock.sendall(encode_command(*args))
+        return read_reply(self.file.readline, self.file.read)
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+
+class RedisBackend(SharedBackend):
+    """RESP client: pooled blocking connections for commands, one asyncio connection for SUBSCRIBE."""
+
+    shares_cache = True
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", prefix: str = "fleet:", timeout: float = 5.0) -> None:
+        u = urlparse(url)
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or 6379
+        self.db = int((u.path or "/0").lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._pool: queue.LifoQueue[_RespConnection] = queue.LifoQueue()
+        self._handlers: dict[str, list[Handler]] = {}
+        self._sub_writer: asyncio.StreamWriter | None = None
+        self._sub_task: asyncio.Task | None = None
+        self._subscribed = asyncio.Event()
+
+    def command(self, *args: Any) -> Any:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = _RespConnection(self.host, self.port, self.db, self.timeout)
+        try:
+            reply = conn.command(*args)
+        except RespError:
+            self._pool.put(conn)
+            raise
+        except Exception:
+            conn.close()
+            raise
+        self._pool.put(conn)
+        return reply
+
+    def _k(self, key: str) -> str:
+        return self.prefix + key
+
+    # registry
+    def hset(self, name, key, value):
+        self.command("HSET", self._k(name), key, value)
+
+    def hset_many(self, name, mapping):
+        if mapping:
+            self.command("HSET", self._k(name), *(x for kv in mapping.items() for x in kv))
+
+    def hget(self, name, key):
+        v = self.command("HGET", self._k(name), key)
+        return v.decode() if v is not None else None
+
+    def hmget(self, name, keys):
+        if not keys:
+            return []
+        return [v.decode() if v is not None else None for v in self.command("HMGET", self._k(name), *keys)]
+
+    def hdel(self, name, *keys):
+        if keys:
+            self.command("HDEL", self._k(name), *keys)
+
+    def hgetall(self, name):
+        flat = self.command("HGETALL", self._k(name)) or []
+        return {flat[i].decode(): flat[i + 1].decode() for i in range(0, len(flat), 2)}
+
+    def hlen(self, name):
+        return self.command("HLEN", self._k(name))
+
+    # cache
+    def cache_get(self, key):
+        return self.command("GET", self._k("cache:" + key))
+
+    def cache_set(self, key, value, ttl=None):
+        if ttl:
+            self.command("SET", self._k("cache:" + key), value, "PX", int(ttl * 1000))
+        else:
+            self.command("SET", self._k("cache:" + key), value)
+
+    def cache_lock(self, key, ttl):
+        return self.command("SET", self._k("lock:" + key), "1", "NX", "PX", int(ttl * 1000)) is not None
+
+    def cache_unlock(self, key):
+        self.command("DEL", self._k("lock:" + key))
+
+    # pub/sub
+    async def publish(self, channel, data):
+        await asyncio.to_thread(self.command, "PUBLISH", self._k(channel), data)
+
+    async def subscribe(self, channel, handler):
+        first = channel not in self._handlers
+        self._handlers.setdefault(channel, []).append(handler)
+        if first and self._sub_writer is not None:
+            self._sub_writer.write(encode_command("SUBSCRIBE", self._k(channel)))
+            await self._sub_writer.drain()
+
+    async def start(self) -> None:
+        self._sub_task = asyncio.create_task(self._listen())
+        await asyncio.wait_for(self._subscribed.wait(), self.timeout)
+
+    async def stop(self) -> None:
+        if self._sub_task is not None:
+            self._sub_task.cancel()
+            await asyncio.gather(self._sub_task, return_exceptions=True)
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    async def _listen(self) -> None:
+        backoff = 0.1
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                self._sub_writer = writer
+                if self.db:
+                    writer.write(encode_command("SELECT", self.db))
+                    await read_reply_async(reader)
+                # Always hold one subscription so the connection is in subscribe mode
+                channels = [self._k(c) for c in self._handlers] or [self._k("_")]
+                writer.write(encode_command("SUBSCRIBE", *channels))
+                await writer.drain()
+                self._subscribed.set()
+                backoff = 0.1
+                while True:
+                    msg = await read_reply_async(reader)
+                    if isinstance(msg, list) and msg and msg[0] == b"message":
+                        channel = msg[1].decode()[len(self.prefix):]
+                        for handler in list(self._handlers.get(channel, ())):
+                            try:
+                                await handler(channel, msg[2])
+                            except Exception:
+                                logging.exception("Shared pub/sub handler failed on %s", channel)
+            except asyncio.CancelledError:
+                if self._sub_writer is not None:
+                    self._sub_writer.close()
+                raise
+            except (OSError, ConnectionError, RespError, asyncio.IncompleteReadError) as exc:
+                self._sub_writer = None
+                logging.warning("Shared backend subscriber disconnected (%s); retrying in %.1fs", exc, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(5.0, backoff * 2)
+
+
+def backend_from_env() -> SharedBackend:
+    kind = os.getenv("SHARED_BACKEND", "local")
+    if kind == "local":
+        return LocalBackend()
+    if kind == "redis":
+        return RedisBackend(os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0"), prefix=os.getenv("SHARED_PREFIX", "fleet:"))
+    raise ValueError(f"Unknown SHARED_BACKEND: {kind}")
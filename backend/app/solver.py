@@ -0,0 +1,681 @@
+"""Local VRP solver that turns a NextBillion-style request into a NextBillion-shaped response.
+
+The built-in ``local`` solver:
+  - construction: jobs go to the nearest vehicle start, are swept by polar angle around
+    it and placed by cheapest feasible insertion (capacity vectors, ``max_tasks``, job and
+    shift time windows checked in O(1) per position with forward/backward slack arrays);
+    jobs left over are retried in the nearest other routes, highest priority first
+  - improvement: intra-route 2-opt and or-opt (segments of 1-3 jobs)
+  - multi-start: each start rotates the sweep angle; starts run in a process pool and
+    the best plan (fewest unassigned jobs, then fewest vehicles if asked, then cost) wins
+Travel costs come from ``distance_matrix``/``duration_matrix`` in the request when given,
+otherwise from haversine distance x ``detour`` at ``speed_mps``. Jobs with several time
+windows are scheduled in their first one.
+
+Other backends plug in through ``register_solver``; ``solve`` picks one by name
+(``SOLVER`` env var, default ``local``).
+
+CLI (from backend/):  python -m app.solver data/4/Next_Billion_request_4.json [-o out.json]
+"""
+import argparse
+import csv
+import heapq
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable
+
+from .spatial import EARTH_RADIUS_M
+from .utils import encode_polyline
+
+SOLVERS: dict[str, Callable[..., dict]] = {}
+
+_INF = float("inf")
+_EPS = 1e-6
+
+
+def register_solver(name: str) -> Callable:
+    def decorate(fn: Callable[..., dict]) -> Callable[..., dict]:
+        SOLVERS[name] = fn
+        return fn
+    return decorate
+
+
+def solve(request: dict, solver: str | None = None, **options: Any) -> dict:
+    """Solve request with the named backend and return a NextBillion-shaped response."""
+    name = solver or os.getenv("SOLVER", "local")
+    if name not in SOLVERS:
+        raise ValueError(f"Unknown solver: {name}")
+    return SOLVERS[name](request, **options)
+
+
+# ---- problem ---------------------------------------------------------------
+
+
+def parse_locations(raw: Any) -> list[tuple[float, float]]:
+    """(lat, lon) pairs from a request's ``locations`` ("lat,lon" strings, "|"-joined, or pairs)."""
+    items = raw.get("location", []) if isinstance(raw, dict) else raw
+    if isinstance(items, str):
+        items = items.split("|")
+    out = []
+    for item in items:
+        if isinstance(item, str):
+            lat, lon = item.split(",")
+        else:
+            lat, lon = item[0], item[1]
+        out.append((float(lat), float(lon)))
+    return out
+
+
+class _Vehicle:
+    __slots__ = ("id", "description", "start", "end", "start_depot", "end_depot", "capacity",
+                 "tw_start", "tw_end", "start_service", "max_tasks")
+
+
+class Problem:
+    """A request flattened into index-addressed lists (cheap to pickle to worker processes)."""
+
+    def __init__(self, request: dict, speed_mps: float = 15.0, detour: float = 1.3) -> None:
+        coords = parse_locations(request.get("locations", {}))
+        self.lat = [c[0] for c in coords]
+        self.lon = [c[1] for c in coords]
+        # Precomputed terms so each haversine leg costs two sines and one asin
+        self._rlat = [math.radians(x) for x in self.lat]
+        self._rlon = [math.radians(x) for x in self.lon]
+        self._coslat = [math.cos(x) for x in self._rlat]
+        self.dm = request.get("distance_matrix")
+        self.tm = request.get("duration_matrix")
+        self.speed = speed_mps
+        self.detour = detour
+        objective = (request.get("options") or {}).get("objective") or {}
+        self.cost_by = "duration" if objective.get("travel_cost") == "duration" else "distance"
+        custom = objective.get("custom") or {}
+        self.min_vehicles = custom.get("value") == "vehicles"
+
+        depots = {d["id"]: d for d in request.get("depots", [])}
+        self.depots = depots
+        self.vehicles: list[_Vehicle] = []
+        for raw in request.get("vehicles", []):
+            v = _Vehicle()
+            v.id = raw.get("id")
+            v.description = raw.get("description")
+            v.start_depot = (raw.get("start_depot_ids") or [None])[0]
+            v.end_depot = (raw.get("end_depot_ids") or [None])[0]
+            v.start = depots[v.start_depot]["location_index"] if v.start_depot in depots else raw.get("start_index")
+            v.end = depots[v.end_depot]["location_index"] if v.end_depot in depots else raw.get("end_index")
+            v.capacity = tuple(raw.get("capacity") or ())
+            tw = raw.get("time_window") or [0, _INF]
+            v.tw_start, v.tw_end = tw[0], tw[1]
+            v.start_service = depots[v.start_depot].get("service", 0) if v.start_depot in depots else 0
+            v.max_tasks = raw.get("max_tasks") or _INF
+            self.vehicles.append(v)
+
+        dims = max((len(v.capacity) for v in self.vehicles), default=0)
+        self.dims = dims
+        jobs = request.get("jobs", [])
+        self.job_ids = [j.get("id") for j in jobs]
+        self.job_desc = [j.get("description") for j in jobs]
+        self.job_loc = [j["location_index"] for j in jobs]
+        self.job_delivery = [self._amount(j.get("delivery")) for j in jobs]
+        self.job_pickup = [self._amount(j.get("pickup")) for j in jobs]
+        self.job_service = [j.get("service", 0) for j in jobs]
+        windows = [(j.get("time_windows") or [[-_INF, _INF]])[0] for j in jobs]
+        self.job_open = [w[0] for w in windows]
+        self.job_close = [w[1] for w in windows]
+        self.job_priority = [j.get("priority", 0) for j in jobs]
+        # Vehicles with fewer capacity dimensions are unconstrained in the missing ones
+        for v in self.vehicles:
+            v.capacity = tuple(v.capacity) + (_INF,) * (dims - len(v.capacity))
+
+    def _amount(self, raw: list | None) -> tuple:
+        vals = tuple(raw or ())
+        return vals + (0,) * (self.dims - len(vals))
+
+    def leg(self, a: int | None, b: int | None) -> tuple[float, float]:
+        """(distance m, duration s) from location a to b; None (open route end) costs nothing."""
+        if a is None or b is None or a == b:
+            return 0.0, 0.0
+        if self.dm is not None:
+            d = self.dm[a][b]
+        else:
+            h = (math.sin((self._rlat[b] - self._rlat[a]) / 2) ** 2
+                 + self._coslat[a] * self._coslat[b] * math.sin((self._rlon[b] - self._rlon[a]) / 2) ** 2)
+            d = 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1.0, h))) * self.detour
+        t = self.tm[a][b] if self.tm is not None else d / self.speed
+        return d, t
+
+    def cost(self, a: int | None, b: int | None) -> float:
+        d, t = self.leg(a, b)
+        return t if self.cost_by == "duration" else d
+
+
+# ---- routes ----------------------------------------------------------------
+
+
+class _Route:
+    """One vehicle's job sequence plus the arrays that make insertion checks O(1)."""
+    __slots__ = ("p", "v", "seq", "locs", "dep", "latest", "pre_max", "suf_max", "total")
+
+    def __init__(self, p: Problem, v: _Vehicle, seq: list[int] | None = None) -> None:
+        self.p = p
+        self.v = v
+        self.seq = list(seq or [])
+        self.refresh()
+
+    def _window(self, pos: int) -> tuple[float, float, float]:
+        """(open, close, service) of position pos (0 = start, len(seq)+1 = end)."""
+        if pos == 0:
+            return self.v.tw_start, self.v.tw_start, self.v.start_service
+        if pos == len(self.seq) + 1:
+            return -_INF, self.v.tw_end, 0
+        j = self.seq[pos - 1]
+        return self.p.job_open[j], self.p.job_close[j], self.p.job_service[j]
+
+    def refresh(self) -> None:
+        p, v, seq = self.p, self.v, self.seq
+        self.locs = [v.start] + [p.job_loc[j] for j in seq] + [v.end]
+        n = len(self.locs)
+        dep = [0.0] * n
+        dep[0] = v.tw_start + v.start_service
+        durs = [p.leg(self.locs[i], self.locs[i + 1])[1] for i in range(n - 1)]
+        for i in range(1, n):
+            opening, _, service = self._window(i)
+            dep[i] = max(dep[i - 1] + durs[i - 1], opening) + service
+        latest = [0.0] * n
+        latest[-1] = v.tw_end
+        for i in range(n - 2, 0, -1):
+            _, closing, service = self._window(i)
+            latest[i] = min(closing, latest[i + 1] - durs[i] - service)
+        latest[0] = latest[1] - durs[0] if n > 1 else v.tw_end
+        self.dep = dep
+        self.latest = latest
+        # Load after each position: everything to deliver is on board at the start
+        dims = p.dims
+        load = [sum(p.job_delivery[j][d] for j in seq) for d in range(dims)]
+        self.total = tuple(load)
+        loads = [tuple(load)]
+        for j in seq:
+            load = [load[d] - p.job_delivery[j][d] + p.job_pickup[j][d] for d in range(dims)]
+            loads.append(tuple(load))
+        self.pre_max = list(loads)
+        for i in range(1, len(loads)):
+            self.pre_max[i] = tuple(max(a, b) for a, b in zip(self.pre_max[i - 1], loads[i]))
+        self.suf_max = list(loads)
+        for i in range(len(loads) - 2, -1, -1):
+            self.suf_max[i] = tuple(max(a, b) for a, b in zip(self.suf_max[i + 1], loads[i]))
+
+    def best_insertion(self, j: int) -> tuple[float, int] | None:
+        """(cost delta, position) of the cheapest feasible insertion of job j, or None."""
+        p, v = self.p, self.v
+        if len(self.seq) >= v.max_tasks:
+            return None
+        cap = v.capacity
+        deliver, pick = p.job_delivery[j], p.job_pickup[j]
+        if any(t + d > c for t, d, c in zip(self.total, deliver, cap)):
+            return None
+        loc = p.job_loc[j]
+        opening, closing, service = p.job_open[j], p.job_close[j], p.job_service[j]
+        best = None
+        for i in range(len(self.seq) + 1):
+            if any(m + d > c for m, d, c in zip(self.pre_max[i], deliver, cap)):
+                continue
+            if any(m + k > c for m, k, c in zip(self.suf_max[i], pick, cap)):
+                continue
+            a, b = self.locs[i], self.locs[i + 1]
+            d_aj, t_aj = p.leg(a, loc)
+            begin = max(self.dep[i] + t_aj, opening)
+            if begin > closing:
+                continue
+            d_jb, t_jb = p.leg(loc, b)
+            next_open = self._window(i + 1)[0]
+            if max(begin + service + t_jb, next_open) > self.latest[i + 1]:
+                continue
+            d_ab, t_ab = p.leg(a, b)
+            if p.cost_by == "duration":
+                delta = t_aj + t_jb - t_ab
+            else:
+                delta = d_aj + d_jb - d_ab
+            if best is None or delta < best[0]:
+                best = (delta, i)
+        return best
+
+    def insert(self, j: int, pos: int) -> None:
+        self.seq.insert(pos, j)
+        self.refresh()
+
+    def full(self, min_demand: tuple) -> bool:
+        if len(self.seq) >= self.v.max_tasks:
+            return True
+        return any(t + d > c for t, d, c in zip(self.total, min_demand, self.v.capacity))
+
+
+def _evaluate(p: Problem, v: _Vehicle, seq: list[int]) -> float | None:
+    """Travel cost of seq for v, or None if it breaks a time window (loads don't change order-free checks)."""
+    t = v.tw_start + v.start_service
+    cost = 0.0
+    prev = v.start
+    for j in seq:
+        loc = p.job_loc[j]
+        d, dt = p.leg(prev, loc)
+        cost += dt if p.cost_by == "duration" else d
+        t = max(t + dt, p.job_open[j])
+        if t > p.job_close[j]:
+            return None
+        t += p.job_service[j]
+        prev = loc
+    d, dt = p.leg(prev, v.end)
+    if t + dt > v.tw_end:
+        return None
+    return cost + (dt if p.cost_by == "duration" else d)
+
+
+def _loads_ok(p: Problem, v: _Vehicle, seq: list[int]) -> bool:
+    load = [sum(p.job_delivery[j][d] for j in seq) for d in range(p.dims)]
+    for j in seq:
+        load = [load[d] - p.job_delivery[j][d] + p.job_pickup[j][d] for d in range(p.dims)]
+        if any(x > c for x, c in zip(load, v.capacity)):
+            return False
+    return True
+
+
+def _improve(p: Problem, v: _Vehicle, seq: list[int], max_rounds: int = 50) -> list[int]:
+    """Intra-route 2-opt and or-opt, first improvement, until no move helps.
+
+    Works on route-local node ids (0 = start, 1..m = seq, m+1 = end) with the cost and
+    duration matrices of just those nodes, so every move is evaluated without new legs.
+    """
+    m = len(seq)
+    if m < 3:
+        return seq
+    locs = [v.start] + [p.job_loc[j] for j in seq] + [v.end]
+    end = m + 1
+    legs = [[p.leg(a, b) for b in locs] for a in locs]
+    by_duration = p.cost_by == "duration"
+    cm = [[t if by_duration else d for d, t in row] for row in legs]
+    tm = [[t for _, t in row] for row in legs]
+    opening = [v.tw_start] + [p.job_open[j] for j in seq] + [-_INF]
+    closing = [v.tw_start] + [p.job_close[j] for j in seq] + [v.tw_end]
+    service = [v.start_service] + [p.job_service[j] for j in seq] + [0]
+    has_pickups = any(any(p.job_pickup[j]) for j in seq)
+
+    def evaluate(tour: list[int]) -> float | None:
+        t = v.tw_start + v.start_service
+        cost = 0.0
+        prev = 0
+        for n in tour:
+            cost += cm[prev][n]
+            t = max(t + tm[prev][n], opening[n])
+            if t > closing[n]:
+                return None
+            t += service[n]
+            prev = n
+        if t + tm[prev][end] > v.tw_end:
+            return None
+        return cost + cm[prev][end]
+
+    tour = list(range(1, m + 1))
+    current = evaluate(tour)
+    if current is None:
+        return seq
+
+    def accept(candidate: list[int]) -> bool:
+        nonlocal tour, current
+        if has_pickups and not _loads_ok(p, v, [seq[n - 1] for n in candidate]):
+            return False
+        c = evaluate(candidate)
+        if c is not None and c < current - _EPS:
+            tour, current = candidate, c
+            return True
+        return False
+
+    for _ in range(max_rounds):
+        improved = False
+        # 2-opt: reverse tour[i..k]
+        for i in range(m - 1):
+            ext = [0] + tour + [end]
+            a, b = ext[i], ext[i + 1]
+            row_a, row_b = cm[a], cm[b]
+            base = row_a[b]
+            for k in range(i + 1, m):
+                c, d = ext[k + 1], ext[k + 2]
+                if row_a[c] + row_b[d] - base - cm[c][d] < -_EPS:
+                    if accept(tour[:i] + tour[i:k + 1][::-1] + tour[k + 1:]):
+                        improved = True
+                        break
+        # or-opt: move a segment of 1-3 jobs elsewhere in the route
+        for length in (1, 2, 3):
+            i = 0
+            while i + length <= m:
+                seg = tour[i:i + length]
+                rest = tour[:i] + tour[i + length:]
+                ext_rest = [0] + rest + [end]
+                a, f, l, b = ([0] + tour)[i], seg[0], seg[-1], (tour + [end])[i + length]
+                removed = cm[a][f] + cm[l][b] - cm[a][b]
+                moved = False
+                for q in range(len(rest) + 1):
+                    if q == i:
+                        continue
+                    x, y = ext_rest[q], ext_rest[q + 1]
+                    if cm[x][f] + cm[l][y] - cm[x][y] - removed < -_EPS:
+                        if accept(rest[:q] + seg + rest[q:]):
+                            moved = improved = True
+                            break
+                if not moved:
+                    i += 1
+        if not improved:
+            break
+    return [seq[n - 1] for n in tour]
+
+
+# ---- search ----------------------------------------------------------------
+
+
+def _construct(p: Problem, angle_offset: float) -> tuple[list[_Route], list[int]]:
+    homes = {}
+    for vi, v in enumerate(p.vehicles):
+        anchor = v.start if v.start is not None else v.end
+        homes.setdefault(anchor, []).append(vi)
+    anchors = list(homes)
+    groups: dict[Any, list[int]] = {a: [] for a in anchors}
+    for j, loc in enumerate(p.job_loc):
+        if None in groups and len(anchors) == 1:
+            groups[None].append(j)
+            continue
+        best = min((a for a in anchors if a is not None), key=lambda a: p.leg(a, loc)[0], default=None)
+        groups[best].append(j)
+
+    min_demand = tuple(min((p.job_delivery[j][d] for j in range(len(p.job_loc)) if p.job_delivery[j][d] > 0), default=0)
+                       for d in range(p.dims))
+    routes: list[_Route] = []
+    unassigned: list[int] = []
+    for anchor, jobs in groups.items():
+        if anchor is not None:
+            lat0, lon0 = p.lat[anchor], p.lon[anchor]
+        else:
+            lat0 = sum(p.lat[p.job_loc[j]] for j in jobs) / max(1, len(jobs))
+            lon0 = sum(p.lon[p.job_loc[j]] for j in jobs) / max(1, len(jobs))
+        scale = math.cos(math.radians(lat0))
+
+        def angle(j: int) -> float:
+            loc = p.job_loc[j]
+            return (math.atan2(p.lat[loc] - lat0, (p.lon[loc] - lon0) * scale) - angle_offset) % (2 * math.pi)
+
+        pending = sorted(jobs, key=angle)
+        for vi in homes[anchor]:
+            if not pending:
+                break
+            route = _Route(p, p.vehicles[vi])
+            leftovers = []
+            misses = 0
+            for k, j in enumerate(pending):
+                if route.full(min_demand) or misses > 200:
+                    leftovers.extend(pending[k:])
+                    break
+                best = route.best_insertion(j)
+                if best is None:
+                    leftovers.append(j)
+                    misses += 1
+                else:
+                    route.insert(j, best[1])
+                    misses = 0
+            pending = leftovers
+            if route.seq:
+                routes.append(route)
+        unassigned.extend(pending)
+
+    # Second chance for leftovers: nearest other routes, important jobs first
+    used = {id(r.v) for r in routes}
+    spare = [_Route(p, v) for v in p.vehicles if id(v) not in used]
+    still = []
+    for j in sorted(unassigned, key=lambda j: -p.job_priority[j]):
+        loc = p.job_loc[j]
+        candidates = heapq.nsmallest(8, routes, key=lambda r: p.leg(r.locs[len(r.locs) // 2], loc)[0]) + spare
+        options = [(b, r) for r in candidates if (b := r.best_insertion(j)) is not None]
+        if not options:
+            still.append(j)
+            continue
+        (delta, pos), route = min(options, key=lambda o: o[0][0] + (1e9 if not o[1].seq else 0))
+        route.insert(j, pos)
+        if route in spare:
+            spare.remove(route)
+            routes.append(route)
+    return routes, still
+
+
+def _run_start(p: Problem, seed: int) -> tuple[tuple, list[tuple[int, list[int]]], list[int]]:
+    rng = random.Random(seed)
+    offset = 0.0 if seed == 0 else rng.uniform(0, 2 * math.pi)
+    routes, unassigned = _construct(p, offset)
+    vehicle_index = {id(v): i for i, v in enumerate(p.vehicles)}
+    plan = []
+    cost = 0.0
+    for r in routes:
+        seq = _improve(p, r.v, r.seq)
+        cost += _evaluate(p, r.v, seq) or 0.0
+        plan.append((vehicle_index[id(r.v)], seq))
+    key = (len(unassigned), len(plan) if p.min_vehicles else 0, cost)
+    return key, plan, unassigned
+
+
+_WORKER_PROBLEM: Problem | None = None
+
+
+def _init_worker(p: Problem) -> None:
+    global _WORKER_PROBLEM
+    _WORKER_PROBLEM = p
+
+
+def _run_start_in_worker(seed: int):
+    return _run_start(_WORKER_PROBLEM, seed)
+
+
+# ---- output ----------------------------------------------------------------
+
+
+def _route_json(p: Problem, v: _Vehicle, seq: list[int]) -> dict:
+    locs = [v.start] + [p.job_loc[j] for j in seq] + ([v.end] if v.end is not None else [])
+    # Leave the depot as late as possible without waiting at the first job
+    t = v.tw_start
+    if seq:
+        first = p.job_loc[seq[0]]
+        arrive = v.tw_start + v.start_service + p.leg(v.start, first)[1]
+        t += max(0.0, p.job_open[seq[0]] - arrive)
+    load = [sum(p.job_delivery[j][d] for j in seq) for d in range(p.dims)]
+    steps = []
+    dist = dur = wait = service = 0.0
+    if v.start is not None:
+        steps.append({"type": "start", "arrival": int(t), "duration": 0, "service": v.start_service, "waiting_time": 0,
+                      "location": [p.lat[v.start], p.lon[v.start]], "location_index": v.start, "load": list(load),
+                      "distance": 0, **({"depot": v.start_depot} if v.start_depot else {})})
+        t += v.start_service
+        service += v.start_service
+    prev = v.start
+    for j in seq:
+        loc = p.job_loc[j]
+        d, dt = p.leg(prev, loc)
+        dist += d
+        dur += dt
+        t += dt
+        w = max(0.0, p.job_open[j] - t)
+        arrival = t + w
+        wait += w
+        load = [load[k] - p.job_delivery[j][k] + p.job_pickup[j][k] for k in range(p.dims)]
+        step = {"type": "job", "arrival": int(arrival), "duration": int(dur), "service": p.job_service[j],
+                "waiting_time": int(w), "location": [p.lat[loc], p.lon[loc]], "location_index": loc, "id": p.job_ids[j],
+                "load": list(load), "distance": int(dist)}
+        if p.job_desc[j]:
+            step["description"] = p.job_desc[j]
+        steps.append(step)
+        t = arrival + p.job_service[j]
+        service += p.job_service[j]
+        prev = loc
+    if v.end is not None:
+        d, dt = p.leg(prev, v.end)
+        dist += d
+        dur += dt
+        t += dt
+        steps.append({"type": "end", "arrival": int(t), "duration": int(dur), "service": 0, "waiting_time": 0,
+                      "location": [p.lat[v.end], p.lon[v.end]], "location_index": v.end, "load": list(load),
+                      "distance": int(dist), **({"depot": v.end_depot} if v.end_depot else {})})
+    route = {
+        "vehicle": v.id,
+        "cost": int(dur if p.cost_by == "duration" else dist),
+        "steps": steps,
+        "service": int(service),
+        "duration": int(dur),
+        "waiting_time": int(wait),
+        "priority": sum(p.job_priority[j] for j in seq),
+        "delivery": [sum(p.job_delivery[j][k] for j in seq) for k in range(p.dims)],
+        "pickup": [sum(p.job_pickup[j][k] for j in seq) for k in range(p.dims)],
+        "distance": int(dist),
+        "geometry": encode_polyline([[p.lon[i], p.lat[i]] for i in locs if i is not None], 5),
+        "profile": "default",
+        "adopted_capacity": [c for c in v.capacity if c != _INF],
+    }
+    if v.description:
+        route["description"] = v.description
+    return route
+
+
+def _response(p: Problem, request: dict, plan: list[tuple[int, list[int]]], unassigned: list[int], elapsed: float) -> dict:
+    routes = [_route_json(p, p.vehicles[vi], seq) for vi, seq in plan]
+    summary = {
+        "cost": sum(r["cost"] for r in routes),
+        "routes": len(routes),
+        "unassigned": len(unassigned),
+        "setup": 0,
+        "service": sum(r["service"] for r in routes),
+        "duration": sum(r["duration"] for r in routes),
+        "waiting_time": sum(r["waiting_time"] for r in routes),
+        "priority": sum(r["priority"] for r in routes),
+        "delivery": [sum(r["delivery"][k] for r in routes) for k in range(p.dims)],
+        "pickup": [sum(r["pickup"][k] for r in routes) for k in range(p.dims)],
+        "distance": sum(r["distance"] for r in routes),
+        "computing_time": round(elapsed, 3),
+    }
+    result: dict[str, Any] = {"code": 0, "summary": summary, "routes": routes, "routing_profiles": {"default": {}}}
+    if unassigned:
+        result["unassigned"] = [{"id": p.job_ids[j], "type": "job", "location": [p.lat[p.job_loc[j]], p.lon[p.job_loc[j]]]}
+                                for j in unassigned]
+    return {"description": request.get("description", ""), "result": result, "status": "Ok", "message": ""}
+
+
+@register_solver("local")
+def solve_local(request: dict, starts: int | None = None, workers: int | None = None,
+                speed_mps: float = 15.0, detour: float = 1.3,
+                progress: Callable[[float, str], None] | None = None) -> dict:
+    """Multi-start sweep/insertion + 2-opt/or-opt; starts run on ``workers`` processes.
+
+    ``progress(fraction, message)`` is called as starts finish; an exception raised by
+    it aborts the search.
+    """
+    t0 = time.perf_counter()
+    p = Problem(request, speed_mps=speed_mps, detour=detour)
+    workers = workers or int(os.getenv("SOLVER_WORKERS", "0")) or os.cpu_count() or 1
+    starts = starts or max(4, workers)
+    results = []
+
+    def done(result) -> None:
+        results.append(result)
+        if progress is not None:
+            progress(len(results) / starts, f"start {len(results)}/{starts}")
+
+    if workers > 1 and starts > 1:
+        # spawn, not fork: the server process runs watcher/executor threads
+        ctx = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(max_workers=min(workers, starts), mp_context=ctx, initializer=_init_worker, initargs=(p,))
+        try:
+            for future in as_completed([pool.submit(_run_start_in_worker, seed) for seed in range(starts)]):
+                done(future.result())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    else:
+        for seed in range(starts):
+            done(_run_start(p, seed))
+    _, plan, unassigned = min(results, key=lambda r: r[0])
+    plan.sort(key=lambda r: r[0])
+    return _response(p, request, plan, unassigned, time.perf_counter() - t0)
+
+
+# ---- CSV input -------------------------------------------------------------
+
+
+def _read_csv(path: str) -> list[dict[str, str]]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return [{(k or "").strip().lower(): (v or "").strip() for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+def _num(value: str, cast: Callable = float) -> Any:
+    return cast(float(value)) if value not in ("", None) else None
+
+
+def request_from_csv(jobs_path: str, vehicles_path: str, description: str = "") -> dict:
+    """Build a NextBillion-style request from uploaded jobs/vehicles CSVs."""
+    locations: list[str] = []
+    index: dict[str, int] = {}
+
+    def loc(lat: float, lon: float) -> int:
+        key = f"{lat},{lon}"
+        if key not in index:
+            index[key] = len(locations)
+            locations.append(key)
+        return index[key]
+
+    vehicles = []
+    dims = 1
+    for row in _read_csv(vehicles_path):
+        capacity = [_num(c, int) for c in row.get("capacity", "").split(";") if c]
+        dims = max(dims, len(capacity))
+        v: dict[str, Any] = {"id": row.get("id"), "description": row.get("vehicle_description") or row.get("description"),
+                             "capacity": capacity}
+        if row.get("start_latitude") and row.get("start_longitude"):
+            v["start_index"] = loc(float(row["start_latitude"]), float(row["start_longitude"]))
+        if row.get("end_latitude") and row.get("end_longitude"):
+            v["end_index"] = loc(float(row["end_latitude"]), float(row["end_longitude"]))
+        if row.get("shift_start") and row.get("shift_end"):
+            v["time_window"] = [_num(row["shift_start"], int), _num(row["shift_end"], int)]
+        if row.get("max_tasks"):
+            v["max_tasks"] = _num(row["max_tasks"], int)
+        vehicles.append(v)
+    jobs = []
+    for row in _read_csv(jobs_path):
+        job: dict[str, Any] = {"id": row.get("id"), "description": row.get("description"),
+                               "location_index": loc(float(row["location lat"]), float(row["location lng"]))}
+        # CSV quantities fill the first capacity dimension
+        for column, field in (("delivery quantity", "delivery"), ("pickup quantity", "pickup")):
+            qty = _num(row.get(column, ""), int)
+            if qty:
+                job[field] = [qty] + [0] * (dims - 1)
+        if row.get("service time"):
+            job["service"] = _num(row["service time"], int)
+        jobs.append(job)
+    return {"description": description, "locations": {"location": locations}, "vehicles": vehicles, "jobs": jobs}
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("request", help="NextBillion-style request JSON")
+    ap.add_argument("-o", "--output", help="write the response here (default: stdout)")
+    ap.add_argument("--solver", default=None)
+    ap.add_argument("--starts", type=int, default=None)
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args(argv)
+    # Imported here so spawned solver workers don't pay for the web stack
+    from . import jsonlib
+
+    response = solve(jsonlib.load_file(args.request), solver=args.solver, starts=args.starts, workers=args.workers)
+    body = jsonlib.dumps(response)
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(body)
+        s = response["result"]["summary"]
+        print(f"{s['routes']} routes, {s['unassigned']} unassigned, distance {s['distance']} m in {s['computing_time']}s")
+    else:
+        print(body.decode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import heapq
+import math
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+_M_PER_DEG = math.pi * EARTH_RADIUS_M / 180.0
+
+
+def haversine_m(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """Uniform lon/lat grid over Point features for nearest / within lookups.
+
+    The cell size is picked so that cells hold a handful of points on average (but
+    never below ``MIN_CELL_DEG``); a nearest query scans rings of cells outward and
+    stops as soon as the closest unscanned ring cannot beat the current k-th distance
+    or every point has been seen. Queries far outside the occupied cells scan the
+    points linearly instead of walking empty rings.
+    """
+
+    #: ~110 m: coincident or clustered points must not shrink cells to nothing
+    MIN_CELL_DEG = 1e-3
+
+    def __init__(self, features: Iterable[Dict[str, Any]], points_per_cell: int = 4) -> None:
+        self.features: List[Dict[str, Any]] = []
+        xs: List[float] = []
+        ys: List[float] = []
+        for feat in features:
+            geom = feat.get("geometry") or {}
+            if geom.get("type") != "Point":
+                continue
+            x, y = geom["coordinates"]
+            self.features.append(feat)
+            xs.append(float(x))
+            ys.append(float(y))
+        self.xs = xs
+        self.ys = ys
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        if not xs:
+            self.cell = 1.0
+            self.x0 = self.y0 = 0.0
+            self.max_abs_lat = 0.0
+            self.extent = (0, 0, 0, 0)
+            return
+        self.x0, self.y0 = min(xs), min(ys)
+        span = max(max(xs) - self.x0, max(ys) - self.y0, 1e-6)
+        per_axis = max(1, int(math.sqrt(len(xs) / points_per_cell)))
+        self.cell = max(span / per_axis, self.MIN_CELL_DEG)
+        self.max_abs_lat = max(abs(y) for y in ys)
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            self.cells.setdefault(self._cell_of(x, y), []).append(i)
+        # Occupied cell range, bounds how far a nearest search can usefully expand
+        self.extent = (*self._cell_of(self.x0, self.y0), *self._cell_of(max(xs), max(ys)))
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def _cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return (int(math.floor((x - self.x0) / self.cell)), int(math.floor((y - self.y0) / self.cell)))
+
+    def _ring(self, cx: int, cy: int, r: int) -> Iterable[int]:
+        if r == 0:
+            yield from self.cells.get((cx, cy), ())
+            return
+        for dx in range(-r, r + 1):
+            yield from self.cells.get((cx + dx, cy - r), ())
+            yield from self.cells.get((cx + dx, cy + r), ())
+        for dy in range(-r + 1, r):
+            yield from self.cells.get((cx - r, cy + dy), ())
+            yield from self.cells.get((cx + r, cy + dy), ())
+
+    def nearest(self, lon: float, lat: float, k: int = 1) -> List[Tuple[float, Dict[str, Any]]]:
+        """Return up to k (distance_m, feature) pairs ordered by great-circle distance."""
+        if not self.features or k <= 0:
+            return []
+        cx, cy = self._cell_of(lon, lat)
+        # Lower bound (metres) for points at least r cells away along either axis
+        cos_bound = math.cos(math.radians(min(89.9, max(self.max_abs_lat, abs(lat)))))
+        cell_m = self.cell * _M_PER_DEG * cos_bound
+        gx, gy, hx, hy = self.extent
+        max_r = max(abs(cx - gx), abs(cx - hx), abs(cy - gy), abs(cy - hy))
+        # Rings before the first occupied one are empty: too many of them and a scan is cheaper
+        min_r = max(gx - cx, cx - hx, gy - cy, cy - hy, 0)
+        if min_r * min_r > len(self.cells):
+            found = heapq.nsmallest(k, ((haversine_m(lon, lat, x, y), i) for i, (x, y) in enumerate(zip(self.xs, self.ys))))
+            return [(d, self.features[i]) for d, i in found]
+        best: List[Tuple[float, int]] = []
+        seen = 0
+        r = 0
+        while r <= max_r and seen < len(self.xs):
+            for i in self._ring(cx, cy, r):
+                best.append((haversine_m(lon, lat, self.xs[i], self.ys[i]), i))
+                seen += 1
+            if len(best) >= k:
+                best.sort()
+                del best[k:]
+                if best[-1][0] <= r * cell_m:
+                    break
+            r += 1
+        best.sort()
+        return [(d, self.features[i]) for d, i in best[:k]]
+
+    def within(self, bbox: Sequence[float]) -> List[Dict[str, Any]]:
+        """Features inside bbox = (minLon, minLat, maxLon, maxLat)."""
+        if not self.features:
+            return []
+        x1, y1, x2, y2 = bbox
+        ax, ay = self._cell_of(x1, y1)
+        bx, by = self._cell_of(x2, y2)
+        out = []
+        # Clamp to occupied cells so huge boxes do not iterate empty space
+        if (bx - ax + 1) * (by - ay + 1) > len(self.cells):
+            candidates = (i for (cx, cy), idx in self.cells.items() if ax <= cx <= bx and ay <= cy <= by for i in idx)
+        else:
+            candidates = (i for cx in range(ax, bx + 1) for cy in range(ay, by + 1) for i in self.cells.get((cx, cy), ()))
+        for i in candidates:
+            if x1 <= self.xs[i] <= x2 and y1 <= self.ys[i] <= y2:
+                out.append(self.features[i])
+        return out
@@ -0,0 +1,444 @@
+"""Live vehicle positions: ping ring buffers, incremental map matching and ETAs.
+
+Devices stream GPS pings over ``/ws``. Each vehicle keeps its last pings in a
+fixed-size ring backed by one ``array('d')``. Each ping is matched to the vehicle's
+planned route (the decoded polyline from ``nb_to_geojson``, projected once to local
+metres). The search starts in a window around the previous match and only scans the
+whole route when the ping is far from that window. The match gives progress along the
+route, deviation from it and, from the step schedule (arrival, waiting, service),
+the time the plan expected the vehicle at that point. Remaining step ETAs are the
+planned remaining times shifted to the ping's timestamp.
+"""
+import asyncio
+import bisect
+import math
+import os
+import time
+from array import array
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import jsonlib
+from .spatial import EARTH_RADIUS_M
+
+_FIELDS = ("ts", "lon", "lat", "speed", "heading")
+_NF = len(_FIELDS)
+_NAN = float("nan")
+_M_PER_DEG = math.pi * EARTH_RADIUS_M / 180.0
+# Arrivals at or above this are epoch seconds; smaller ones are relative to the route start
+_EPOCH_ARRIVALS = 1e9
+
+
+def _num(v: float) -> Optional[float]:
+    return None if v != v else v  # NaN -> None (JSON has no NaN)
+
+
+class PingRing:
+    """Last ``capacity`` pings of one vehicle as (ts, lon, lat, speed, heading) rows in one flat array."""
+    __slots__ = ("capacity", "data", "head", "count")
+
+    def __init__(self, capacity: int = 256) -> None:
+        self.capacity = capacity
+        self.data = array("d", bytes(8 * _NF * capacity))
+        self.head = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, ts: float, lon: float, lat: float, speed: float = _NAN, heading: float = _NAN) -> None:
+        i = self.head * _NF
+        d = self.data
+        d[i] = ts
+        d[i + 1] = lon
+        d[i + 2] = lat
+        d[i + 3] = speed
+        d[i + 4] = heading
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def recent(self, n: int | None = None) -> List[Tuple[float, ...]]:
+        """Up to n most recent pings, oldest first."""
+        n = self.count if n is None else max(0, min(n, self.count))
+        out = []
+        for k in range(n, 0, -1):
+            i = ((self.head - k) % self.capacity) * _NF
+            out.append(tuple(self.data[i:i + _NF]))
+        return out
+
+    def last(self) -> Tuple[float, ...] | None:
+        if not self.count:
+            return None
+        i = ((self.head - 1) % self.capacity) * _NF
+        return tuple(self.data[i:i + _NF])
+
+
+class RouteTrack:
+    """One planned route prepared for matching: planar polyline, cumulative length, step schedule."""
+    __slots__ = ("route_index", "vehicle", "lon0", "lat0", "kx", "xs", "ys", "cum", "length",
+                 "steps", "step_along", "sched_along", "sched_time", "epoch")
+
+    def __init__(self, route_index: int, vehicle: Any, coords: Sequence[Sequence[float]], steps: Sequence[Dict[str, Any]]) -> None:
+        self.route_index = route_index
+        self.vehicle = vehicle
+        pts = [(float(x), float(y)) for x, y in coords] or [(float(s["lon"]), float(s["lat"])) for s in steps]
+        self.lon0 = sum(p[0] for p in pts) / len(pts)
+        self.lat0 = sum(p[1] for p in pts) / len(pts)
+        # Equirectangular metres around the route's centre: exact enough within a city
+        self.kx = _M_PER_DEG * math.cos(math.radians(self.lat0))
+        self.xs = array("d", ((x - self.lon0) * self.kx for x, _ in pts))
+        self.ys = array("d", ((y - self.lat0) * _M_PER_DEG for _, y in pts))
+        cum = array("d", [0.0])
+        for i in range(1, len(pts)):
+            cum.append(cum[-1] + math.hypot(self.xs[i] - self.xs[i - 1], self.ys[i] - self.ys[i - 1]))
+        self.cum = cum
+        self.length = cum[-1]
+        # Steps are visited in order: project each one from the previous step's segment onwards
+        self.steps = list(steps)
+        self.step_along: List[float] = []
+        seg = 0
+        for s in self.steps:
+            x, y = self.to_xy(s["lon"], s["lat"])
+            _, seg, t = self.project(x, y, seg, self.segments)
+            self.step_along.append(self.along(seg, t))
+        # (along, planned time) breakpoints: arrival and departure at each timed step
+        self.sched_along: List[float] = []
+        self.sched_time: List[float] = []
+        for s, a in zip(self.steps, self.step_along):
+            if s.get("arrival") is None:
+                continue
+            arrival = float(s["arrival"])
+            if self.sched_time and arrival < self.sched_time[-1]:
+                continue
+            a = max(a, self.sched_along[-1]) if self.sched_along else a
+            depart = arrival + float(s.get("waiting_time") or 0) + float(s.get("service") or 0)
+            self.sched_along += [a, a]
+            self.sched_time += [arrival, depart]
+        self.epoch = bool(self.sched_time) and self.sched_time[0] >= _EPOCH_ARRIVALS
+
+    @property
+    def segments(self) -> int:
+        return max(1, len(self.xs) - 1)
+
+    def to_xy(self, lon: float, lat: float) -> Tuple[float, float]:
+        return (lon - self.lon0) * self.kx, (lat - self.lat0) * _M_PER_DEG
+
+    def along(self, seg: int, t: float) -> float:
+        if len(self.xs) < 2:
+            return 0.0
+        return self.cum[seg] + t * (self.cum[seg + 1] - self.cum[seg])
+
+    def project(self, x: float, y: float, lo: int, hi: int) -> Tuple[float, int, float]:
+        """Closest point on segments lo..hi-1: (distance m, segment, fraction along it)."""
+        xs, ys = self.xs, self.ys
+        if len(xs) < 2:
+            return math.hypot(x - xs[0], y - ys[0]), 0, 0.0
+        best_d2, best_seg, best_t = math.inf, lo, 0.0
+        for i in range(lo, min(hi, len(xs) - 1)):
+            ax, ay = xs[i], ys[i]
+            dx, dy = xs[i + 1] - ax, ys[i + 1] - ay
+            l2 = dx * dx + dy * dy
+            t = ((x - ax) * dx + (y - ay) * dy) / l2 if l2 else 0.0
+            if t < 0.0:
+                t = 0.0
+            elif t > 1.0:
+                t = 1.0
+            ex, ey = ax + t * dx - x, ay + t * dy - y
+            d2 = ex * ex + ey * ey
+            if d2 < best_d2:
+                best_d2, best_seg, best_t = d2, i, t
+        return math.sqrt(best_d2), best_seg, best_t
+
+    def planned_time(self, along: float) -> float | None:
+        """Time the plan expected the vehicle at this distance along the route."""
+        sa, st = self.sched_along, self.sched_time
+        if not sa:
+            return None
+        if along <= sa[0]:
+            return st[0]
+        i = bisect.bisect_right(sa, along)
+        if i >= len(sa):
+            return st[-1]
+        a0, a1 = sa[i - 1], sa[i]
+        if a1 <= a0:
+            return st[i - 1]
+        return st[i - 1] + (along - a0) / (a1 - a0) * (st[i] - st[i - 1])
+
+
+def route_tracks(geo: Dict[str, Any]) -> Dict[str, RouteTrack]:
+    """RouteTrack per vehicle id (as a string) from an ``nb_to_geojson`` FeatureCollection."""
+    lines: Dict[int, Dict[str, Any]] = {}
+    steps: Dict[int, List[Dict[str, Any]]] = {}
+    for feat in geo.get("features", []):
+        props = feat.get("properties") or {}
+        geom = feat.get("geometry") or {}
+        ridx = props.get("route_index")
+        if geom.get("type") == "LineString":
+            lines[ridx] = feat
+        elif geom.get("type") == "Point":
+            lon, lat = geom["coordinates"]
+            steps.setdefault(ridx, []).append({
+                "id": props.get("id"), "type": props.get("step_type"), "lon": lon, "lat": lat,
+                "arrival": props.get("arrival"), "waiting_time": props.get("waiting_time"), "service": props.get("service"),
+            })
+    tracks = {}
+    for ridx, line in lines.items():
+        vehicle = line["properties"].get("vehicle")
+        tracks[str(vehicle)] = RouteTrack(ridx, vehicle, line["geometry"]["coordinates"], steps.get(ridx, []))
+    return tracks
+
+
+class VehicleState:
+    """Tracking state of one vehicle: ring of pings, current match and schedule offset."""
+    __slots__ = ("key", "set_id", "vehicle", "device_id", "ring", "route", "checked", "seg", "along",
+                 "deviation", "off_count", "off_route", "planned", "matched_ts", "pushed", "seen")
+
+    def __init__(self, key: str, set_id: int | None, vehicle: str | None, device_id: str, capacity: int) -> None:
+        self.key = key
+        self.set_id = set_id
+        self.vehicle = vehicle
+        self.device_id = device_id
+        self.ring = PingRing(capacity)
+        self.route: RouteTrack | None = None
+        self.checked = -math.inf
+        self.seg = 0
+        self.along = 0.0
+        self.deviation: float | None = None
+        self.off_count = 0
+        self.off_route = False
+        self.planned: float | None = None
+        self.matched_ts: float | None = None
+        self.pushed = 0.0
+        self.seen = time.time()  # wall clock of the last ping received (device timestamps may be off)
+
+    def position(self) -> Dict[str, Any]:
+        ts, lon, lat, speed, heading = self.ring.last()
+        out = {"key": self.key, "set": self.set_id, "vehicle": self.vehicle, "device_id": self.device_id,
+               "ts": ts, "lat": lat, "lon": lon, "speed": _num(speed), "heading": _num(heading), "seen": round(self.seen, 3)}
+        r = self.route
+        if r is not None:
+            out.update(route_index=r.route_index, along_m=round(self.along, 1),
+                       progress=round(self.along / r.length, 4) if r.length else None,
+                       deviation_m=round(self.deviation, 1) if self.deviation is not None else None,
+                       off_route=self.off_route, delay_s=self.delay())
+        return out
+
+    def delay(self) -> float | None:
+        if self.route is None or not self.route.epoch or self.planned is None:
+            return None
+        return round(self.matched_ts - self.planned, 1)
+
+    def etas(self) -> List[Dict[str, Any]]:
+        """Remaining steps with the planned arrival and the current estimate."""
+        r = self.route
+        if r is None or self.planned is None:
+            return []
+        out = []
+        first = bisect.bisect_right(r.step_along, self.along + 1.0)
+        for s, a in zip(r.steps[first:], r.step_along[first:]):
+            if s.get("arrival") is None:
+                continue
+            out.append({"id": s.get("id"), "type": s.get("type"), "along_m": round(a, 1), "planned_arrival": s["arrival"],
+                        "eta": round(self.matched_ts + float(s["arrival"]) - self.planned, 1)})
+        return out
+
+
+class Tracker:
+    """Ingests pings for every vehicle connected to this worker.
+
+    ``routes(set_id)`` returns the set's ``{vehicle: RouteTrack}`` (cached by the caller);
+    it is called from a thread at most every ``route_check`` seconds per vehicle, so
+    re-plans are picked up. ``on_event(event)`` receives ``off_route``/``on_route``
+    transitions and ``eta`` updates at most every ``push_every`` seconds per vehicle.
+    Vehicles that sent no ping for ``ttl`` seconds are dropped by ``expire``, and a
+    device without a vehicle tag is forgotten when it disconnects.
+    """
+
+    def __init__(self, routes: Callable[[int], Dict[str, RouteTrack]], capacity: int | None = None,
+                 off_route_m: float | None = None, off_route_pings: int = 3, window: int = 64,
+                 route_check: float = 5.0, push_every: float | None = None, ttl: float | None = None,
+                 on_event: Callable[[Dict[str, Any]], Awaitable[None]] | None = None) -> None:
+        self.routes = routes
+        self.capacity = capacity or int(os.getenv("TRACK_RING_SIZE", "256"))
+        self.off_route_m = off_route_m or float(os.getenv("OFF_ROUTE_METERS", "60"))
+        self.off_route_pings = off_route_pings
+        self.window = window
+        self.route_check = route_check
+        self.push_every = push_every if push_every is not None else float(os.getenv("ETA_PUSH_SECONDS", "5"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("TRACK_TTL_SECONDS", "900"))
+        self.on_event = on_event
+        self.vehicles: Dict[str, VehicleState] = {}
+        self.dirty: set[str] = set()
+        self.pings = 0
+        self.rejected = 0
+        self.full_scans = 0
+        self.expired = 0
+
+    @staticmethod
+    def key_for(device_id: str, vehicle: str | None, set_id: int | None) -> str:
+        return f"{set_id}:{vehicle}" if vehicle else f"device:{device_id}"
+
+    def state(self, device_id: str, vehicle: str | None, set_id: int | None) -> VehicleState:
+        key = self.key_for(device_id, vehicle, set_id)
+        st = self.vehicles.get(key)
+        if st is None:
+            st = self.vehicles[key] = VehicleState(key, set_id, vehicle, device_id, self.capacity)
+        st.device_id = device_id
+        return st
+
+    def _lookup_route(self, st: VehicleState) -> RouteTrack | None:
+        if st.set_id is None or not st.vehicle:
+            return None
+        try:
+            return self.routes(st.set_id).get(st.vehicle)
+        except Exception:
+            return None  # no response for the set yet
+
+    async def refresh_route(self, st: VehicleState) -> None:
+        now = time.monotonic()
+        if now - st.checked < self.route_check:
+            return
+        st.checked = now
+        route = await asyncio.to_thread(self._lookup_route, st)
+        if route is not st.route:
+            st.route = route
+            st.seg = 0
+            st.off_count = 0
+            st.off_route = False
+
+    def ingest(self, st: VehicleState, pings: Iterable[Sequence[float]]) -> List[Dict[str, Any]]:
+        """Record and match (ts, lat, lon, speed, heading) pings; returns events to push."""
+        events = []
+        for ts, lat, lon, speed, heading in pings:
+            if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+                self.rejected += 1
+                continue
+            st.ring.append(ts, lon, lat, speed, heading)
+            self.pings += 1
+            r = st.route
+            if r is None:
+                continue
+            x, y = r.to_xy(lon, lat)
+            lo = max(0, st.seg - 4)
+            d, seg, t = r.project(x, y, lo, st.seg + self.window)
+            if d > self.off_route_m and (lo > 0 or st.seg + self.window < r.segments):
+                # Lost the local match (jump, reroute, GPS gap): scan the whole route once
+                self.full_scans += 1
+                d2, seg2, t2 = r.project(x, y, 0, r.segments)
+                if d2 < d:
+                    d, seg, t = d2, seg2, t2
+            st.seg = seg
+            st.along = r.along(seg, t)
+            st.deviation = d
+            st.planned = r.planned_time(st.along)
+            st.matched_ts = ts
+            if d > self.off_route_m:
+                st.off_count += 1
+                if st.off_count == self.off_route_pings and not st.off_route:
+                    st.off_route = True
+                    events.append({"type": "off_route", "vehicle": st.position()})
+            else:
+                st.off_count = 0
+                if st.off_route:
+                    st.off_route = False
+                    events.append({"type": "on_route", "vehicle": st.position()})
+        if st.ring.count:
+            st.seen = time.time()
+            self.dirty.add(st.key)
+            now = time.monotonic()
+            if st.route is not None and st.planned is not None and self.push_every and now - st.pushed >= self.push_every:
+                st.pushed = now
+                events.append({"type": "eta", "vehicle": st.position(), "steps": st.etas()})
+        return events
+
+    @staticmethod
+    def parse(message: Any, now: float) -> List[Tuple[float, float, float, float, float]] | None:
+        """Pings of a ``ping``/``pings`` message, or None for other messages.
+
+        ``{"type": "ping", "lat", "lon", "ts"?, "speed"?, "heading"?}`` or
+        ``{"type": "pings", "pings": [{...}, ... | [ts, lat, lon, speed?, heading?], ...]}``.
+        """
+        if not isinstance(message, dict):
+            return None
+        kind = message.get("type")
+        if kind == "ping":
+            items = [message]
+        elif kind == "pings":
+            items = message.get("pings") or []
+        else:
+            return None
+        out = []
+        for p in items:
+            try:
+                if isinstance(p, dict):
+                    out.append((float(p.get("ts") or now), float(p["lat"]), float(p["lon"]),
+                                float(p["speed"]) if p.get("speed") is not None else _NAN,
+                                float(p["heading"]) if p.get("heading") is not None else _NAN))
+                else:
+                    ts, lat, lon = float(p[0] or now), float(p[1]), float(p[2])
+                    speed = float(p[3]) if len(p) > 3 and p[3] is not None else _NAN
+                    heading = float(p[4]) if len(p) > 4 and p[4] is not None else _NAN
+                    out.append((ts, lat, lon, speed, heading))
+            except (KeyError, IndexError, TypeError, ValueError):
+                continue
+        return out
+
+    async def handle(self, device_id: str, vehicle: str | None, set_id: int | None, text: str) -> bool:
+        """Process one inbound WebSocket message; False if it was not a ping message."""
+        try:
+            message = jsonlib.loads(text)
+        except jsonlib.DecodeError:
+            return False
+        pings = self.parse(message, time.time())
+        if pings is None:
+            return False
+        st = self.state(device_id, vehicle, set_id)
+        await self.refresh_route(st)
+        events = self.ingest(st, pings)
+        if events and self.on_event is not None:
+            for event in events:
+                await self.on_event(event)
+        return True
+
+    def positions(self, set_id: int | None = None, vehicles: Iterable[str] | None = None) -> List[Dict[str, Any]]:
+        wanted = set(vehicles) if vehicles is not None else None
+        out = []
+        for st in self.vehicles.values():
+            if set_id is not None and st.set_id != set_id:
+                continue
+            if wanted is not None and st.vehicle not in wanted:
+                continue
+            if st.ring.count:
+                out.append(st.position())
+        return out
+
+    def expire(self, now: float | None = None) -> List[str]:
+        """Drop vehicles without a ping for ``ttl`` seconds; returns their keys."""
+        if not self.ttl:
+            return []
+        cutoff = (now if now is not None else time.time()) - self.ttl
+        stale = [k for k, st in self.vehicles.items() if st.seen < cutoff]
+        for key in stale:
+            del self.vehicles[key]
+            self.dirty.discard(key)
+        self.expired += len(stale)
+        return stale
+
+    def forget_device(self, device_id: str) -> str | None:
+        """Drop the state of an untagged device (it has no vehicle to come back as); returns its key."""
+        key = self.key_for(device_id, None, None)
+        if self.vehicles.pop(key, None) is None:
+            return None
+        self.dirty.discard(key)
+        return key
+
+    def take_dirty(self) -> Dict[str, Dict[str, Any]]:
+        """Latest position and ETAs of vehicles changed since the last call (for the shared snapshot)."""
+        keys, self.dirty = self.dirty, set()
+        return {k: dict(self.vehicles[k].position(), steps=self.vehicles[k].etas()) for k in keys if k in self.vehicles}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"vehicles": len(self.vehicles), "matched": sum(1 for s in self.vehicles.values() if s.route is not None),
+                "off_route": sum(1 for s in self.vehicles.values() if s.off_route), "pings": self.pings,
+                "rejected": self.rejected, "full_scans": self.full_scans, "expired": self.expired, "ring_size": self.capacity,
+                "ttl": self.ttl}
@@ -1,5 +1,12 @@
 
-from typing import Any, Dict, List
+import math
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:  # optional: vectorized polyline decoding
+    import numpy as np
+except ImportError:
+    np = None
 
 def _decode_polyline(s: str, precision: int = 5) -> List[List[float]]:
     """Decode an encoded polyline string into a list of [lon, lat].
@@ -47,6 +54,145 @@ def _decode_polyline(s: str, precision: int = 5) -> List[List[float]]:
         coords.append([lon / factor, lat / factor])  # [lon, lat]
     return coords
 
+def encode_polyline(coords: Sequence[Sequence[float]], precision: int = 5) -> str:
+    """Encode a list of [lon, lat] into a Google/OSRM polyline string."""
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lon = 0
+    for lon, lat in coords:
+        ilat = int(round(lat * factor))
+        ilon = int(round(lon * factor))
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            v = ~(delta << 1) if delta < 0 else (delta << 1)
+            while v >= 0x20:
+                out.append(chr((0x20 | (v & 0x1F)) + 63))
+                v >>= 5
+            out.append(chr(v + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+# Characters that can only appear inside a value (continuation bit set); a string ending
+# in one of them is truncated and its dangling partial value is ignored.
+_POLYLINE_CONT_CHARS = "".join(chr(c) for c in range(0x20 + 63, 127))
+_PRECISION_SAMPLE = 10
+
+def _precision_factor(lats: Sequence[int], lons: Sequence[int]) -> int:
+    """Pick 1e5 or 1e6 from the first integer coordinates, mirroring _is_valid_coords."""
+    for ilat, ilon in zip(lats[:_PRECISION_SAMPLE], lons[:_PRECISION_SAMPLE]):
+        if not (-180 * 10**5 <= ilon <= 180 * 10**5 and -90 * 10**5 <= ilat <= 90 * 10**5):
+            return 10**6
+    return 10**5
+
+def _polyline_ints(s: str) -> List[int]:
+    """Decode the zig-zag varints of a polyline (precision independent)."""
+    vals: List[int] = []
+    result = shift = 0
+    for ch in s:
+        b = ord(ch) - 63
+        result |= (b & 0x1F) << shift
+        shift += 5
+        if b < 0x20:
+            vals.append(~(result >> 1) if (result & 1) else (result >> 1))
+            result = shift = 0
+    return vals
+
+class DecodedPolylines:
+    """Batch of decoded polylines sharing one coordinate buffer.
+
+    ``coords`` holds [lon, lat] pairs of every polyline back to back (an (N, 2) float64
+    NumPy array, or a flat array('d') without NumPy); polyline ``i`` occupies points
+    ``offsets[i]:offsets[i + 1]``.
+    """
+    __slots__ = ("coords", "offsets")
+
+    def __init__(self, coords: Any, offsets: List[int]) -> None:
+        self.coords = coords
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> List[List[float]]:
+        a, b = self.offsets[i], self.offsets[i + 1]
+        if np is not None and isinstance(self.coords, np.ndarray):
+            return self.coords[a:b].tolist()
+        flat = self.coords
+        return [[flat[k], flat[k + 1]] for k in range(2 * a, 2 * b, 2)]
+
+def _decode_polylines_py(encoded: Sequence[str]) -> DecodedPolylines:
+    coords = array("d")
+    offsets = [0]
+    for s in encoded:
+        vals = _polyline_ints(s or "")
+        if len(vals) & 1:
+            vals.pop()
+        lats: List[int] = []
+        lons: List[int] = []
+        lat = lon = 0
+        for k in range(0, len(vals), 2):
+            lat += vals[k]
+            lon += vals[k + 1]
+            lats.append(lat)
+            lons.append(lon)
+        factor = _precision_factor(lats, lons)
+        for ilat, ilon in zip(lats, lons):
+            coords.append(ilon / factor)
+            coords.append(ilat / factor)
+        offsets.append(offsets[-1] + len(lats))
+    return DecodedPolylines(coords, offsets)
+
+def _decode_polylines_np(encoded: Sequence[str]) -> DecodedPolylines:
+    n = len(encoded)
+    parts = [(s or "").rstrip(_POLYLINE_CONT_CHARS).encode("ascii", "replace") for s in encoded]
+    data = b"".join(parts)
+    if not data:
+        return DecodedPolylines(np.empty((0, 2)), [0] * (n + 1))
+    b = np.frombuffer(data, dtype=np.uint8).astype(np.int64) - 63
+    ends = np.flatnonzero(b < 0x20)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    pos = np.arange(len(b)) - np.repeat(starts, ends - starts + 1)
+    vals = np.add.reduceat((b & 0x1F) << (5 * pos), starts)
+    vals = np.where(vals & 1, ~(vals >> 1), vals >> 1)
+    # Number of values per polyline: terminators are never shared across strings
+    bounds = np.cumsum([0] + [len(p) for p in parts])
+    vbounds = np.searchsorted(ends, bounds)
+    counts = np.diff(vbounds)
+    if (counts & 1).any():
+        # Drop the dangling latitude of odd-length (malformed) polylines
+        keep = np.ones(len(vals), dtype=bool)
+        keep[vbounds[1:][(counts & 1) == 1] - 1] = False
+        vals = vals[keep]
+        counts = counts - (counts & 1)
+    npts = counts // 2
+    total = np.cumsum(vals.reshape(-1, 2), axis=0)  # running [lat, lon] across all polylines
+    offsets = np.concatenate(([0], np.cumsum(npts)))
+    # Restart the running sum at each polyline
+    prev = np.zeros((n, 2), dtype=total.dtype)
+    first = offsets[:-1]
+    later = first > 0
+    prev[later] = total[first[later] - 1]
+    ints = total - np.repeat(prev, npts, axis=0)
+    factors = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        a, c = offsets[i], offsets[i + 1]
+        sample = ints[a:min(c, a + _PRECISION_SAMPLE)]
+        factors[i] = _precision_factor(sample[:, 0].tolist(), sample[:, 1].tolist())
+    coords = ints[:, ::-1] / np.repeat(factors, npts)[:, None]
+    return DecodedPolylines(coords, offsets.tolist())
+
+def decode_polylines(encoded: Sequence[str]) -> DecodedPolylines:
+    """Decode many encoded polylines in one pass.
+
+    Each string is decoded once; precision (1e5 or 1e6) is detected per polyline from
+    its first integer coordinates instead of decoding, validating and re-decoding.
+    Uses NumPy when installed and a pure-Python loop otherwise.
+    """
+    if np is not None:
+        return _decode_polylines_np(encoded)
+    return _decode_polylines_py(encoded)
+
 def _is_valid_coords(coords: List[List[float]]) -> bool:
     if not coords or len(coords) < 2:
         return False
@@ -59,6 +205,56 @@ def _is_valid_coords(coords: List[List[float]]) -> bool:
             return False
     return True
 
+def _route_features(ridx: int, route: Dict[str, Any], coords: List[List[float]]) -> List[Dict[str, Any]]:
+    """Features of one route: its LineString (if any) followed by one Point per step."""
+    features: List[Dict[str, Any]] = []
+    steps = route.get("steps", [])
+    if not _is_valid_coords(coords):
+        coords = []
+        for s in steps:
+            loc = s.get("location")
+            if isinstance(loc, list) and len(loc) == 2:
+                # NextBillion gives [lat, lon]; TomTom & GeoJSON expect [lon, lat]
+                lat, lon = loc[0], loc[1]
+                coords.append([lon, lat])
+    # If still invalid, skip adding the line feature to avoid map errors
+    if not _is_valid_coords(coords):
+        coords = []
+    if coords:
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": coords},
+            "properties": {
+                "route_index": ridx,
+                "vehicle": route.get("vehicle"),
+                "cost": route.get("cost"),
+                "distance": route.get("distance"),
+                "duration": route.get("duration"),
+                "setup": route.get("setup"),
+            }
+        })
+    # Add step points
+    for s in steps:
+        loc = s.get("location")
+        if isinstance(loc, list) and len(loc) == 2:
+            lat, lon = loc[0], loc[1]
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {
+                    "step_type": s.get("type"),
+                    "id": s.get("id"),
+                    "arrival": s.get("arrival"),
+                    "duration": s.get("duration"),
+                    "service": s.get("service"),
+                    "waiting_time": s.get("waiting_time"),
+                    "load": s.get("load"),
+                    "location_index": s.get("location_index"),
+                    "route_index": ridx,
+                }
+            })
+    return features
+
 def nb_to_geojson(nb: Dict[str, Any]) -> Dict[str, Any]:
     """
     Convert NextBillion Optimization 'result' into a GeoJSON FeatureCollection:
@@ -68,63 +264,141 @@ def nb_to_geojson(nb: Dict[str, Any]) -> Dict[str, Any]:
     result = nb.get("result", {})
     routes = result.get("routes", [])
     features: List[Dict[str, Any]] = []
+    # Decode all road geometries in one batch; precision is detected per polyline
+    geoms = [r.get("geometry") for r in routes]
+    try:
+        decoded = decode_polylines([g if isinstance(g, str) else "" for g in geoms])
+    except Exception:
+        decoded = None
     for ridx, route in enumerate(routes):
-        steps = route.get("steps", [])
-        coords: List[List[float]] = []
         # Prefer decoded road geometry when available; fallback to straight lines between steps
+        coords: List[List[float]] = []
+        if decoded is not None and isinstance(geoms[ridx], str) and geoms[ridx]:
+            coords = decoded[ridx]
+        features.extend(_route_features(ridx, route, coords))
+    return {"type": "FeatureCollection", "features": features}
+
+def iter_route_features(nb: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the GeoJSON features of nb_to_geojson one route at a time.
+
+    Geometry is decoded per route, so only one route's feature tree is alive at once.
+    """
+    routes = nb.get("result", {}).get("routes", [])
+    for ridx, route in enumerate(routes):
         geom = route.get("geometry")
+        coords: List[List[float]] = []
         if isinstance(geom, str) and geom:
             try:
-                coords = _decode_polyline(geom, precision=5)
-                # If decoded values look invalid, retry with precision=6
-                if not _is_valid_coords(coords):
-                    coords = _decode_polyline(geom, precision=6)
+                coords = decode_polylines([geom])[0]
             except Exception:
                 coords = []
-        if not _is_valid_coords(coords):
-            for s in steps:
-                loc = s.get("location")
-                if isinstance(loc, list) and len(loc) == 2:
-                    # NextBillion gives [lat, lon]; TomTom & GeoJSON expect [lon, lat]
-                    lat, lon = loc[0], loc[1]
-                    coords.append([lon, lat])
-        # If still invalid, skip adding the line feature to avoid map errors
-        if not _is_valid_coords(coords):
-            coords = []
-        if coords:
-            features.append({
-                "type": "Feature",
-                "geometry": {"type": "LineString", "coordinates": coords},
-                "properties": {
-                    "route_index": ridx,
-                    "vehicle": route.get("vehicle"),
-                    "cost": route.get("cost"),
-                    "distance": route.get("distance"),
-                    "duration": route.get("duration"),
-                    "setup": route.get("setup"),
-                }
-            })
-        # Add step points
-        for s in steps:
-            loc = s.get("location")
-            if isinstance(loc, list) and len(loc) == 2:
-                lat, lon = loc[0], loc[1]
-                features.append({
+        yield _route_features(ridx, route, coords)
+
+def _segment_distances_py(coords: Sequence[Sequence[float]], a: int, b: int) -> List[float]:
+    ax, ay = coords[a]
+    bx, by = coords[b]
+    dx, dy = bx - ax, by - ay
+    seg2 = dx * dx + dy * dy
+    out = []
+    for k in range(a + 1, b):
+        px, py = coords[k]
+        if seg2 == 0.0:
+            ex, ey = px - ax, py - ay
+        else:
+            t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg2))
+            ex, ey = px - (ax + t * dx), py - (ay + t * dy)
+        out.append(math.sqrt(ex * ex + ey * ey))
+    return out
+
+def _segment_distances_np(arr: Any, a: int, b: int) -> Any:
+    p = arr[a + 1:b]
+    d = arr[b] - arr[a]
+    seg2 = float(d @ d)
+    if seg2 == 0.0:
+        e = p - arr[a]
+    else:
+        t = np.clip((p - arr[a]) @ d / seg2, 0.0, 1.0)
+        e = p - (arr[a] + t[:, None] * d)
+    return np.sqrt((e * e).sum(axis=1))
+
+def douglas_peucker_weights(coords: Sequence[Sequence[float]]) -> List[float]:
+    """Per-vertex Douglas-Peucker tolerances.
+
+    Vertex i survives simplification at tolerance ``tol`` iff ``weights[i] > tol``, so a
+    single pass answers every zoom level. Weights are capped by the weight of the split
+    that exposed them, which makes the threshold test exact for the recursive algorithm.
+    """
+    n = len(coords)
+    weights = [0.0] * n
+    if n == 0:
+        return weights
+    weights[0] = weights[-1] = math.inf
+    arr = np.asarray(coords, dtype=np.float64) if np is not None and n > 256 else None
+    stack = [(0, n - 1, math.inf)]
+    while stack:
+        a, b, cap = stack.pop()
+        if b - a < 2:
+            continue
+        if arr is not None and b - a > 64:
+            dists = _segment_distances_np(arr, a, b)
+            k = int(dists.argmax())
+            dmax = float(dists[k])
+        else:
+            dists = _segment_distances_py(coords, a, b)
+            dmax = max(dists)
+            k = dists.index(dmax)
+        k += a + 1
+        w = min(dmax, cap)
+        weights[k] = w
+        stack.append((a, k, w))
+        stack.append((k, b, w))
+    return weights
+
+def zoom_tolerance(zoom: int) -> float:
+    """Size of one 256px web-map tile pixel in degrees at the given zoom."""
+    return 360.0 / (256 * 2 ** zoom)
+
+def _bbox_of(coords: Sequence[Sequence[float]]) -> tuple:
+    xs = [c[0] for c in coords]
+    ys = [c[1] for c in coords]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+class ZoomIndex:
+    """nb_to_geojson output prepared for bbox/zoom queries.
+
+    Built once per data file: every feature gets its bounding box and every LineString
+    its Douglas-Peucker vertex weights, so a query only filters, never re-simplifies.
+    """
+
+    def __init__(self, geo: Dict[str, Any]) -> None:
+        self.features: List[Dict[str, Any]] = geo.get("features", [])
+        self.bboxes: List[tuple] = []
+        self.weights: List[Optional[List[float]]] = []
+        for feat in self.features:
+            geom = feat["geometry"]
+            if geom["type"] == "LineString":
+                self.bboxes.append(_bbox_of(geom["coordinates"]))
+                self.weights.append(douglas_peucker_weights(geom["coordinates"]))
+            else:
+                x, y = geom["coordinates"]
+                self.bboxes.append((x, y, x, y))
+                self.weights.append(None)
+
+    def query(self, zoom: Optional[int] = None, bbox: Optional[Sequence[float]] = None) -> Dict[str, Any]:
+        tol = zoom_tolerance(zoom) if zoom is not None else None
+        out: List[Dict[str, Any]] = []
+        for feat, fb, w in zip(self.features, self.bboxes, self.weights):
+            if bbox is not None and (fb[2] < bbox[0] or fb[0] > bbox[2] or fb[3] < bbox[1] or fb[1] > bbox[3]):
+                continue
+            if w is not None and tol is not None:
+                coords = feat["geometry"]["coordinates"]
+                feat = {
                     "type": "Feature",
-                    "geometry": {"type": "Point", "coordinates": [lon, lat]},
-                    "properties": {
-                        "step_type": s.get("type"),
-                        "id": s.get("id"),
-                        "arrival": s.get("arrival"),
-                        "duration": s.get("duration"),
-                        "service": s.get("service"),
-                        "waiting_time": s.get("waiting_time"),
-                        "load": s.get("load"),
-                        "location_index": s.get("location_index"),
-                        "route_index": ridx,
-                    }
-                })
-    return {"type": "FeatureCollection", "features": features}
+                    "geometry": {"type": "LineString", "coordinates": [c for c, cw in zip(coords, w) if cw > tol]},
+                    "properties": feat["properties"],
+                }
+            out.append(feat)
+        return {"type": "FeatureCollection", "features": out}
 
 def summarize(nb: Dict[str, Any]) -> Dict[str, Any]:
     res = nb.get("result", {})
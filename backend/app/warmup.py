@@ -0,0 +1,192 @@
+"""Warm start: a snapshot of the serialized artifacts of recently used data files.
+
+Workers are recycled often, and a fresh one would otherwise re-list the data
+directory, re-parse every JSON file and re-convert it on its first requests.
+``Warmup`` records which response files are served. After startup it runs once in a
+background thread, so the server is already accepting connections:
+
+1. the snapshot left by earlier workers is read and every entry whose source file is
+   unchanged (same size and mtime_ns) is handed to ``restore``;
+2. the ``sets`` most recently used files (newest responses when there is no history
+   yet) that are still missing are built with ``build``;
+3. the snapshot is rewritten from ``collect``. It is rewritten again at shutdown if
+   the warm set changed meanwhile.
+
+The snapshot is a single pickle of bytes and tuples, replaced atomically, so loading
+it is one sequential read with no JSON parsing. It is trusted local state like the
+jobs database: keep it somewhere only the server writes. Paths are stored relative
+to the data directory.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+_FORMAT = 1
+
+# (size, mtime_ns, payload) of one artifact; the payload is opaque to this module
+Entry = tuple[int, int, Any]
+
+
+class Warmup:
+    def __init__(self, data_dir: str, path: str, sets: int, kinds: Iterable[str] = ("summary", "geojson")) -> None:
+        self.data_dir = data_dir
+        self.path = path
+        self.sets = sets
+        self.kinds = tuple(kinds)
+        self._used: dict[str, float] = {}
+        self._saved: frozenset = frozenset()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.state = "idle"
+        self.restored = self.built = self.failed = 0
+        self.load_ms: float | None = None
+        self.elapsed_ms: float | None = None
+        self.snapshot_bytes: int | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sets > 0
+
+    def touch(self, path: str) -> None:
+        """Record that the data file at ``path`` was just served."""
+        self._used[path] = time.time()
+
+    def _ranked(self) -> list[str]:
+        ranked = sorted(self._used.copy().items(), key=lambda kv: -kv[1])
+        return [p for p, _ in ranked if os.path.exists(p)][:self.sets]
+
+    def recent(self, candidates: Callable[[], list[str]]) -> list[str]:
+        """The ``sets`` most recently used files, topped up from ``candidates`` (newest first)."""
+        out = self._ranked()
+        if len(out) < self.sets:
+            seen = set(out)
+            for path in candidates():
+                if path not in seen:
+                    out.append(path)
+                    seen.add(path)
+                    if len(out) == self.sets:
+                        break
+        return out
+
+    # ---- snapshot ---------------------------------------------------------
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "rb") as f:
+                snap = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as exc:
+            logging.warning("warmup: ignoring unreadable snapshot %s: %s", self.path, exc)
+            return {}
+        if not isinstance(snap, dict) or snap.get("format") != _FORMAT:
+            return {}
+        return snap
+
+    def _write(self, used: dict[str, float], artifacts: dict[tuple[str, str], Entry]) -> None:
+        rel = lambda p: os.path.relpath(p, self.data_dir)
+        snap = {
+            "format": _FORMAT,
+            "written": time.time(),
+            "used": {rel(p): t for p, t in used.items()},
+            "artifacts": {(rel(p), kind): entry for (p, kind), entry in artifacts.items()},
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self.snapshot_bytes = os.path.getsize(self.path)
+
+    def save(self, collect: Callable[[str, str], Entry | None], candidates: Callable[[], list[str]]) -> bool:
+        """Snapshot the recent files' artifacts; skipped when nothing changed since the last write."""
+        if self.state in ("idle", "loading"):
+            # The previous snapshot has not been read yet: writing now would only lose it
+            return False
+        with self._lock:
+            artifacts = {}
+            for path in self.recent(candidates):
+                for kind in self.kinds:
+                    entry = collect(path, kind)
+                    if entry is not None:
+                        artifacts[(path, kind)] = entry
+            signature = frozenset((key, entry[0], entry[1]) for key, entry in artifacts.items())
+            if signature == self._saved:
+                return False
+            used = {p: self._used[p] for p in self._ranked()}
+            self._write(used, artifacts)
+            self._saved = signature
+            return True
+
+    # ---- background run -----------------------------------------------------
+
+    def run(self, restore: Callable[[str, str, Any], None], build: Callable[[str, str], None],
+            collect: Callable[[str, str], Entry | None], candidates: Callable[[], list[str]]) -> None:
+        """Load the snapshot, build what is missing for the recent files, then save (thread body)."""
+        t0 = time.perf_counter()
+        self.state = "loading"
+        snap = self._read()
+        absolute = lambda rel: os.path.normpath(os.path.join(self.data_dir, rel))
+        for rel, ts in (snap.get("used") or {}).items():
+            # Live requests since startup are newer than anything recorded by earlier workers
+            self._used.setdefault(absolute(rel), ts)
+        warm = set()
+        loaded = set()
+        for (rel, kind), (size, mtime_ns, payload) in (snap.get("artifacts") or {}).items():
+            path = absolute(rel)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size == size and st.st_mtime_ns == mtime_ns and kind in self.kinds:
+                restore(path, kind, payload)
+                warm.add((path, kind))
+                loaded.add(((path, kind), size, mtime_ns))
+                self.restored += 1
+        self._saved = frozenset(loaded)
+        self.load_ms = round((time.perf_counter() - t0) * 1000, 2)
+        self.state = "building"
+        for path in self.recent(candidates):
+            for kind in self.kinds:
+                if self._stop.is_set():
+                    self.state = "stopped"
+                    return
+                if (path, kind) in warm:
+                    continue
+                try:
+                    build(path, kind)
+                    self.built += 1
+                except Exception as exc:
+                    self.failed += 1
+                    logging.warning("warmup: %s of %s failed: %s", kind, path, exc)
+        try:
+            self.save(collect, candidates)
+        except OSError as exc:
+            logging.warning("warmup: could not write snapshot %s: %s", self.path, exc)
+        self.elapsed_ms = round((time.perf_counter() - t0) * 1000, 2)
+        self.state = "done"
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sets": self.sets,
+            "snapshot": self.path,
+            "state": self.state,
+            "restored": self.restored,
+            "built": self.built,
+            "failed": self.failed,
+            "load_ms": self.load_ms,
+            "elapsed_ms": self.elapsed_ms,
+            "snapshot_bytes": self.snapshot_bytes,
+        }
+
+
+def warmup_from_env(data_dir: str, default_path: str) -> Warmup:
+    """Warmup of the WARMUP_SETS (default 0 = off) most recent files, snapshot at WARMUP_SNAPSHOT."""
+    return Warmup(data_dir, os.getenv("WARMUP_SNAPSHOT", default_path), int(os.getenv("WARMUP_SETS", "0")))
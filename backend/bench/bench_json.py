@@ -0,0 +1,86 @@
+"""Load + serialize time and peak RSS of the JSON backends on a response file.
+
+Each mode runs in its own subprocess so peak RSS is not shared between them:
+  stdlib   json.load + json.dumps (the previous code path)
+  fast     jsonlib.load_file + jsonlib.dumps (orjson / msgspec when installed)
+  typed    schema.load_response (msgspec Structs or __slots__ objects)
+
+Run from backend/:  python -m bench.bench_json [--file path.json] [--routes 2000]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("stdlib", "fast", "typed")
+
+
+def run_mode(mode: str, path: str, repeat: int) -> dict:
+    from app import jsonlib, schema
+
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    load_s = dump_s = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        if mode == "stdlib":
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        elif mode == "fast":
+            data = jsonlib.load_file(path)
+        else:
+            data = schema.load_response(path)
+        t1 = time.perf_counter()
+        if mode == "stdlib":
+            json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        elif mode == "fast":
+            jsonlib.dumps(data)
+        t2 = time.perf_counter()
+        load_s, dump_s = min(load_s, t1 - t0), min(dump_s, t2 - t1)
+        del data
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "mode": mode,
+        "backend": jsonlib.BACKEND if mode == "fast" else ("msgspec" if schema.msgspec is not None else "slots") if mode == "typed" else "json",
+        "load_ms": round(load_s * 1000, 1),
+        "dump_ms": round(dump_s * 1000, 1) if mode != "typed" else None,
+        "rss_delta_mb": round((peak - base_rss) / 1024, 1),  # ru_maxrss is KiB on Linux
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file")
+    ap.add_argument("--routes", type=int, default=2000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.file, args.repeat)))
+        return
+    tmp = None
+    path = args.file
+    if path is None:
+        from bench.synth import synthetic_response
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+        json.dump(synthetic_response(routes=args.routes, steps_per_route=60, points_per_route=200), tmp)
+        tmp.close()
+        path = tmp.name
+    try:
+        print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+        for mode in MODES:
+            out = subprocess.run([sys.executable, "-m", "bench.bench_json", "--mode", mode, "--file", path, "--repeat", str(args.repeat)],
+                                 capture_output=True, text=True, check=True)
+            r = json.loads(out.stdout)
+            dump = f"{r['dump_ms']:8.1f} ms" if r["dump_ms"] is not None else "       -   "
+            print(f"  {r['mode']:>6} [{r['backend']:>7}]  load {r['load_ms']:8.1f} ms  dump {dump}  peak RSS +{r['rss_delta_mb']:.1f} MB")
+    finally:
+        if tmp is not None:
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""start-navigation across several uvicorn workers, with and without the shared backend.
+
+Starts the RESP stand-in (``app.resp_server``) and ``uvicorn app.main:app --workers N``,
+connects ``--devices`` WebSocket clients (the kernel spreads them over the workers),
+then POSTs ``--requests`` start-navigation calls for random devices with ``--concurrency``
+in flight. A call only succeeds when the worker that takes it can reach the device:
+with ``SHARED_BACKEND=local`` that is about 1/N of them, with ``redis`` all of them.
+Reports success rate, delivered messages and requests/s for each backend.
+
+Run from backend/:  python -m bench.bench_multiworker [--workers 4] [--devices 200] [--requests 2000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import websockets
+
+from .bench_ws_fanout import free_port, get_json, post_json
+
+
+async def wait_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run_backend(backend: str, args, redis_port: int) -> dict:
+    port = free_port()
+    env = dict(os.environ, SHARED_BACKEND=backend, REDIS_URL=f"redis://127.0.0.1:{redis_port}/0",
+               SHARED_PREFIX=f"bench{port}:", JOBS_DB=os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                            "--workers", str(args.workers), "--log-level", "warning"], env=env)
+    try:
+        await wait_port(port)
+        await asyncio.sleep(1.0 + 0.5 * args.workers)  # every worker must be up before devices connect
+        url = f"ws://127.0.0.1:{port}/ws?device_id="
+        clients = await asyncio.gather(*(websockets.connect(url + f"dev-{i}") for i in range(args.devices)))
+        received = [0]
+
+        async def drain(ws) -> None:
+            try:
+                async for _ in ws:
+                    received[0] += 1
+            except websockets.ConnectionClosed:
+                pass
+
+        readers = [asyncio.create_task(drain(ws)) for ws in clients]
+        rng = random.Random(1)
+        targets = [f"dev-{rng.randrange(args.devices)}" for _ in range(args.requests)]
+        sent = [0]
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def call(device_id: str) -> None:
+            async with sem:
+                result = await post_json(port, "/api/start-navigation", {"device_id": device_id, "route_id": "r1"})
+                sent[0] += bool(result.get("sent"))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(call(d) for d in targets))
+        elapsed = time.perf_counter() - t0
+        await asyncio.sleep(0.5)
+        stats = await get_json(port, "/api/ws/stats")
+        for ws in clients:
+            await ws.close()
+        await asyncio.gather(*readers)
+        return {"ok": sent[0], "delivered": received[0], "seconds": elapsed, "stats": stats}
+    finally:
+        app.terminate()
+        app.wait(timeout=30)
+
+
+async def run(args) -> None:
+    redis_port = free_port()
+    resp = subprocess.Popen([sys.executable, "-m", "app.resp_server", "--port", str(redis_port)], stdout=subprocess.DEVNULL)
+    try:
+        await wait_port(redis_port)
+        for backend in ("local", "redis"):
+            r = await run_backend(backend, args, redis_port)
+            print(f"{backend:>5} x{args.workers} workers: {r['ok']}/{args.requests} accepted "
+                  f"({100 * r['ok'] / args.requests:.1f}%), {r['delivered']} delivered, "
+                  f"{args.requests / r['seconds']:.0f} req/s")
+            print(f"      stats of the answering worker: {r['stats']}")
+    finally:
+        resp.terminate()
+        resp.wait(timeout=10)
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--devices", type=int, default=200)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,75 @@
+"""Benchmark batch polyline decoding against the per-route _decode_polyline loop.
+
+Run from backend/:  python -m bench.bench_polyline [--routes 200] [--points 5000]
+"""
+import argparse
+import math
+import random
+import time
+
+from app import utils
+from app.utils import _decode_polyline, _is_valid_coords, decode_polylines, encode_polyline
+
+
+def synthetic_polylines(routes: int, points: int, precision: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(routes):
+        lon, lat = rng.uniform(18, 32), rng.uniform(-34, -22)
+        heading = rng.uniform(0, 2 * math.pi)
+        coords = []
+        for _ in range(points):
+            heading += rng.gauss(0, 0.3)
+            lon += 0.0005 * math.cos(heading)
+            lat += 0.0005 * math.sin(heading)
+            coords.append([lon, lat])
+        out.append(encode_polyline(coords, precision))
+    return out
+
+
+def legacy(encoded: list[str]) -> list:
+    # What nb_to_geojson did per route before the batch decoder
+    out = []
+    for s in encoded:
+        coords = _decode_polyline(s, precision=5)
+        if not _is_valid_coords(coords):
+            coords = _decode_polyline(s, precision=6)
+        out.append(coords)
+    return out
+
+
+def batch(encoded: list[str]) -> list:
+    decoded = decode_polylines(encoded)
+    return [decoded[i] for i in range(len(decoded))]
+
+
+def best_of(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--routes", type=int, default=200)
+    ap.add_argument("--points", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    for precision in (5, 6):
+        encoded = synthetic_polylines(args.routes, args.points, precision)
+        size_mb = sum(map(len, encoded)) / 1e6
+        t_legacy = best_of(legacy, encoded, args.repeat)
+        t_batch = best_of(batch, encoded, args.repeat)
+        t_buffer = best_of(decode_polylines, encoded, args.repeat)
+        backend = "numpy" if utils.np is not None else "python"
+        print(f"precision={precision} routes={args.routes} points/route={args.points} ({size_mb:.1f} MB encoded)")
+        print(f"  legacy _decode_polyline : {t_legacy * 1000:9.1f} ms")
+        print(f"  decode_polylines[{backend}] : {t_batch * 1000:9.1f} ms  ({t_legacy / t_batch:.1f}x, as lists)")
+        print(f"  decode_polylines[{backend}] : {t_buffer * 1000:9.1f} ms  ({t_legacy / t_buffer:.1f}x, buffer only)")
+
+
+if __name__ == "__main__":
+    main()
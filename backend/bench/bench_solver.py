@@ -0,0 +1,47 @@
+"""Local solver on synthetic 1k/10k-job instances: wall time, plan quality, multi-core scaling.
+
+For each size the same multi-start search runs on one process and then on ``--workers``
+processes; both runs try the same seeds, so they return the same plan and the ratio
+of wall times is the process-pool speedup.
+
+Run from backend/:  python -m bench.bench_solver [--jobs 1000 10000] [--starts 4] [--workers N]
+"""
+import argparse
+import os
+import time
+
+from app.solver import solve
+from app.utils import nb_to_geojson, summarize
+
+from .synth import synthetic_request
+
+
+def run(jobs: int, starts: int, workers: int) -> dict:
+    request = synthetic_request(jobs)
+    t0 = time.perf_counter()
+    response = solve(request, solver="local", starts=starts, workers=workers)
+    elapsed = time.perf_counter() - t0
+    # The response must be consumable by the existing readers
+    nb_to_geojson(response)
+    summary = summarize(response)["summary"]
+    return {"seconds": elapsed, "routes": summary["routes"], "unassigned": summary["unassigned"], "distance_km": summary["distance"] / 1000}
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--starts", type=int, default=4)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+    for jobs in args.jobs:
+        serial = run(jobs, args.starts, 1)
+        print(f"{jobs:>6} jobs  1 worker : {serial['seconds']:7.2f}s  routes={serial['routes']} "
+              f"unassigned={serial['unassigned']} distance={serial['distance_km']:.0f} km")
+        if args.workers > 1:
+            pooled = run(jobs, args.starts, args.workers)
+            print(f"{jobs:>6} jobs  {args.workers} workers: {pooled['seconds']:7.2f}s  "
+                  f"speedup x{serial['seconds'] / pooled['seconds']:.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,70 @@
+"""Nearest-point queries of ``GridIndex`` against a brute-force scan.
+
+Three point layouts (spread over a city, clustered depots and a few coincident points)
+are queried near the points, kilometres away and on the other side of the globe, with
+``k`` up to more than the number of points. Every answer is checked against sorting all
+distances, and a query slower than ``--budget-ms`` fails the run: far queries over
+coincident points used to walk millions of empty cells.
+
+Run from backend/:  python -m bench.bench_spatial [--points 5000] [--queries 200]
+"""
+import argparse
+import random
+import sys
+import time
+
+from app.spatial import GridIndex, haversine_m
+
+
+def point(lon: float, lat: float, i: int) -> dict:
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": {"i": i}}
+
+
+def layouts(n: int, rng: random.Random) -> dict:
+    spread = [point(rng.uniform(18.3, 18.7), rng.uniform(-34.1, -33.8), i) for i in range(n)]
+    depots = [(rng.uniform(18.3, 18.7), rng.uniform(-34.1, -33.8)) for _ in range(5)]
+    clustered = [point(x + rng.gauss(0, 2e-5), y + rng.gauss(0, 2e-5), i)
+                 for i, (x, y) in enumerate(rng.choice(depots) for _ in range(n))]
+    coincident = [point(18.5, -33.9, i) for i in range(2)]
+    return {"spread": spread, "clustered": clustered, "coincident": coincident}
+
+
+def brute(features: list, lon: float, lat: float, k: int) -> list:
+    return sorted(haversine_m(lon, lat, *f["geometry"]["coordinates"]) for f in features)[:k]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--points", type=int, default=5000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--budget-ms", type=float, default=250.0, help="fail when one query takes longer")
+    args = ap.parse_args()
+    rng = random.Random(3)
+    failed = False
+    for name, features in layouts(args.points, rng).items():
+        index = GridIndex(features)
+        worst = total = 0.0
+        runs = 0
+        for offset in (0.001, 0.01, 0.1, 1.0, 30.0, 150.0):
+            for _ in range(args.queries // 6 or 1):
+                lon = 18.5 + rng.uniform(-offset, offset)
+                lat = max(-89.0, min(89.0, -33.9 + rng.uniform(-offset, offset)))
+                k = rng.choice((1, 5, len(features) + 3))
+                t0 = time.perf_counter()
+                got = index.nearest(lon, lat, k)
+                dt = time.perf_counter() - t0
+                worst, total, runs = max(worst, dt), total + dt, runs + 1
+                want = brute(features, lon, lat, k)
+                if [round(d, 6) for d, _ in got] != [round(d, 6) for d in want]:
+                    print(f"  MISMATCH {name} at ({lon:.5f}, {lat:.5f}) k={k}")
+                    failed = True
+        print(f"{name:>10}: {len(features):6d} points, {len(index.cells):5d} cells, "
+              f"mean {total / runs * 1000:7.3f} ms, worst {worst * 1000:7.3f} ms")
+        if worst * 1000 > args.budget_ms:
+            print(f"  SLOW {name}: worst query {worst * 1000:.1f} ms > {args.budget_ms} ms")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
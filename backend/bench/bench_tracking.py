@@ -0,0 +1,111 @@
+"""GPS ping ingestion throughput of the tracker (pings/s on one core).
+
+Solves a synthetic instance with the local solver, then drives ``--vehicles`` simulated
+vehicles along their planned polylines (evenly spaced pings with ~5 m of noise and a few
+detours) and feeds the pings to ``Tracker`` three ways: pre-parsed tuples
+(ring buffer + map matching only), one JSON message per ping, and JSON batches of
+``--batch`` pings, as devices send them over ``/ws``.
+
+Run from backend/:  python -m bench.bench_tracking [--jobs 2000] [--pings 200000]
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import random
+import time
+
+from app.solver import solve
+from app.tracking import Tracker, route_tracks
+from app.utils import nb_to_geojson
+
+from .synth import synthetic_request
+
+
+def simulate(tracks: dict, pings_per_vehicle: int, seed: int = 1) -> dict:
+    """Per vehicle: (ts, lat, lon, speed, heading) tuples at even steps along its route."""
+    rng = random.Random(seed)
+    out = {}
+    for vehicle, tr in tracks.items():
+        pings = []
+        ky = tr.kx / math.cos(math.radians(tr.lat0))
+        for k in range(pings_per_vehicle):
+            s = tr.length * k / pings_per_vehicle
+            i = min(len(tr.cum) - 2, bisect.bisect_right(tr.cum, s) - 1)
+            seg = tr.cum[i + 1] - tr.cum[i]
+            t = (s - tr.cum[i]) / seg if seg else 0.0
+            x = tr.xs[i] + t * (tr.xs[i + 1] - tr.xs[i]) + rng.gauss(0, 5)
+            y = tr.ys[i] + t * (tr.ys[i + 1] - tr.ys[i]) + rng.gauss(0, 5)
+            if rng.random() < 0.002:
+                y += 500  # detour
+            pings.append((1.7e9 + 5 * k, tr.lat0 + y / ky, tr.lon0 + x / tr.kx, 12.0, float("nan")))
+        out[vehicle] = pings
+    return out
+
+
+async def run(args) -> None:
+    response = solve(synthetic_request(args.jobs), solver="local", starts=1, workers=1)
+    tracks = route_tracks(nb_to_geojson(response))
+    vehicles = list(tracks)[:args.vehicles]
+    per_vehicle = max(1, args.pings // len(vehicles))
+    sim = simulate({v: tracks[v] for v in vehicles}, per_vehicle)
+    total = sum(len(p) for p in sim.values())
+    print(f"{len(vehicles)} vehicles, {total} pings, ~{sum(len(tracks[v].xs) for v in vehicles) // len(vehicles)} polyline points per route")
+
+    def fresh() -> Tracker:
+        return Tracker(lambda set_id: tracks, push_every=0)
+
+    # Pre-parsed: ring buffer + incremental matching only
+    tracker = fresh()
+    states = {}
+    for v in vehicles:
+        states[v] = tracker.state(f"dev-{v}", v, 1)
+        await tracker.refresh_route(states[v])
+    t0 = time.perf_counter()
+    for v in vehicles:
+        st = states[v]
+        for p in sim[v]:
+            tracker.ingest(st, (p,))
+    dt = time.perf_counter() - t0
+    print(f"ingest (parsed)      : {total / dt:10,.0f} pings/s  full scans={tracker.full_scans}")
+
+    # Interleaved vehicles, one JSON message per ping (as /ws receives them)
+    tracker = fresh()
+    messages = []
+    for k in range(per_vehicle):
+        for v in vehicles:
+            if k < len(sim[v]):
+                ts, lat, lon, speed, _ = sim[v][k]
+                messages.append((v, json.dumps({"type": "ping", "ts": ts, "lat": lat, "lon": lon, "speed": speed})))
+    t0 = time.perf_counter()
+    for v, text in messages:
+        await tracker.handle(f"dev-{v}", v, 1, text)
+    dt = time.perf_counter() - t0
+    print(f"handle (1 per msg)   : {len(messages) / dt:10,.0f} pings/s")
+
+    # Batches of --batch compact [ts, lat, lon, speed] pings
+    tracker = fresh()
+    batches = []
+    for v in vehicles:
+        ps = sim[v]
+        for i in range(0, len(ps), args.batch):
+            batches.append((v, json.dumps({"type": "pings", "pings": [[p[0], p[1], p[2], p[3]] for p in ps[i:i + args.batch]]})))
+    t0 = time.perf_counter()
+    for v, text in batches:
+        await tracker.handle(f"dev-{v}", v, 1, text)
+    dt = time.perf_counter() - t0
+    print(f"handle ({args.batch} per msg)  : {total / dt:10,.0f} pings/s  {tracker.stats()}")
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=2000)
+    ap.add_argument("--vehicles", type=int, default=100)
+    ap.add_argument("--pings", type=int, default=200000)
+    ap.add_argument("--batch", type=int, default=10)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,108 @@
+"""First-request latency of a freshly started worker: cold, warming up, and from a snapshot.
+
+Writes a synthetic DATA_DIR (``--sets`` set folders and root responses of ``--sizes``
+routes), then starts a uvicorn worker three times on it:
+
+* ``cold``      WARMUP_SETS=0: the first requests parse and convert the files;
+* ``build``     WARMUP_SETS=N with no snapshot: the warm-up builds the N newest files
+                in the background and writes the snapshot;
+* ``snapshot``  WARMUP_SETS=N again: the snapshot written by the previous worker is
+                restored instead.
+
+For each it reports the time until the port accepts connections, the warm-up's own
+numbers (from ``/api/cache/stats``) and the latency of the first ``/api/summary`` and
+``/api/routes`` request for every root version once the warm-up is done.
+
+Run from backend/:  python -m bench.bench_warmup [--sets 200] [--sizes 200,5000]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from .bench_multiworker import wait_port
+from .bench_ws_fanout import free_port, get_json
+from .synth import write_dataset
+
+
+def serve(port: int, data_dir: str) -> None:
+    # Child process: the app on the synthetic DATA_DIR (the directory is fixed at import)
+    import uvicorn
+    from app import main
+    from app.catalog import DataCatalog
+    from app.warmup import warmup_from_env
+    main.DATA_DIR = data_dir
+    main.catalog = DataCatalog(data_dir, mode="off")
+    main.warmup = warmup_from_env(data_dir, main.warmup.path)
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def timed_get(port: int, path: str) -> float:
+    t0 = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n".encode())
+    await reader.read()
+    writer.close()
+    return (time.perf_counter() - t0) * 1000
+
+
+async def run_phase(name: str, warm_sets: int, data_dir: str, versions: list[int], state_dir: str) -> None:
+    port = free_port()
+    env = dict(os.environ, WARMUP_SETS=str(warm_sets), WARMUP_SNAPSHOT=os.path.join(state_dir, "warmup.pickle"), CATALOG_WATCH="off",
+               JOBS_DB=os.path.join(state_dir, "jobs.sqlite3"), GEOCODE_DB=os.path.join(state_dir, "geocode.sqlite3"))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "bench.bench_warmup", "--serve", str(port), "--data-dir", data_dir], env=env)
+    try:
+        await wait_port(port)
+        ready_ms = (time.perf_counter() - t0) * 1000
+        warm = (await get_json(port, "/api/cache/stats"))["warmup"]
+        while warm["state"] in ("loading", "building"):
+            await asyncio.sleep(0.02)
+            warm = (await get_json(port, "/api/cache/stats"))["warmup"]
+        print(f"{name:>9}: accepting after {ready_ms:7.1f} ms", end="")
+        if warm["enabled"]:
+            print(f"; warm-up restored {warm['restored']}, built {warm['built']} in {warm['elapsed_ms']:.1f} ms"
+                  f" (snapshot read {warm['load_ms']:.1f} ms)", end="")
+        print()
+        for v in versions:
+            summary = await timed_get(port, f"/api/summary?version={v}")
+            routes = await timed_get(port, f"/api/routes?version={v}")
+            print(f"           version {v}: first summary {summary:8.1f} ms, first routes {routes:8.1f} ms")
+    finally:
+        proc.send_signal(signal.SIGTERM)  # graceful: the lifespan writes the snapshot on the way out
+        proc.wait(timeout=60)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sets", type=int, default=200)
+    ap.add_argument("--sizes", default="200,5000", help="route counts of the root responses")
+    ap.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        serve(args.serve, args.data_dir)
+        return
+    sizes = tuple(int(s) for s in args.sizes.split(","))
+    tmp = tempfile.mkdtemp(prefix="bench-warmup-")
+    try:
+        data_dir = os.path.join(tmp, "data")
+        dataset = write_dataset(data_dir, sets=args.sets, sizes=sizes)
+        versions = [dataset["versions"][s]["version"] for s in sizes]
+        # The root responses are written last, so they are the newest files the warm-up picks
+        warm_sets = len(sizes)
+        asyncio.run(run_phase("cold", 0, data_dir, versions, tmp))
+        asyncio.run(run_phase("build", warm_sets, data_dir, versions, tmp))
+        asyncio.run(run_phase("snapshot", warm_sets, data_dir, versions, tmp))
+        print(f"snapshot: {os.path.getsize(os.path.join(tmp, 'warmup.pickle')) / 1e6:.1f} MB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
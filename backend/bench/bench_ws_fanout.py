@@ -0,0 +1,116 @@
+"""Broadcast fan-out load test with thousands of local WebSocket clients.
+
+Starts the app with uvicorn, connects ``--clients`` devices tagged with a set plus
+``--slow`` devices that never read their socket, then POSTs ``--messages`` broadcasts
+to the set. Reports the time from each POST until every fast client has the message,
+plus the manager's queue/drop counters: slow consumers must not delay the others.
+
+Run from backend/:  python -m bench.bench_ws_fanout [--clients 2000] [--slow 20]
+"""
+import argparse
+import asyncio
+import json
+import resource
+import socket
+import statistics
+import threading
+import time
+
+import uvicorn
+import websockets
+
+from app import main
+
+SET_ID = 1
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def post_json(port: int, path: str, payload: dict) -> dict:
+    body = json.dumps(payload).encode()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    raw = await reader.read()
+    writer.close()
+    return json.loads(raw.split(b"\r\n\r\n", 1)[1])
+
+
+async def get_json(port: int, path: str) -> dict:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n".encode())
+    raw = await reader.read()
+    writer.close()
+    return json.loads(raw.split(b"\r\n\r\n", 1)[1])
+
+
+async def stalled_client(port: int, device_id: str) -> asyncio.StreamWriter:
+    """A slow consumer: completes the WebSocket handshake, then never reads its socket."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write((f"GET /ws?set={SET_ID}&device_id={device_id} HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\n"
+                  "Connection: Upgrade\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    await reader.readuntil(b"\r\n\r\n")
+    return writer
+
+
+async def run(args) -> None:
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"ws://127.0.0.1:{port}/ws?set={SET_ID}&device_id="
+    t0 = time.perf_counter()
+    fast = []
+    for start in range(0, args.clients, 200):
+        batch = [websockets.connect(url + f"fast-{i}", max_queue=None) for i in range(start, min(args.clients, start + 200))]
+        fast += await asyncio.gather(*batch)
+    slow = [await stalled_client(port, f"slow-{i}") for i in range(args.slow)]
+    print(f"connected {len(fast)} fast + {len(slow)} slow clients in {time.perf_counter() - t0:.1f}s")
+
+    filler = "x" * args.payload_bytes
+    latencies = []
+    try:
+        for m in range(args.messages):
+            t_post = time.perf_counter()
+            receivers = [asyncio.create_task(ws.recv()) for ws in fast]
+            result = await post_json(port, "/api/broadcast", {"payload": {"type": "plan", "seq": m, "data": filler}, "set": SET_ID})
+            await asyncio.gather(*receivers)
+            latencies.append((time.perf_counter() - t_post) * 1000)
+        stats = await get_json(port, "/api/ws/stats")
+    finally:
+        await asyncio.gather(*(ws.close() for ws in fast), return_exceptions=True)
+        for w in slow:
+            w.close()
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    latencies.sort()
+    print(f"last broadcast queued for {result['queued']} connections")
+    print(f"fan-out to all fast clients: p50={statistics.median(latencies):.1f} ms  "
+          f"p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.1f} ms  max={latencies[-1]:.1f} ms")
+    print(f"manager: {stats}")
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=2000)
+    ap.add_argument("--slow", type=int, default=20)
+    ap.add_argument("--messages", type=int, default=50)
+    ap.add_argument("--payload-bytes", type=int, default=16384)
+    args = ap.parse_args()
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    need = 2 * (args.clients + args.slow) + 256
+    if soft < need:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(need, hard), hard))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
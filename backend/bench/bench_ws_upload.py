@@ -0,0 +1,134 @@
+"""WebSocket delivery latency while large CSV uploads are in flight.
+
+Starts the app with uvicorn on a temporary DATA_DIR, connects WebSocket devices and
+repeatedly pushes /api/start-navigation to them, measuring the time from the POST until
+the message arrives on the socket. The same probe runs idle and then during concurrent
+multi-hundred-MB uploads; with uploads off the event loop both distributions match.
+
+Run from backend/:  python -m bench.bench_ws_upload [--uploads 4] [--upload-mb 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+import uvicorn
+import websockets
+
+from app import main
+from app.catalog import DataCatalog
+
+SET_ID = 1
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def http_request(port: int, method: str, path: str, headers: dict, body_chunks) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+    writer.write(head.encode())
+    for chunk in body_chunks:
+        writer.write(chunk)
+        await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    await reader.read()
+    writer.close()
+    return status
+
+
+async def upload(port: int, size_mb: int) -> float:
+    boundary = "benchboundary"
+    row = b"J1,Synthetic job,-26.2678,27.8585,0,2,480\n"
+    header = b"ID,Description,Location Lat,Location Lng,Pickup Quantity,Delivery Quantity,Service Time\n"
+    rows_per_chunk = (1 << 20) // len(row)
+    chunk = row * rows_per_chunk
+    n_chunks = max(1, size_mb * (1 << 20) // len(chunk))
+    pre = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"jobs\"; filename=\"jobs.csv\"\r\n"
+           f"Content-Type: text/csv\r\n\r\n").encode() + header
+    post = f"\r\n--{boundary}--\r\n".encode()
+    length = len(pre) + n_chunks * len(chunk) + len(post)
+    t0 = time.perf_counter()
+    status = await http_request(
+        port, "POST", f"/api/mock-sets/{SET_ID}/upload",
+        {"Content-Type": f"multipart/form-data; boundary={boundary}", "Content-Length": str(length)},
+        [pre] + [chunk] * n_chunks + [post],
+    )
+    assert status == 200, status
+    return time.perf_counter() - t0
+
+
+async def probe(port: int, sockets: list, rounds: int) -> list[float]:
+    latencies = []
+    for i in range(rounds):
+        device, ws = sockets[i % len(sockets)]
+        body = json.dumps({"device_id": device, "route_id": str(i)}).encode()
+        t0 = time.perf_counter()
+        send = asyncio.create_task(http_request(
+            port, "POST", "/api/start-navigation",
+            {"Content-Type": "application/json", "Content-Length": str(len(body))}, [body]))
+        await ws.recv()
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await send
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+def describe(name: str, lat: list[float]) -> None:
+    lat = sorted(lat)
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+    print(f"{name:>16}: n={len(lat)} p50={statistics.median(lat):7.2f} ms  p99={p99:7.2f} ms  max={lat[-1]:7.2f} ms")
+
+
+async def run(args) -> None:
+    port = free_port()
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+    sockets = []
+    for i in range(args.devices):
+        device = f"bench-{i}"
+        ws = await websockets.connect(f"ws://127.0.0.1:{port}/ws?device_id={device}")
+        sockets.append((device, ws))
+    try:
+        describe("idle", await probe(port, sockets, args.rounds))
+        uploads = asyncio.gather(*(upload(port, args.upload_mb) for _ in range(args.uploads)))
+        busy = asyncio.create_task(probe(port, sockets, args.rounds))
+        t_up = await uploads
+        describe(f"{args.uploads}x{args.upload_mb}MB upload", await busy)
+        print(f"{'upload time':>16}: " + ", ".join(f"{t:.1f}s" for t in t_up))
+    finally:
+        for _, ws in sockets:
+            await ws.close()
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--devices", type=int, default=20)
+    ap.add_argument("--rounds", type=int, default=200)
+    ap.add_argument("--uploads", type=int, default=4)
+    ap.add_argument("--upload-mb", type=int, default=200)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.makedirs(os.path.join(data_dir, str(SET_ID)))
+        main.DATA_DIR = data_dir
+        main.catalog = DataCatalog(data_dir)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,363 @@
+"""Reproducible benchmark and load-test suite with machine-readable results.
+
+Builds a synthetic DATA_DIR (``--sets`` set folders plus root responses of ``--sizes``
+routes with ``--points``-point polylines), then runs:
+
+- micro-benchmarks of ``_decode_polyline``, ``nb_to_geojson``, ``summarize``,
+  ``_list_mock_sets`` (warm catalog and a fresh scan), ``api_request_points``
+  (cold and cached) and ``api_analytics`` over every set (first build and warm);
+- an HTTP load test against the app served by uvicorn in this process: ``--concurrency``
+  keep-alive clients cycle through a fixed endpoint mix for ``--duration`` seconds;
+- a WebSocket test: ``--ws-clients`` viewers of one set receive ``--ws-messages``
+  broadcasts.
+
+Clients and server share one process (and GIL), so absolute latencies include client
+overhead; compare runs of the same suite on the same machine. Latencies are reported as
+p50/p99 per endpoint, with RSS after each phase. Results are
+written as JSON (``--out``); ``--compare old.json`` prints the change against an earlier
+run, e.g. the same suite on the previous commit.
+
+Run from backend/:  python -m bench.suite [--quick] [--out bench-results.json] [--compare base.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .synth import synthetic_response, write_dataset
+
+# Keep the app's state (job store, geocode cache) out of the repo checkout
+_STATE = tempfile.mkdtemp(prefix="bench-state-")
+os.environ.setdefault("JOBS_DB", os.path.join(_STATE, "jobs.sqlite3"))
+os.environ.setdefault("GEOCODE_DB", os.path.join(_STATE, "geocode.sqlite3"))
+
+import uvicorn  # noqa: E402
+import websockets  # noqa: E402
+
+from app import main  # noqa: E402
+from app.catalog import DataCatalog  # noqa: E402
+from app.utils import _decode_polyline, nb_to_geojson, summarize  # noqa: E402
+
+from .bench_ws_fanout import free_port  # noqa: E402
+
+
+def rss_mb() -> dict:
+    current = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    return {"current": round(current, 1) if current is not None else None, "peak": round(peak, 1)}
+
+
+def percentile(values: list, q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def timed(fn, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - t0) * 1000)
+    return {"min_ms": round(min(runs), 3), "median_ms": round(percentile(runs, 50), 3), "runs": repeat}
+
+
+# ---- micro-benchmarks ----------------------------------------------------------
+
+def micro(args, data_dir: str, dataset: dict) -> dict:
+    out = {}
+    long_route = synthetic_response(1, steps_per_route=10, points_per_route=args.long_points)["result"]["routes"][0]["geometry"]
+    out["decode_polyline"] = dict(timed(lambda: _decode_polyline(long_route), args.repeat), points=args.long_points)
+    for routes, info in dataset["versions"].items():
+        with open(os.path.join(data_dir, f"nextbillion_response_{info['version']}.json"), encoding="utf-8") as f:
+            nb = json.load(f)
+        out[f"nb_to_geojson[{routes}]"] = dict(timed(lambda: nb_to_geojson(nb), args.repeat), routes=routes)
+        out[f"summarize[{routes}]"] = dict(timed(lambda: summarize(nb), args.repeat), routes=routes)
+        del nb
+    out["list_mock_sets[warm]"] = dict(timed(main._list_mock_sets, args.repeat), sets=dataset["sets"])
+    out["list_mock_sets[scan]"] = dict(timed(lambda: DataCatalog(data_dir, mode="off").sets(), args.repeat), sets=dataset["sets"])
+    ids = random.Random(3).sample(range(1, dataset["sets"] + 1), min(args.repeat, dataset["sets"]))
+    picks = iter(ids * 2)
+    out["api_request_points[cold]"] = timed(lambda: main.api_request_points(set=next(picks)), len(ids))
+    out["api_request_points[cached]"] = timed(lambda: main.api_request_points(set=ids[0]), args.repeat)
+    analytics = lambda: main.api_analytics(group_by="vehicle,day", level="routes", metrics=None, sets="all",
+                                           versions="none", since=None, until=None, utc_offset=0.0)
+    out["api_analytics[build]"] = dict(timed(analytics, 1), sets=dataset["sets"])
+    out["api_analytics[warm]"] = dict(timed(analytics, args.repeat), sets=dataset["sets"])
+    return out
+
+
+# ---- HTTP load test --------------------------------------------------------------
+
+class _Conn:
+    """Minimal keep-alive HTTP/1.1 client (Content-Length and chunked bodies)."""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, path: str, headers: dict) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        extra = "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n{extra}\r\n".encode())
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        fields = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+        if "content-length" in fields:
+            await self.reader.readexactly(int(fields["content-length"]))
+        elif fields.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        if fields.get("connection") == "close":
+            self.writer.close()
+            self.writer = None
+        return status
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+def endpoint_mix(dataset: dict) -> list:
+    """(label, path factory, headers); picked round-robin by every client."""
+    rng = random.Random(11)
+    sets = dataset["sets"]
+    big = max(dataset["versions"])
+    big_v = dataset["versions"][big]["version"]
+    small_v = dataset["versions"][min(dataset["versions"])]["version"]
+    gz = {"Accept-Encoding": "gzip"}
+
+    def a_set() -> int:
+        return rng.randint(1, sets)
+    return [
+        ("summary", lambda: f"/api/summary?set={a_set()}", {}),
+        ("routes[set]", lambda: f"/api/routes?set={a_set()}", gz),
+        (f"routes[{big}]", lambda: f"/api/routes?version={big_v}", gz),
+        (f"routes[{big},z8]", lambda: f"/api/routes?version={big_v}&zoom=8", gz),
+        ("routes[bbox]", lambda: f"/api/routes?version={small_v}&zoom=12&bbox=24,-30,26,-28", {}),
+        ("request_points", lambda: f"/api/request-points?set={a_set()}", {}),
+        ("mock_sets", lambda: "/api/mock-sets", gz),
+        ("raw[304]", lambda: f"/api/raw?version={small_v}", {"If-None-Match": "*"}),
+    ]
+
+
+async def http_load(args, port: int, dataset: dict) -> dict:
+    mix = endpoint_mix(dataset)
+    latencies = {label: [] for label, _, _ in mix}
+    errors = {label: 0 for label, _, _ in mix}
+
+    async def client(offset: int) -> None:
+        conn = _Conn(port)
+        i = offset
+        try:
+            while time.perf_counter() < deadline:
+                label, path, headers = mix[i % len(mix)]
+                i += 1
+                t0 = time.perf_counter()
+                try:
+                    status = await conn.get(path(), headers)
+                except (OSError, asyncio.IncompleteReadError):
+                    conn.close()
+                    conn = _Conn(port)
+                    status = 0
+                latencies[label].append((time.perf_counter() - t0) * 1000)
+                if status >= 400 or status == 0:
+                    errors[label] += 1
+        finally:
+            conn.close()
+
+    # One warm-up pass so the big artifacts are built before timing
+    warm = _Conn(port)
+    for _, path, headers in mix:
+        await warm.get(path(), headers)
+    warm.close()
+    t0 = time.perf_counter()
+    deadline = t0 + args.duration
+    await asyncio.gather(*(client(k) for k in range(args.concurrency)))
+    elapsed = time.perf_counter() - t0
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "endpoints": {label: {"count": len(v), "errors": errors[label], "p50_ms": _r(percentile(v, 50)),
+                              "p99_ms": _r(percentile(v, 99)), "max_ms": _r(max(v, default=None))}
+                      for label, v in latencies.items()},
+    }
+
+
+def _r(v: float | None) -> float | None:
+    return round(v, 3) if v is not None else None
+
+
+async def ws_load(args, port: int) -> dict:
+    url = f"ws://127.0.0.1:{port}/ws?set=1&device_id="
+    clients = []
+    for start in range(0, args.ws_clients, 100):
+        clients += await asyncio.gather(*(websockets.connect(url + f"bench-{i}", max_queue=None)
+                                          for i in range(start, min(args.ws_clients, start + 100))))
+    latencies = []
+    try:
+        for m in range(args.ws_messages):
+            body = json.dumps({"payload": {"type": "bench", "seq": m}, "set": 1}).encode()
+            t0 = time.perf_counter()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"POST /api/broadcast HTTP/1.1\r\nHost: bench\r\nConnection: close\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+
+            async def receive(ws) -> float:
+                await ws.recv()
+                return (time.perf_counter() - t0) * 1000
+            latencies += await asyncio.gather(*(receive(ws) for ws in clients))
+            await reader.read()
+            writer.close()
+    finally:
+        await asyncio.gather(*(ws.close() for ws in clients), return_exceptions=True)
+    return {"clients": len(clients), "messages": args.ws_messages, "deliveries": len(latencies),
+            "p50_ms": _r(percentile(latencies, 50)), "p99_ms": _r(percentile(latencies, 99)), "max_ms": _r(max(latencies, default=None))}
+
+
+# ---- report -----------------------------------------------------------------------
+
+def meta(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    optional = {}
+    for name in ("numpy", "orjson", "msgspec", "brotli"):
+        try:
+            optional[name] = __import__(name).__version__
+        except (ImportError, AttributeError):
+            optional[name] = None
+    return {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "optional": optional, "args": vars(args)}
+
+
+def flatten(results: dict) -> dict:
+    """{"micro.<name>": median_ms, "http.<label>.p50|p99": ms, "ws.p50|p99": ms} for comparisons."""
+    flat = {f"micro.{k}": v["median_ms"] for k, v in results.get("micro", {}).items()}
+    for label, v in results.get("http", {}).get("endpoints", {}).items():
+        flat[f"http.{label}.p50"] = v["p50_ms"]
+        flat[f"http.{label}.p99"] = v["p99_ms"]
+    if "rps" in results.get("http", {}):
+        flat["http.rps"] = results["http"]["rps"]
+    for q in ("p50_ms", "p99_ms"):
+        if results.get("ws", {}).get(q) is not None:
+            flat[f"ws.{q[:3]}"] = results["ws"][q]
+    return flat
+
+
+def compare(base: dict, new: dict) -> None:
+    old, cur = flatten(base), flatten(new)
+    print(f"\ncompared with {base.get('meta', {}).get('commit')} ({base.get('meta', {}).get('time')}):")
+    for key in sorted(cur):
+        if old.get(key) and cur[key] is not None:
+            ratio = cur[key] / old[key]
+            print(f"  {key:40s} {old[key]:>10.3f} -> {cur[key]:>10.3f}  x{ratio:.2f}")
+
+
+async def serve_and_load(args, dataset: dict, results: dict) -> None:
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        results["http"] = await http_load(args, port, dataset)
+        results["rss_mb"]["after_http"] = rss_mb()
+        if args.ws_clients:
+            results["ws"] = await ws_load(args, port)
+            results["rss_mb"]["after_ws"] = rss_mb()
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def run(args) -> dict:
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="bench-data-")
+    results: dict = {"meta": meta(args), "rss_mb": {"start": rss_mb()}}
+    t0 = time.perf_counter()
+    dataset = write_dataset(data_dir, sets=args.sets, sizes=tuple(args.sizes), points_per_route=args.points)
+    results["dataset"] = dict(dataset, build_s=round(time.perf_counter() - t0, 1))
+    print(f"dataset: {args.sets} sets + responses of {args.sizes} routes in {data_dir} ({results['dataset']['build_s']}s)")
+    main.DATA_DIR = data_dir
+    main.catalog = DataCatalog(data_dir, mode="off")
+
+    if not args.skip_micro:
+        results["micro"] = micro(args, data_dir, dataset)
+        results["rss_mb"]["after_micro"] = rss_mb()
+        for name, v in results["micro"].items():
+            print(f"  {name:32s} median {v['median_ms']:>10.3f} ms  min {v['min_ms']:>10.3f} ms")
+    if not args.skip_load:
+        asyncio.run(serve_and_load(args, dataset, results))
+        http = results["http"]
+        print(f"http: {http['requests']} requests, {http['rps']} req/s at concurrency {http['concurrency']}")
+        for label, v in http["endpoints"].items():
+            print(f"  {label:24s} n={v['count']:<6d} p50 {v['p50_ms']} ms  p99 {v['p99_ms']} ms  errors {v['errors']}")
+        if "ws" in results:
+            ws = results["ws"]
+            print(f"ws: {ws['deliveries']} deliveries to {ws['clients']} clients  p50 {ws['p50_ms']} ms  p99 {ws['p99_ms']} ms")
+    print(f"rss: {results['rss_mb']}")
+    if not args.data_dir and not args.keep_data:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--quick", action="store_true", help="small dataset and short load test (smoke run)")
+    ap.add_argument("--sets", type=int, default=2000)
+    ap.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[10, 200, 5000],
+                    help="route counts of the root responses (comma-separated)")
+    ap.add_argument("--points", type=int, default=500, help="polyline points per route of the root responses")
+    ap.add_argument("--long-points", type=int, default=50000, help="points of the polyline for decode_polyline")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--ws-clients", type=int, default=200)
+    ap.add_argument("--ws-messages", type=int, default=50)
+    ap.add_argument("--skip-micro", action="store_true")
+    ap.add_argument("--skip-load", action="store_true")
+    ap.add_argument("--data-dir", help="build the dataset here (kept) instead of a temporary directory")
+    ap.add_argument("--keep-data", action="store_true")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    args = ap.parse_args()
+    if args.quick:
+        args.sets, args.sizes, args.points, args.long_points = 100, [10, 200], 200, 5000
+        args.repeat, args.concurrency, args.duration, args.ws_clients, args.ws_messages = 3, 4, 3.0, 20, 10
+    results = run(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
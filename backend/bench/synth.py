@@ -0,0 +1,116 @@
+"""Synthetic NextBillion-shaped request/response data for benchmarks."""
+import json
+import math
+import os
+import random
+
+from app.utils import encode_polyline
+
+
+def synthetic_response(routes: int = 200, steps_per_route: int = 50, points_per_route: int = 2000, seed: int = 1) -> dict:
+    """Response with ``routes`` routes, each with road-like geometry and job steps."""
+    rng = random.Random(seed)
+    out_routes = []
+    t0 = 1753747200
+    for r in range(routes):
+        lon, lat = rng.uniform(18, 32), rng.uniform(-34, -22)
+        heading = rng.uniform(0, 2 * math.pi)
+        coords = []
+        for _ in range(points_per_route):
+            heading += rng.gauss(0, 0.3)
+            lon += 0.0005 * math.cos(heading)
+            lat += 0.0005 * math.sin(heading)
+            coords.append([lon, lat])
+        stride = max(1, len(coords) // max(1, steps_per_route - 1))
+        steps = []
+        for s in range(steps_per_route):
+            lon_s, lat_s = coords[min(len(coords) - 1, s * stride)]
+            kind = "start" if s == 0 else "end" if s == steps_per_route - 1 else "job"
+            step = {
+                "type": kind,
+                "arrival": t0 + s * 600,
+                "duration": s * 540,
+                "service": 0 if kind != "job" else 300,
+                "waiting_time": 0,
+                "location": [round(lat_s, 5), round(lon_s, 5)],
+                "location_index": r * steps_per_route + s,
+                "load": [rng.randint(0, 12), rng.randint(0, 6000)],
+                "distance": s * 900,
+            }
+            if kind == "job":
+                step["id"] = f"J{r}-{s}"
+            steps.append(step)
+        out_routes.append({
+            "vehicle": f"V{r}",
+            "cost": steps_per_route * 900,
+            "steps": steps,
+            "service": 300 * (steps_per_route - 2),
+            "duration": steps_per_route * 540,
+            "waiting_time": 0,
+            "distance": steps_per_route * 900,
+            "geometry": encode_polyline(coords, 5),
+        })
+    return {
+        "description": f"synthetic {routes} routes",
+        "result": {
+            "code": 0,
+            "summary": {"routes": routes, "unassigned": 0, "distance": sum(r["distance"] for r in out_routes)},
+            "routes": out_routes,
+        },
+        "status": "Ok",
+        "message": "",
+    }
+
+
+def synthetic_request(jobs: int = 1000, vehicles: int | None = None, depots: int = 4, seed: int = 1) -> dict:
+    """NextBillion-style request: ``jobs`` drops scattered around ``depots`` cities."""
+    rng = random.Random(seed)
+    t0 = 1753747200
+    vehicles = vehicles or max(depots, jobs // 15)
+    centers = [(rng.uniform(-34, -22), rng.uniform(18, 32)) for _ in range(depots)]
+    locations = [f"{lat:.5f},{lon:.5f}" for lat, lon in centers]
+    depot_list = [{"id": f"depot-{d}", "location_index": d, "time_windows": [[t0, t0 + 86400]], "service": 300}
+                  for d in range(depots)]
+    vehicle_list = [{"id": f"V{v}", "start_depot_ids": [f"depot-{v % depots}"], "end_depot_ids": [f"depot-{v % depots}"],
+                     "capacity": [50, 20000], "time_window": [t0, t0 + 86400]} for v in range(vehicles)]
+    job_list = []
+    for j in range(jobs):
+        lat0, lon0 = centers[j % depots]
+        locations.append(f"{lat0 + rng.gauss(0, 0.15):.5f},{lon0 + rng.gauss(0, 0.15):.5f}")
+        opening = t0 + rng.choice((0, 3600, 14400))
+        job_list.append({"id": f"J{j}", "location_index": len(locations) - 1, "delivery": [1, rng.randint(50, 500)],
+                         "service": rng.choice((300, 480, 600)), "time_windows": [[opening, opening + 8 * 3600]],
+                         "priority": rng.randint(0, 100)})
+    return {
+        "description": f"synthetic {jobs} jobs",
+        "locations": {"location": locations},
+        "depots": depot_list,
+        "vehicles": vehicle_list,
+        "jobs": job_list,
+        "options": {"objective": {"travel_cost": "distance"}},
+    }
+
+
+def write_dataset(root: str, sets: int = 1000, jobs_per_set: int = 30, routes_per_set: int = 3,
+                  sizes: tuple = (10, 200), points_per_route: int = 500, seed: int = 1) -> dict:
+    """Lay out a DATA_DIR: ``sets`` set folders (request + response each) and one numbered
+    root response per entry of ``sizes`` (route count), in that order as versions 1..n."""
+    os.makedirs(root, exist_ok=True)
+    for s in range(1, sets + 1):
+        folder = os.path.join(root, str(s))
+        os.makedirs(folder, exist_ok=True)
+        request = synthetic_request(jobs_per_set, vehicles=routes_per_set, depots=1, seed=seed + s)
+        response = synthetic_response(routes_per_set, steps_per_route=jobs_per_set // routes_per_set + 2,
+                                      points_per_route=points_per_route // 4, seed=seed + s)
+        with open(os.path.join(folder, f"Next_Billion_request_{s}.json"), "w", encoding="utf-8") as f:
+            json.dump(request, f)
+        with open(os.path.join(folder, f"Next_Billion_response_{s}.json"), "w", encoding="utf-8") as f:
+            json.dump(response, f)
+    versions = {}
+    for v, routes in enumerate(sizes, 1):
+        path = os.path.join(root, f"nextbillion_response_{v}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(synthetic_response(routes, steps_per_route=30, points_per_route=points_per_route, seed=seed + v), f)
+        versions[routes] = {"version": v, "bytes": os.path.getsize(path)}
+    return {"sets": sets, "jobs_per_set": jobs_per_set, "routes_per_set": routes_per_set,
+            "points_per_route": points_per_route, "versions": versions}